@@ -0,0 +1,297 @@
+import asyncio
+import copy
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Union
+from exceptions import CCFError
+from cache import ColumnCache
+from metrics import Metrics
+from predicates import Predicate, normalize_predicates
+from reader import CCFReader, concat_values, matching_rows, take_values
+
+# asyncio front end for CCFReader. Opening, reading and decompressing run on a
+# bounded thread pool so the event loop is never blocked, and every chunk is
+# a separate task: a request for many chunks spreads over the pool, and
+# concurrent requests for the same chunk share one read.
+
+# Default size of the reader's own thread pool. Decoding is mostly Python code
+# holding the GIL, so threads beyond the number of cores only delay the event loop.
+DEFAULT_ASYNC_WORKERS = os.cpu_count() or 1
+
+
+class AsyncCCFReader:
+    """
+    Reads a CCF file from asyncio code without blocking the event loop.
+
+    ```python
+    async with AsyncCCFReader("data.ccf") as reader:
+        data = await reader.read_columns(["user", "score"], where=[("score", ">", 10)])
+        async for batch in reader.iter_batches(["user"]):
+            ...
+    ```
+
+    File I/O, decompression and decoding run on `executor`, or on the reader's
+    own pool of `max_workers` threads. Pass one executor to the readers of many
+    files to bound the threads of a whole service. Decompression releases the
+    GIL, so the executor must be thread based.
+
+    Concurrent requests for the same column chunk of a row group are coalesced:
+    the chunk is read and decoded once and shared until results are returned,
+    which are copied where needed so callers may modify them.
+    Cancelling a request does not cancel reads other requests are waiting for.
+
+    `use_mmap` (default True), `cache` and `metrics` are passed to the
+    underlying `CCFReader`; coalesced chunk requests are counted as `coalesced`.
+    """
+    def __init__(self, file_path: str, executor: Optional[Executor] = None,
+                 max_workers: int = DEFAULT_ASYNC_WORKERS, use_mmap: bool = True,
+                 cache: Union[ColumnCache, bool, None] = None,
+                 metrics: Optional[Metrics] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be a positive integer.")
+        self.file_path = file_path
+        self.use_mmap = use_mmap
+        self.cache = cache
+        self.metrics = metrics
+        self.max_workers = max_workers
+        self._executor = executor
+        self._owns_executor = False
+        self._reader: Optional[CCFReader] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {} # (name, group index, as_arrays) -> read
+        self._pending: Set[asyncio.Future] = set() # executor jobs not finished yet
+
+    async def open(self) -> "AsyncCCFReader":
+        """
+        Opens the file and reads its metadata. Returns the reader.
+
+        Raises:
+            CCFError: If the file cannot be read or is not a valid CCF file.
+        """
+        if self._reader is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='ccf-async')
+                self._owns_executor = True
+            self._reader = await self._run(CCFReader, self.file_path, self.use_mmap,
+                                           cache=self.cache, metrics=self.metrics)
+        return self
+
+    async def close(self) -> None:
+        """
+        Waits for running reads, then releases the file and the reader's own thread pool.
+        """
+        while self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._owns_executor = False
+
+    async def __aenter__(self) -> "AsyncCCFReader":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @property
+    def reader(self) -> CCFReader:
+        """
+        The underlying synchronous reader (schema, row groups and statistics).
+        """
+        if self._reader is None:
+            raise CCFError(f"Reader for '{self.file_path}' is not open; await open() first.")
+        return self._reader
+
+    @property
+    def schema(self) -> List[tuple]:
+        return self.reader.schema
+
+    @property
+    def column_types(self) -> Dict[str, int]:
+        return self.reader.column_types
+
+    @property
+    def nrows(self) -> int:
+        return self.reader.nrows
+
+    @property
+    def row_groups(self) -> List[Dict[str, Any]]:
+        return self.reader.row_groups
+
+    async def read_columns(self, columns: Optional[List[str]] = None,
+                           as_arrays: bool = False,
+                           where: Optional[List[Predicate]] = None) -> Dict[str, Any]:
+        """
+        Reads columns like `CCFReader.read_columns`. All chunks needed are
+        requested at once, so they are read and decoded in parallel.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist.
+            CCFQueryError: If a predicate is invalid.
+            CCFError: If data corruption or IO errors occur.
+        """
+        reader = self.reader
+        columns = reader.resolve_columns(columns)
+        predicates = normalize_predicates(where, reader.column_types)
+        groups = await self._select_groups(predicates)
+        batches = await asyncio.gather(*[self._read_group(i, columns, as_arrays, predicates) for i in groups])
+        batches = [batch for _, batch in filter(None, batches)]
+        if not batches:
+            return {name: concat_values([], reader.column_types[name], as_arrays) for name in columns}
+        # A single group's values may be shared with other requests, so they are copied
+        return await self._run(lambda: {
+            name: concat_values([batch[name] for batch in batches], reader.column_types[name], as_arrays)
+            if len(batches) > 1 else copy.copy(batches[0][name])
+            for name in columns})
+
+    async def iter_batches(self, columns: Optional[List[str]] = None,
+                           batch_rows: Optional[int] = None,
+                           as_arrays: bool = False,
+                           where: Optional[List[Predicate]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams batches like `CCFReader.iter_batches`. The next row group is
+        read while the caller processes the current batch.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist.
+            CCFQueryError: If a predicate is invalid.
+            CCFError: If data corruption or IO errors occur.
+        """
+        if batch_rows is not None and batch_rows < 1:
+            raise ValueError("batch_rows must be a positive integer.")
+        reader = self.reader
+        columns = reader.resolve_columns(columns)
+        predicates = normalize_predicates(where, reader.column_types)
+        groups = await self._select_groups(predicates)
+        pending = {name: [] for name in columns}
+        pending_rows = 0
+        task = None
+        try:
+            for k, index in enumerate(groups):
+                if task is None:
+                    task = asyncio.ensure_future(self._read_group(index, columns, as_arrays, predicates))
+                current = await task
+                task = None
+                if k + 1 < len(groups):
+                    task = asyncio.ensure_future(self._read_group(groups[k + 1], columns, as_arrays, predicates))
+                if current is None:
+                    continue
+                nrows, batch = current
+                if nrows == reader.row_groups[index]['nrows']:
+                    # Chunk values may be shared with other requests
+                    batch = await self._run(lambda: {name: copy.copy(vals) for name, vals in batch.items()})
+                if batch_rows is None:
+                    yield batch
+                    continue
+
+                # Re-slice row groups into fixed-size batches
+                for name in columns:
+                    pending[name] = concat_values([pending[name], batch[name]], reader.column_types[name], as_arrays) \
+                        if pending_rows else batch[name]
+                pending_rows += nrows
+                start = 0
+                while pending_rows - start >= batch_rows:
+                    yield {name: vals[start:start + batch_rows] for name, vals in pending.items()}
+                    start += batch_rows
+                if start:
+                    pending = {name: vals[start:] for name, vals in pending.items()}
+                    pending_rows -= start
+            if pending_rows:
+                yield pending
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def take(self, columns: Optional[List[str]], row_indices: Iterable[int],
+                   as_arrays: bool = False) -> Dict[str, Any]:
+        """
+        Reads the values at the given row positions (see `CCFReader.take`).
+        """
+        return await self._run(self.reader.take, columns, list(row_indices), as_arrays)
+
+    async def select_row_groups(self, where: Optional[List[Predicate]] = None) -> List[int]:
+        """
+        Returns the indices of the row groups that may match `where` (see
+        `CCFReader.select_row_groups`).
+        """
+        reader = self.reader
+        return await self._select_groups(normalize_predicates(where, reader.column_types))
+
+    async def _select_groups(self, predicates: List[Predicate]) -> List[int]:
+        reader = self.reader
+        if not predicates:
+            return [i for i, group in enumerate(reader.row_groups) if group['nrows']]
+        # Bloom filters may have to be read
+        return await self._run(reader.select_row_groups, predicates)
+
+    async def _read_group(self, index: int, columns: List[str], as_arrays: bool,
+                          predicates: List[Predicate]) -> Optional[tuple]:
+        """
+        Returns (nrows, {name: values}) for the rows of one row group that match
+        `predicates`, or None if none do. When all rows match, the values are
+        the decoded chunks, which may be shared with other requests.
+        """
+        nrows = self.reader.row_groups[index]['nrows']
+        if not predicates:
+            values = await asyncio.gather(*[self._read_chunk(name, index, as_arrays) for name in columns])
+            return nrows, dict(zip(columns, values))
+
+        # Decode predicate columns first; they are reused if also requested
+        filter_columns = list(dict.fromkeys(column for column, _, _ in predicates))
+        decoded = dict(zip(filter_columns, await asyncio.gather(
+            *[self._read_chunk(name, index, as_arrays) for name in filter_columns])))
+        indices = await self._run(matching_rows, decoded, predicates)
+        if not indices:
+            return None
+        remaining = [name for name in columns if name not in decoded]
+        decoded.update(zip(remaining, await asyncio.gather(
+            *[self._read_chunk(name, index, as_arrays) for name in remaining])))
+        if len(indices) == nrows:
+            return nrows, {name: decoded[name] for name in columns}
+        return len(indices), await self._run(lambda: {name: take_values(decoded[name], indices) for name in columns})
+
+    async def _read_chunk(self, name: str, index: int, as_arrays: bool) -> Any:
+        """
+        Reads one column chunk of a row group, joining a read of the same chunk
+        that is already running. The values must not be modified.
+        """
+        key = (name, index, as_arrays)
+        future = self._inflight.get(key)
+        if future is not None:
+            if self.metrics is not None:
+                self.metrics.add(name, coalesced=1)
+            return await asyncio.shield(future)
+
+        future = self._run(self.reader.read_chunk, name, index, as_arrays)
+        self._inflight[key] = future
+
+        def done(f: asyncio.Future) -> None:
+            if self._inflight.get(key) is f:
+                del self._inflight[key]
+
+        future.add_done_callback(done)
+        return await asyncio.shield(future)
+
+    def _run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> asyncio.Future:
+        """
+        Runs `fn` on the executor, tracking the job until it finishes.
+        """
+        if self._executor is None:
+            raise CCFError(f"Reader for '{self.file_path}' is closed.")
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+        self._pending.add(future)
+        future.add_done_callback(_finished(self._pending))
+        return future
+
+
+def _finished(pending: Set[asyncio.Future]) -> Callable[[asyncio.Future], None]:
+    def callback(future: asyncio.Future) -> None:
+        pending.discard(future)
+        # Mark the outcome as retrieved when every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+    return callback
@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from constants import DEFAULT_ROW_GROUP_SIZE
+from writer import CCFWriter
+from reader import CCFReader
+import ccf
+import csv_to_custom
+import custom_to_csv
+
+# Column types the generator can produce
+GENERATORS = ('int', 'float', 'string', 'bool', 'timestamp')
+
+
+def generate_dataset(path: str, rows: int, columns: int, types: List[str],
+                     cardinality: int = 100, seed: int = 0) -> List[str]:
+    """
+    Writes a synthetic CSV file and returns its header.
+
+    The first column is a sorted integer `id` (so range filters can prune row
+    groups); the remaining `columns - 1` columns cycle through `types`. STRING
+    columns draw from `cardinality` distinct values.
+    """
+    for t in types:
+        if t not in GENERATORS:
+            raise ValueError(f"Unknown column type '{t}'. Expected one of {list(GENERATORS)}.")
+    rng = random.Random(seed)
+    kinds = [types[i % len(types)] for i in range(max(columns - 1, 0))]
+    headers = ['id'] + [f'c{i}_{kind}' for i, kind in enumerate(kinds)]
+    words = [f'value_{i:06d}' for i in range(max(cardinality, 1))]
+    start = datetime(2024, 1, 1)
+
+    def cell(kind: str, row: int) -> str:
+        if kind == 'int':
+            return str(rng.randint(-1000000, 1000000))
+        if kind == 'float':
+            return repr(rng.random() * 1000)
+        if kind == 'string':
+            return rng.choice(words)
+        if kind == 'bool':
+            return 'true' if rng.random() < 0.5 else 'false'
+        return (start + timedelta(seconds=row)).isoformat()
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(headers)
+        out.writerows([str(r)] + [cell(kind, r) for kind in kinds] for r in range(rows))
+    return headers
+
+
+def measure(fn: Callable[[], Any], repeats: int = 3) -> Dict[str, Any]:
+    """
+    Times `fn` over `repeats` runs, then runs it once more under tracemalloc
+    to record the peak of Python memory allocations (tracing slows code down,
+    so it is kept out of the timed runs).
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'best_seconds': min(times),
+        'mean_seconds': sum(times) / len(times),
+        'repeats': repeats,
+        'peak_memory_bytes': peak,
+    }
+
+
+def _quiet(fn: Callable, *args: Any) -> Callable[[], None]:
+    """
+    Wraps a CLI entry point so its progress messages do not clutter the output
+    and a failure (reported through sys.exit) raises instead of exiting.
+    """
+    def run() -> None:
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            try:
+                fn(*args)
+            except SystemExit as e:
+                if e.code:
+                    raise RuntimeError(f"Benchmarked command failed: {out.getvalue().strip()}") from e
+    return run
+
+
+def _run_cli(argv: List[str]) -> Callable[[], None]:
+    def main() -> None:
+        saved = sys.argv
+        sys.argv = ['ccf.py'] + argv
+        try:
+            ccf.main()
+        finally:
+            sys.argv = saved
+    return _quiet(main)
+
+
+def run_benchmarks(rows: int = 200000, columns: int = 8, types: Optional[List[str]] = None,
+                   cardinality: int = 100, repeats: int = 3, seed: int = 0,
+                   row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                   workdir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generates a dataset and benchmarks writing, reading and the command line tools.
+
+    Returns:
+        A JSON-serializable report: run parameters and environment under
+        "meta", and one entry per benchmark under "results".
+    """
+    types = types or ['int', 'float', 'string']
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='ccf_bench_')
+    try:
+        csv_path = os.path.join(workdir, 'data.csv')
+        ccf_path = os.path.join(workdir, 'data.ccf')
+        out_ccf = os.path.join(workdir, 'out.ccf')
+        out_csv = os.path.join(workdir, 'out.csv')
+
+        headers = generate_dataset(csv_path, rows, columns, types, cardinality, seed)
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            table = list(csv.reader(f))[1:]
+        CCFWriter(ccf_path, row_group_size=row_group_size).write(headers, table)
+        csv_size = os.path.getsize(csv_path)
+        ccf_size = os.path.getsize(ccf_path)
+
+        def read(columns=None, where=None):
+            return lambda: CCFReader(ccf_path).read_columns(columns, where=where)
+
+        projected = headers[:2]
+        # Matches the first 1% of rows, so all but the first row group are skipped
+        pruned = [('id', '<', max(rows // 100, 1))]
+        cases = [
+            ('writer.write', lambda: CCFWriter(out_ccf, row_group_size=row_group_size).write(headers, table), csv_size),
+            ('reader.read_columns.full', read(), ccf_size),
+            ('reader.read_columns.projected', read(projected), None),
+            ('reader.read_columns.pruned', read(None, pruned), None),
+            ('ccf.pack', _run_cli(['pack', csv_path, out_ccf, '--row-group-size', str(row_group_size)]), csv_size),
+            ('ccf.unpack', _run_cli(['unpack', ccf_path, out_csv]), ccf_size),
+            ('csv_to_custom', _quiet(csv_to_custom.convert_csv_to_ccf, csv_path, out_ccf), csv_size),
+            ('custom_to_csv', _quiet(custom_to_csv.convert_ccf_to_csv, ccf_path, out_csv), ccf_size),
+        ]
+
+        results = []
+        for name, fn, nbytes in cases:
+            result = {'name': name}
+            result.update(measure(fn, repeats))
+            result['rows_per_second'] = rows / result['best_seconds'] if result['best_seconds'] else None
+            if nbytes is not None:
+                result['input_bytes'] = nbytes
+                result['mb_per_second'] = nbytes / 1e6 / result['best_seconds'] if result['best_seconds'] else None
+            results.append(result)
+
+        # Pack time must grow linearly with the row count: writing all rows
+        # should take about 4x as long as writing a quarter of them
+        quarter = table[:max(rows // 4, 1)]
+        full = next(r for r in results if r['name'] == 'writer.write')
+        small = measure(lambda: CCFWriter(out_ccf, row_group_size=row_group_size).write(headers, quarter), repeats)
+        write_scaling = {
+            'rows': [len(quarter), rows],
+            'best_seconds': [small['best_seconds'], full['best_seconds']],
+            'ratio': full['best_seconds'] / small['best_seconds'] if small['best_seconds'] else None,
+        }
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': rows,
+            'columns': columns,
+            'types': types,
+            'cardinality': cardinality,
+            'row_group_size': row_group_size,
+            'repeats': repeats,
+            'seed': seed,
+            'csv_bytes': csv_size,
+            'ccf_bytes': ccf_size,
+        },
+        'results': results,
+        'write_scaling': write_scaling,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[tuple]:
+    """
+    Returns (name, baseline seconds, current seconds, ratio) for benchmarks
+    present in both reports; a ratio above 1 means the current run is slower.
+    """
+    before = {r['name']: r['best_seconds'] for r in baseline.get('results', [])}
+    rows = []
+    for r in report['results']:
+        if r['name'] in before and before[r['name']]:
+            rows.append((r['name'], before[r['name']], r['best_seconds'], r['best_seconds'] / before[r['name']]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CCF packing, unpacking and reads on synthetic data.")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows in the dataset (default: 200000)")
+    parser.add_argument("--columns", type=int, default=8, help="Columns, including the id column (default: 8)")
+    parser.add_argument("--types", default="int,float,string",
+                        help=f"Comma-separated column types to cycle through: {','.join(GENERATORS)}")
+    parser.add_argument("--cardinality", type=int, default=100, help="Distinct values per string column (default: 100)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Rows per row group (default: {DEFAULT_ROW_GROUP_SIZE})")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per benchmark (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the dataset (default: 0)")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.columns, args.types.split(","), args.cardinality,
+                            args.repeats, args.seed, args.row_group_size)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n{'Benchmark':<32} | {'Baseline':>10} | {'Current':>10} | {'Ratio':>6}", file=sys.stderr)
+        print("-" * 68, file=sys.stderr)
+        for name, old, new, ratio in compare(report, baseline):
+            print(f"{name:<32} | {old:>9.4f}s | {new:>9.4f}s | {ratio:>6.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import hashlib
+import math
+import struct
+from datetime import datetime
+from typing import Any, Iterable, Optional
+from constants import TYPE_STRING, INTEGER_TYPES, TYPE_TIMESTAMP
+from exceptions import CCFError
+import timestamps
+
+# Bloom filters over the values of a column chunk, used to skip chunks that
+# cannot contain a value looked up with '=' or 'in'. Positions are derived
+# from one 64-bit BLAKE2b digest per value by double hashing: bit j of the
+# filter for value v is (h1 + j * h2) mod nbits, where h1 and h2 are the low
+# and high 32 bits of the digest (see SPEC.md).
+
+# Bloom filters are built for chunks of these types
+BLOOM_TYPES = (TYPE_STRING,) + tuple(INTEGER_TYPES)
+
+_INT64 = struct.Struct('<q')
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+_HASHES = struct.Struct('<II')
+
+# Upper bound on the number of hash functions (reached below fpp ~ 1e-5)
+_MAX_HASHES = 16
+
+
+def _digest(value: Any) -> tuple:
+    key = value.encode('utf-8') if isinstance(value, str) else _INT64.pack(value)
+    return _HASHES.unpack(hashlib.blake2b(key, digest_size=8).digest())
+
+
+class BloomFilter:
+    """
+    A Bloom filter over string or integer values (TIMESTAMP values as epoch microseconds).
+    """
+    def __init__(self, nbits: int, nhashes: int, bits: Optional[bytearray] = None):
+        if nbits < 8 or nbits % 8:
+            raise ValueError("nbits must be a positive multiple of 8.")
+        if not 1 <= nhashes <= 255:
+            raise ValueError("nhashes must be between 1 and 255.")
+        self.nbits = nbits
+        self.nhashes = nhashes
+        self.bits = bits if bits is not None else bytearray(nbits // 8)
+
+    @classmethod
+    def build(cls, values: Iterable[Any], fpp: float) -> "BloomFilter":
+        """
+        Builds a filter sized for the distinct `values` and the false-positive rate `fpp`.
+        """
+        if not 0 < fpp < 1:
+            raise ValueError("fpp must be between 0 and 1.")
+        distinct = set(values)
+        n = max(len(distinct), 1)
+        nbits = max(64, math.ceil(-n * math.log(fpp) / math.log(2) ** 2))
+        nbits += -nbits % 8
+        nhashes = min(max(1, round(nbits / n * math.log(2))), _MAX_HASHES)
+        bloom = cls(nbits, nhashes)
+        for value in distinct:
+            bloom.add(value)
+        return bloom
+
+    def add(self, value: Any) -> None:
+        h1, h2 = _digest(value)
+        bits, nbits = self.bits, self.nbits
+        for j in range(self.nhashes):
+            pos = (h1 + j * h2) % nbits
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, value: Any) -> bool:
+        """
+        Returns False if `value` was definitely not added, True if it may have been.
+        """
+        h1, h2 = _digest(value)
+        bits, nbits = self.bits, self.nbits
+        for j in range(self.nhashes):
+            pos = (h1 + j * h2) % nbits
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the filter as stored in the file: [hash count (1)] [bits].
+        """
+        return struct.pack('<B', self.nhashes) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        if len(data) < 2 or not data[0]:
+            raise CCFError(f"Invalid Bloom filter block of {len(data)} bytes.")
+        return cls((len(data) - 1) * 8, data[0], bytearray(data[1:]))
+
+
+def probe_value(value: Any, dtype: int) -> Optional[Any]:
+    """
+    Converts a predicate value (already cast to the column type) to the form
+    the values of a chunk of type `dtype` were added to its filter in.
+    Returns None when that is not possible, e.g. because the column was widened
+    after the chunk was written; the chunk must then be read.
+    """
+    if dtype == TYPE_STRING:
+        return value if isinstance(value, str) else None
+    if dtype == TYPE_TIMESTAMP:
+        return timestamps.to_micros(value) if isinstance(value, datetime) else None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str):
+        # Column widened to STRING: chunk values are compared as str(int)
+        try:
+            number = int(value)
+        except ValueError:
+            return None
+        value = number if str(number) == value else None
+    if isinstance(value, int) and _INT64_MIN <= value <= _INT64_MAX:
+        return value
+    return None
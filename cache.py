@@ -0,0 +1,124 @@
+import copy
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from constants import DEFAULT_CACHE_BYTES
+
+# Number of values sampled to estimate the per-value size of a list
+_SIZE_SAMPLE = 64
+
+
+def estimate_size(values: Any) -> int:
+    """
+    Approximate memory footprint of decoded column values in bytes.
+
+    Typed buffers are measured exactly; for lists the container is measured
+    and the size of the element objects is extrapolated from a sample.
+    """
+    if isinstance(values, array):
+        return sys.getsizeof(values)
+    nbytes = getattr(values, 'nbytes', None) # NumPy arrays
+    if nbytes is not None:
+        return nbytes
+    size = sys.getsizeof(values)
+    if values:
+        step = max(1, len(values) // _SIZE_SAMPLE)
+        sample = values[::step]
+        size += sum(map(sys.getsizeof, sample)) * len(values) // len(sample)
+    return size
+
+
+class ColumnCache:
+    """
+    Thread-safe LRU cache of decoded column chunks shared by CCFReader instances.
+
+    Entries are evicted least recently used first once the estimated size of
+    the cached values exceeds `max_bytes`. Readers key entries by file path,
+    modification time and size, so a rewritten file is never served stale data.
+    Values are copied on the way in and out, so callers may modify what they get.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative.")
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (values, size)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns a copy of the cached values for `key`, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.copy(entry[0])
+
+    def put(self, key: Hashable, values: Any) -> None:
+        """
+        Caches a copy of `values`, evicting older entries to stay within the budget.
+        Values larger than the whole budget are not cached.
+        """
+        size = estimate_size(values)
+        if size > self.max_bytes:
+            return
+        values = copy.copy(values)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (values, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops all entries. Counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss/eviction counters and the current occupancy.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_cache: Optional[ColumnCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> ColumnCache:
+    """
+    Returns the process-wide cache used by readers opened with `cache=True`.
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ColumnCache()
+        return _shared_cache
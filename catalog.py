@@ -0,0 +1,179 @@
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+from exceptions import CCFError, CCFMagicError, CCFVersionError
+from reader import CCFReader
+
+# A catalog caches the metadata of the CCF files under a directory in one
+# sidecar file, so a dataset can be planned without opening every file:
+#
+#   [magic 'CCFC'] [version u8] [file count u32]
+#   per file: [path length u16] [path, relative to the root, '/'-separated]
+#             [size u64] [mtime ns u64] [head length u32] [head] [footer length u64] [footer]
+#
+# `head` and `footer` are the raw header/schema and footer bytes of the file.
+# An entry is only used while the file's size and modification time match.
+
+CATALOG_MAGIC = b'CCFC'
+CATALOG_VERSION = 1
+
+# File name of a directory's catalog (skipped by file discovery)
+CATALOG_NAME = '_ccf_catalog'
+
+# File extension of the data files picked up by discovery
+CCF_EXTENSION = '.ccf'
+
+_CATALOG_HEADER = struct.Struct('<4sBI')
+_ENTRY_STAT = struct.Struct('<QQI') # size, mtime ns, head length
+_U16 = struct.Struct('<H')
+_U64 = struct.Struct('<Q')
+
+# Cached metadata of one file: (size, mtime ns, head, footer)
+Entry = Tuple[int, int, bytes, bytes]
+
+
+def find_files(root: str) -> List[str]:
+    """
+    Lists the CCF files under `root`, recursively and in sorted order. Names
+    starting with '.' or '_' (hidden files, catalogs, temporary files) are skipped.
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '_')))
+        for name in sorted(filenames):
+            if name.endswith(CCF_EXTENSION) and not name.startswith(('.', '_')):
+                files.append(os.path.join(dirpath, name))
+    return files
+
+
+class Catalog:
+    """
+    Cached metadata of the CCF files under a directory.
+
+    Build one with `Catalog.build(root)` and store it next to the data with
+    `save()`; `CCFDataset(root, catalog=True)` then creates its readers from
+    the catalog instead of reading each file's metadata. Entries of files that
+    changed since are ignored, so a stale catalog only costs speed.
+    """
+    def __init__(self, root: str, entries: Optional[Dict[str, Entry]] = None):
+        self.root = root
+        self.entries: Dict[str, Entry] = entries or {} # relative path -> Entry
+        self._prefix = os.path.join(root, '')
+
+    def _key(self, path: str) -> str:
+        # Paths found under the root start with it; relpath() is much slower
+        if path.startswith(self._prefix):
+            path = path[len(self._prefix):]
+        else:
+            path = os.path.relpath(path, self.root)
+        return path.replace(os.sep, '/')
+
+    def lookup(self, path: str) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Returns the (head, footer) metadata of a file for `CCFReader(metadata=...)`,
+        or None if the file is not cataloged or changed since.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != entry[:2]:
+            return None
+        return entry[2], entry[3]
+
+    @classmethod
+    def build(cls, root: str, previous: Optional["Catalog"] = None) -> "Catalog":
+        """
+        Catalogs the files under `root`. Entries of `previous` that are still
+        current are reused, so only new and changed files are read.
+        """
+        catalog = cls(root)
+        for path in find_files(root):
+            key = catalog._key(path)
+            if previous is not None and previous.lookup(path) is not None:
+                catalog.entries[key] = previous.entries[key]
+                continue
+            entry = _read_entry(path)
+            if entry is not None:
+                catalog.entries[key] = entry
+        return catalog
+
+    @classmethod
+    def load(cls, root: str, path: Optional[str] = None) -> "Catalog":
+        """
+        Reads the catalog of `root` (by default `root/_ccf_catalog`).
+
+        Raises:
+            CCFMagicError: If the file is not a catalog.
+            CCFVersionError: If the catalog version is not supported.
+            CCFError: If the file is truncated.
+        """
+        with open(path or os.path.join(root, CATALOG_NAME), 'rb') as f:
+            data = f.read()
+        try:
+            magic, version, nfiles = _CATALOG_HEADER.unpack_from(data, 0)
+            if magic != CATALOG_MAGIC:
+                raise CCFMagicError(f"Not a CCF catalog: expected {CATALOG_MAGIC}, got {magic}")
+            if version != CATALOG_VERSION:
+                raise CCFVersionError(f"Unsupported catalog version: {version}.")
+            pos = _CATALOG_HEADER.size
+            entries = {}
+            for _ in range(nfiles):
+                length = _U16.unpack_from(data, pos)[0]
+                key = data[pos + 2:pos + 2 + length].decode('utf-8')
+                pos += 2 + length
+                size, mtime_ns, head_length = _ENTRY_STAT.unpack_from(data, pos)
+                pos += _ENTRY_STAT.size
+                head = data[pos:pos + head_length]
+                pos += head_length
+                footer_length = _U64.unpack_from(data, pos)[0]
+                pos += 8
+                footer = data[pos:pos + footer_length]
+                pos += footer_length
+                if len(head) != head_length or len(footer) != footer_length:
+                    raise CCFError("Unexpected EOF while reading catalog.")
+                entries[key] = (size, mtime_ns, head, footer)
+        except struct.error as e:
+            raise CCFError(f"Unexpected EOF while reading catalog: {e}") from e
+        return cls(root, entries)
+
+    def save(self, path: Optional[str] = None) -> str:
+        """
+        Writes the catalog (by default to `root/_ccf_catalog`), replacing the
+        previous one atomically. Returns the path written.
+        """
+        path = path or os.path.join(self.root, CATALOG_NAME)
+        directory, name = os.path.split(path)
+        tmp_path = os.path.join(directory, f'_{name}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_CATALOG_HEADER.pack(CATALOG_MAGIC, CATALOG_VERSION, len(self.entries)))
+            for key, (size, mtime_ns, head, footer) in self.entries.items():
+                key_bytes = key.encode('utf-8')
+                f.write(_U16.pack(len(key_bytes)) + key_bytes)
+                f.write(_ENTRY_STAT.pack(size, mtime_ns, len(head)) + head)
+                f.write(_U64.pack(len(footer)) + footer)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _read_entry(path: str) -> Optional[Entry]:
+    """
+    Reads the raw metadata of one file, or returns None if the file changed
+    while it was read (it is then read from the file when opened).
+    """
+    before = os.stat(path)
+    reader = CCFReader(path)
+    head_size = reader.header['head_size']
+    with open(path, 'rb') as f:
+        head = f.read(head_size)
+        footer = b''
+        if reader.header['version'] >= 2:
+            f.seek(reader.header['footer_offset'])
+            footer = f.read(reader.header['footer_size'])
+    after = os.stat(path)
+    if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+        return None
+    return (after.st_size, after.st_mtime_ns, head, footer)
@@ -2,8 +2,17 @@ import argparse
 import sys
 import os
 import csv
+import time
 from writer import CCFWriter
 from reader import CCFReader
+from constants import DEFAULT_ROW_GROUP_SIZE, DEFAULT_PAGE_ROWS, DEFAULT_BLOOM_FPP, CODEC_MAP, CODEC_POLICIES
+from predicates import parse_predicate, normalize_predicates
+from query import run_query
+from metrics import Metrics, column_storage, storage_report, READ_PHASES
+from csv_export import write_csv, format_columns
+from csv_ingest import ingest_csv
+from compact import compact, DEFAULT_MEMORY_ROWS
+from catalog import Catalog, CATALOG_NAME
 # Assume exceptions will be available, or catch generic ones for now until we add them.
 
 def handle_pack(args):
@@ -12,20 +21,36 @@ def handle_pack(args):
         print(f"Error: Input file '{args.input}' not found.")
         sys.exit(1)
         
-    print(f"Packing '{args.input}' to '{args.output}'...")
+    print(f"{'Appending' if args.append else 'Packing'} '{args.input}' to '{args.output}'...")
     
     try:
-        with open(args.input, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            try:
-                headers = next(reader)
-            except StopIteration:
-                headers = []
-            rows = list(reader)
-            
-        writer = CCFWriter(args.output)
-        writer.write(headers, rows)
+        metrics = Metrics() if args.profile else None
+        writer = CCFWriter(args.output, row_group_size=args.row_group_size,
+                           codec=args.codec, compression_level=args.level,
+                           workers=args.workers, executor=args.executor, metrics=metrics,
+                           page_rows=args.page_rows or None,
+                           bloom_filters={name: args.bloom_fpp for name in args.bloom.split(',')} if args.bloom else None)
+        start = time.perf_counter()
+        if args.ingest_workers > 1:
+            # Byte ranges of the CSV are parsed and encoded in worker processes
+            ingest_csv(args.input, writer, workers=args.ingest_workers, append=args.append)
+        else:
+            with open(args.input, 'r', newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                try:
+                    headers = next(reader)
+                except StopIteration:
+                    headers = []
+
+                # Rows are streamed into the writer one row group at a time
+                if args.append:
+                    writer.append(reader, headers)
+                else:
+                    writer.write(headers, reader)
         print("Done.")
+        if metrics is not None:
+            print(f"\nProfile (total {time.perf_counter() - start:.4f}s, including CSV parsing):")
+            print(metrics.report())
     except Exception as e:
         print(f"Error packing file: {e}")
         sys.exit(1)
@@ -41,31 +66,20 @@ def handle_unpack(args):
     columns = args.columns.split(",") if args.columns else None
     
     try:
-        reader = CCFReader(args.input)
-        vals = reader.read_columns(columns)
-        
-        # Determine headers: use requested columns or all from schema
-        if columns:
-            headers = columns
-        else:
-            headers = [name for name, _ in reader.schema]
-            
-        nrows = reader.nrows
-        
-        with open(args.output, 'w', newline='', encoding='utf-8') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerow(headers)
-            
-            for i in range(nrows):
-                row = []
-                for h in headers:
-                    if h in vals and i < len(vals[h]):
-                        row.append(str(vals[h][i]))
-                    else:
-                        row.append("")
-                csv_writer.writerow(row)
+        metrics = Metrics() if args.profile else None
+        start = time.perf_counter()
+        # Row groups are streamed to the CSV file one at a time
+        with CCFReader(args.input, workers=args.workers, metrics=metrics) as reader:
+            with open(args.output, 'w', newline='', encoding='utf-8') as f:
+                write_csv(reader, f, columns)
         print("Done.")
-        
+        if metrics is not None:
+            total = time.perf_counter() - start
+            totals = metrics.totals()
+            read_seconds = sum(totals.get(f'{p}_seconds', 0.0) for p in READ_PHASES)
+            print(f"\nProfile (total {total:.4f}s, CSV write {max(total - read_seconds, 0.0):.4f}s):")
+            print(metrics.report())
+
     except Exception as e:
         print(f"Error unpacking file: {e}")
         sys.exit(1)
@@ -82,6 +96,7 @@ def handle_inspect(args):
         print(f"Version: {reader.header.get('version')}")
         print(f"Rows: {reader.nrows}")
         print(f"Columns: {reader.header.get('ncols')}")
+        print(f"Row Groups: {len(reader.row_groups)}")
         print("\nSchema:")
         print(f"{'Name':<20} | {'Type':<10}")
         print("-" * 33)
@@ -96,11 +111,93 @@ def handle_inspect(args):
         for name, dtype in reader.schema:
             type_str = TYPE_MAP.get(dtype, "unknown")
             print(f"{name:<20} | {type_str:<10}")
+
+        if args.stats:
+            print("\nColumn Storage:")
+            print(storage_report(column_storage(reader)))
             
     except Exception as e:
         print(f"Error inspecting file: {e}")
         sys.exit(1)
 
+def handle_query(args):
+    """Filter, project and aggregate a CCF file"""
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' not found.")
+        sys.exit(1)
+
+    try:
+        where = [parse_predicate(text) for text in args.where]
+        columns = args.select.split(",") if args.select else None
+        with CCFReader(args.input, workers=args.workers) as reader:
+            if args.group_by or args.agg:
+                result = run_query(reader,
+                                   columns=columns,
+                                   where=where,
+                                   group_by=args.group_by.split(",") if args.group_by else None,
+                                   aggregates=args.agg)
+            else:
+                # Projections are streamed to the output one row group at a time;
+                # the query is validated before the output is created
+                result = None
+                columns = reader.resolve_columns(columns)
+                normalize_predicates(where, reader.column_types)
+
+            out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+            try:
+                if result is None:
+                    write_csv(reader, out, columns, where=where)
+                else:
+                    csv_writer = csv.writer(out)
+                    csv_writer.writerow(list(result))
+                    csv_writer.writerows(zip(*format_columns(result, reader.column_types)))
+            finally:
+                if args.output:
+                    out.close()
+    except Exception as e:
+        print(f"Error querying file: {e}")
+        sys.exit(1)
+
+def handle_compact(args):
+    """Merge the CCF files of a directory into fewer, larger files"""
+    if not os.path.isdir(args.input):
+        print(f"Error: Input directory '{args.input}' not found.")
+        sys.exit(1)
+
+    print(f"Compacting '{args.input}' to '{args.output}'" + (f" sorted by '{args.sort_by}'..." if args.sort_by else "..."))
+
+    try:
+        start = time.perf_counter()
+        written = compact(args.input, args.output, sort_by=args.sort_by, rows_per_file=args.rows_per_file,
+                          memory_rows=args.memory_rows, temp_dir=args.temp_dir,
+                          row_group_size=args.row_group_size, codec=args.codec, workers=args.workers)
+        nrows = sum(CCFReader(path).nrows for path in written)
+        print(f"Done. Wrote {nrows} rows to {len(written)} file(s) in {time.perf_counter() - start:.2f}s.")
+    except Exception as e:
+        print(f"Error compacting files: {e}")
+        sys.exit(1)
+
+def handle_catalog(args):
+    """Cache the metadata of the CCF files of a directory in a catalog file"""
+    if not os.path.isdir(args.input):
+        print(f"Error: Input directory '{args.input}' not found.")
+        sys.exit(1)
+
+    try:
+        start = time.perf_counter()
+        previous = None
+        if not args.rebuild and os.path.exists(os.path.join(args.input, CATALOG_NAME)):
+            previous = Catalog.load(args.input)
+        catalog = Catalog.build(args.input, previous)
+        path = catalog.save()
+        reused = sum(1 for key, entry in catalog.entries.items()
+                     if previous is not None and previous.entries.get(key) is entry)
+        print(f"Cataloged {len(catalog.entries)} files ({len(catalog.entries) - reused} read) "
+              f"to '{path}' in {time.perf_counter() - start:.2f}s.")
+    except Exception as e:
+        print(f"Error building catalog: {e}")
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(description="Custom Columnar Format (CCF) Tool")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -109,6 +206,26 @@ def main():
     p_pack = subparsers.add_parser("pack", help="Convert CSV to CCF")
     p_pack.add_argument("input", help="Input CSV file")
     p_pack.add_argument("output", help="Output CCF file")
+    p_pack.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Rows per row group (default: {DEFAULT_ROW_GROUP_SIZE})")
+    p_pack.add_argument("--page-rows", type=int, default=DEFAULT_PAGE_ROWS,
+                        help=f"Rows per independently compressed page, 0 for one page per chunk (default: {DEFAULT_PAGE_ROWS})")
+    p_pack.add_argument("--bloom", help="Comma-separated list of columns to build Bloom filters for (fast '=' / 'in' lookups)")
+    p_pack.add_argument("--bloom-fpp", type=float, default=DEFAULT_BLOOM_FPP,
+                        help=f"False-positive rate of the Bloom filters (default: {DEFAULT_BLOOM_FPP})")
+    p_pack.add_argument("--codec", default="zlib", choices=list(CODEC_MAP.values()) + list(CODEC_POLICIES),
+                        help="Compression codec, or a policy that picks one per column (default: zlib)")
+    p_pack.add_argument("--level", type=int, help="Compression level (zlib/bz2 level, lzma preset)")
+    p_pack.add_argument("--workers", type=int, default=1,
+                        help="Encode and compress columns in parallel with this many workers (default: 1)")
+    p_pack.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Worker pool type used when --workers > 1 (default: thread)")
+    p_pack.add_argument("--ingest-workers", type=int, default=1,
+                        help="Parse and encode byte ranges of the CSV in this many processes (default: 1)")
+    p_pack.add_argument("--append", action="store_true",
+                        help="Add the rows to an existing CCF file as new row groups instead of overwriting it")
+    p_pack.add_argument("--profile", action="store_true",
+                        help="Print per-column sizes and convert/encode/compress/write timings")
     p_pack.set_defaults(func=handle_pack)
     
     # Unpack
@@ -116,12 +233,57 @@ def main():
     p_unpack.add_argument("input", help="Input CCF file")
     p_unpack.add_argument("output", help="Output CSV file")
     p_unpack.add_argument("--columns", help="Comma-separated list of columns to extract")
+    p_unpack.add_argument("--workers", type=int, default=1,
+                          help="Decompress and decode columns in parallel with this many threads (default: 1)")
+    p_unpack.add_argument("--profile", action="store_true",
+                          help="Print per-column sizes and read/decompress/decode timings")
     p_unpack.set_defaults(func=handle_unpack)
 
     # Inspect
     p_inspect = subparsers.add_parser("inspect", help="Inspect CCF metadata")
     p_inspect.add_argument("input", help="Input CCF file")
+    p_inspect.add_argument("--stats", action="store_true",
+                           help="Show per-column storage: sizes, compression ratio, encodings and codecs")
     p_inspect.set_defaults(func=handle_inspect)
+
+    # Compact
+    p_compact = subparsers.add_parser("compact", help="Merge the CCF files of a directory into fewer, larger files")
+    p_compact.add_argument("input", help="Input directory (searched recursively; key=value directories become columns)")
+    p_compact.add_argument("output", help="Output CCF file, or directory when --rows-per-file is set")
+    p_compact.add_argument("--sort-by", help="Column to sort the rows by")
+    p_compact.add_argument("--rows-per-file", type=int,
+                           help="Write part-NNNNN.ccf files of this many rows instead of a single file")
+    p_compact.add_argument("--memory-rows", type=int, default=DEFAULT_MEMORY_ROWS,
+                           help=f"Rows sorted in memory at a time; larger inputs are spilled to temporary files (default: {DEFAULT_MEMORY_ROWS})")
+    p_compact.add_argument("--temp-dir", help="Directory for temporary sorted runs (default: system temp directory)")
+    p_compact.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                           help=f"Rows per row group (default: {DEFAULT_ROW_GROUP_SIZE})")
+    p_compact.add_argument("--codec", default="zlib", choices=list(CODEC_MAP.values()) + list(CODEC_POLICIES),
+                           help="Compression codec, or a policy that picks one per column (default: zlib)")
+    p_compact.add_argument("--workers", type=int, default=1,
+                           help="Encode and compress columns in parallel with this many threads (default: 1)")
+    p_compact.set_defaults(func=handle_compact)
+
+    # Catalog
+    p_catalog = subparsers.add_parser("catalog", help="Cache the metadata of a directory of CCF files for fast dataset opens")
+    p_catalog.add_argument("input", help="Dataset directory; the catalog is written to its _ccf_catalog file")
+    p_catalog.add_argument("--rebuild", action="store_true",
+                           help="Read every file instead of reusing the entries of unchanged files")
+    p_catalog.set_defaults(func=handle_catalog)
+
+    # Query
+    p_query = subparsers.add_parser("query", help="Filter, project and aggregate a CCF file")
+    p_query.add_argument("input", help="Input CCF file")
+    p_query.add_argument("--select", help="Comma-separated list of columns to return (projection)")
+    p_query.add_argument("--where", action="append", default=[],
+                         help="Filter such as 'age>30' or 'country in (DE,FR)'; repeat to AND filters")
+    p_query.add_argument("--group-by", help="Comma-separated list of columns to group by")
+    p_query.add_argument("--agg", action="append", default=[],
+                         help="Aggregate such as 'sum(price)', 'avg(score)' or 'count(*)'; repeatable")
+    p_query.add_argument("--output", help="Write the result as CSV to this file instead of stdout")
+    p_query.add_argument("--workers", type=int, default=1,
+                         help="Decompress and decode columns in parallel with this many threads (default: 1)")
+    p_query.set_defaults(func=handle_query)
     
     args = parser.parse_args()
     args.func(args)
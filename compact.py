@@ -0,0 +1,324 @@
+import itertools
+import os
+import tempfile
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+from constants import DEFAULT_ROW_GROUP_SIZE
+from exceptions import CCFColumnError, CCFSchemaError
+from dataset import CCFDataset
+from reader import CCFReader
+from writer import CCFWriter
+
+# Compaction merges the files of a dataset into fewer, larger files. Without a
+# sort key, rows are copied file by file. With one, an external merge sort
+# keeps memory bounded regardless of the dataset size:
+#
+#   1. runs of up to `memory_rows` rows are sorted in memory and spilled to
+#      temporary CCF files,
+#   2. runs are merged `fan_in` at a time with a k-way merge, streaming each
+#      run one row group at a time, until one merge writes the output.
+
+# Rows sorted in memory per run
+DEFAULT_MEMORY_ROWS = 1_000_000
+
+# Maximum number of runs merged (and open) at once
+DEFAULT_FAN_IN = 64
+
+# Writer settings for temporary runs: fast compression, plain encodings, no pages or filters
+_RUN_OPTIONS = {'codec': 'zlib', 'compression_level': 1, 'page_rows': None,
+                'int_encodings': False, 'dictionary_ratio': 0.0}
+
+# Smallest row group size of temporary runs
+_MIN_RUN_GROUP_ROWS = 1024
+
+
+class _RowGroupSink:
+    """
+    Collects column values and writes them as row groups, starting a new file
+    from `paths` every `rows_per_file` rows (or a single file if None).
+    """
+    def __init__(self, paths: Iterator[str], headers: List[str], types: List[int],
+                 rows_per_file: Optional[int], writer_options: Dict[str, Any]):
+        self.paths = paths
+        self.headers = headers
+        self.types = types
+        self.rows_per_file = rows_per_file
+        self.writer_options = writer_options
+        self.row_group_size = writer_options.get('row_group_size', DEFAULT_ROW_GROUP_SIZE)
+        self.written: List[str] = []
+        self._writer: Optional[CCFWriter] = None
+        self._file_rows = 0
+        self._buffer: List[list] = [[] for _ in headers]
+        self._buffered = 0
+
+    def __enter__(self) -> "_RowGroupSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.__exit__(exc_type, exc, tb)
+
+    def add(self, columns: Sequence[Sequence[Any]]) -> None:
+        for buf, col in zip(self._buffer, columns):
+            buf.extend(col)
+        self._buffered += len(columns[0]) if columns else 0
+        # Write full row groups from the front, then drop them in one go
+        start = 0
+        while self._buffered >= self.row_group_size:
+            start += self._flush(start, self.row_group_size)
+        if start:
+            for buf in self._buffer:
+                del buf[:start]
+
+    def _flush(self, start: int, nrows: int) -> int:
+        """
+        Writes up to `nrows` buffered rows from position `start` as a row group
+        and returns the number written.
+        """
+        if self._writer is None:
+            self._open()
+        if self.rows_per_file is not None:
+            nrows = min(nrows, self.rows_per_file - self._file_rows)
+        self._writer.write_values([buf[start:start + nrows] for buf in self._buffer])
+        self._buffered -= nrows
+        self._file_rows += nrows
+        if self.rows_per_file is not None and self._file_rows >= self.rows_per_file:
+            self._writer.close()
+            self._writer = None
+        return nrows
+
+    def _open(self) -> None:
+        path = next(self.paths)
+        self._writer = CCFWriter(path, **self.writer_options)
+        self._writer.open(self.headers, self.types)
+        self._file_rows = 0
+        self.written.append(path)
+
+    def close(self) -> None:
+        start = 0
+        while self._buffered:
+            start += self._flush(start, self._buffered)
+        self._buffer = [[] for _ in self.headers]
+        if not self.written:
+            self._open() # An empty input still gets an (empty) output file
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class _RunCursor:
+    """
+    Reads a sorted run one row group at a time and holds its rows that are
+    not merged yet, as columns.
+    """
+    def __init__(self, path: str, columns: List[str], key_index: int):
+        self._reader = CCFReader(path)
+        self._batches = self._reader.iter_batches(columns)
+        self.columns = columns
+        self.data: List[list] = [[] for _ in columns]
+        self.keys = self.data[key_index]
+        self.exhausted = False
+
+    def fill(self) -> None:
+        """
+        Loads row groups until some rows are held or the run is exhausted.
+        """
+        while not self.keys and not self.exhausted:
+            self.load()
+
+    def load(self) -> None:
+        batch = next(self._batches, None)
+        if batch is None:
+            self.exhausted = True
+            self.close()
+            return
+        for col, name in zip(self.data, self.columns):
+            col.extend(batch[name])
+
+    def take(self, nrows: int) -> List[list]:
+        """
+        Removes and returns the first `nrows` held rows.
+        """
+        taken = [col[:nrows] for col in self.data]
+        for col in self.data:
+            del col[:nrows]
+        return taken
+
+    def close(self) -> None:
+        self._reader.close()
+
+
+def _merge(runs: List[str], sink: _RowGroupSink, columns: List[str], key_index: int) -> None:
+    """
+    k-way merge of sorted runs into `sink`. Ties keep run order, so the sort is stable.
+
+    Rows are merged a batch at a time rather than one by one: every row below
+    the smallest last held key of the runs that are still being read (the
+    bound) is final, because no run can produce a smaller key. Those rows are
+    merged with one stable sort (timsort merges the sorted pieces in linear
+    time per piece). Rows equal to the bound follow in run order, up to the
+    first run that may still hold more of them.
+    """
+    cursors: List[_RunCursor] = []
+    try:
+        for path in runs:
+            cursors.append(_RunCursor(path, columns, key_index))
+        while True:
+            for cursor in cursors:
+                cursor.fill()
+            cursors = [cursor for cursor in cursors if cursor.keys]
+            if not cursors:
+                break
+            reading = [cursor.keys[-1] for cursor in cursors if not cursor.exhausted]
+            bound = min(reading) if reading else None
+            parts = []
+            for cursor in cursors:
+                nrows = len(cursor.keys) if bound is None else bisect_left(cursor.keys, bound)
+                if nrows:
+                    parts.append(cursor.take(nrows))
+            if len(parts) > 1:
+                merged = [list(itertools.chain.from_iterable(cols)) for cols in zip(*parts)]
+                keys = merged[key_index]
+                order = sorted(range(len(keys)), key=keys.__getitem__)
+                parts = [[[col[i] for i in order] for col in merged]]
+            if bound is not None:
+                for cursor in cursors:
+                    # Held keys are >= bound here, so these rows equal it
+                    nrows = bisect_right(cursor.keys, bound)
+                    if nrows:
+                        parts.append(cursor.take(nrows))
+                    if not cursor.keys and not cursor.exhausted:
+                        break # Its next row group may start with the bound too
+            for part in parts:
+                sink.add(part)
+    finally:
+        for cursor in cursors:
+            cursor.close()
+
+
+def _output_paths(output: str, rows_per_file: Optional[int]) -> Iterator[str]:
+    if rows_per_file is None:
+        yield output
+        return
+    os.makedirs(output, exist_ok=True)
+    i = 0
+    while True:
+        yield os.path.join(output, f'part-{i:05d}.ccf')
+        i += 1
+
+
+def compact(source: Union[str, CCFDataset], output: str, sort_by: Optional[str] = None,
+            rows_per_file: Optional[int] = None, memory_rows: int = DEFAULT_MEMORY_ROWS,
+            fan_in: int = DEFAULT_FAN_IN, temp_dir: Optional[str] = None,
+            **writer_options: Any) -> List[str]:
+    """
+    Merges the files of a dataset into one file, or into files of
+    `rows_per_file` rows, optionally sorted by a column. Partition columns are
+    stored as regular columns and types are widened as in `CCFDataset`. Values
+    are copied without going through text.
+
+    Args:
+        source: Dataset directory or an open `CCFDataset`.
+        output: Output file, or a directory for `part-NNNNN.ccf` files when
+            `rows_per_file` is set.
+        sort_by: Column to sort by (stable; input order is kept for equal keys).
+        rows_per_file: Start a new output file every this many rows.
+        memory_rows: Rows sorted in memory at a time; larger inputs are spilled
+            to sorted runs in `temp_dir` and merged.
+        fan_in: Maximum number of runs merged at once.
+        temp_dir: Directory for the runs (default: the system temporary directory).
+        writer_options: Passed to `CCFWriter` for the output files, e.g. `codec`,
+            `row_group_size` or `bloom_filters`.
+
+    Returns:
+        Paths of the files written.
+
+    Raises:
+        CCFColumnError: If `sort_by` is not a column of the dataset.
+        CCFSchemaError: If a file does not have all columns of the dataset
+            (CCF cannot store missing values).
+    """
+    if rows_per_file is not None and rows_per_file < 1:
+        raise ValueError("rows_per_file must be a positive integer.")
+    if memory_rows < 1:
+        raise ValueError("memory_rows must be a positive integer.")
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2.")
+    dataset = CCFDataset(source) if isinstance(source, str) else source
+    try:
+        columns = [name for name, _ in dataset.schema]
+        types = [dtype for _, dtype in dataset.schema]
+        if sort_by is not None and sort_by not in dataset.column_types:
+            raise CCFColumnError(f"Sort column '{sort_by}' not found. Available: {columns}")
+        for path in dataset.files:
+            present = set(dataset.file_reader(path).column_types) | set(dataset.partitions[path])
+            missing = [name for name in columns if name not in present]
+            if missing:
+                raise CCFSchemaError(f"'{path}' has no column(s) {missing}; cannot compact files with different columns.")
+
+        sink = _RowGroupSink(_output_paths(output, rows_per_file), columns, types, rows_per_file, writer_options)
+        with sink:
+            if sort_by is None:
+                for batch in dataset.iter_batches(columns, memory_rows):
+                    sink.add([batch[name] for name in columns])
+            else:
+                _sort(dataset, sink, columns, types, columns.index(sort_by), memory_rows, fan_in, temp_dir)
+        return sink.written
+    finally:
+        if isinstance(source, str):
+            dataset.close()
+
+
+def _sort(dataset: CCFDataset, sink: _RowGroupSink, columns: List[str], types: List[int],
+          key_index: int, memory_rows: int, fan_in: int, temp_dir: Optional[str]) -> None:
+    """
+    External merge sort of the dataset rows into `sink`.
+    """
+    # Runs are read one row group at a time while `fan_in` of them are merged
+    run_options = dict(_RUN_OPTIONS, row_group_size=max(_MIN_RUN_GROUP_ROWS, memory_rows // fan_in))
+    with tempfile.TemporaryDirectory(prefix='ccf-compact-', dir=temp_dir) as tmp:
+        buffer: List[list] = [[] for _ in columns]
+        runs: List[str] = []
+        numbers = itertools.count()
+
+        def new_run() -> _RowGroupSink:
+            path = os.path.join(tmp, f'run-{next(numbers)}.ccf')
+            return _RowGroupSink(iter([path]), columns, types, None, run_options)
+
+        def spill(target: _RowGroupSink) -> None:
+            keys = buffer[key_index]
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            target.add([[col[i] for i in order] for col in buffer])
+            for col in buffer:
+                col.clear()
+
+        # 1. Sorted runs
+        for batch in dataset.iter_batches(columns, memory_rows):
+            for col, name in zip(buffer, columns):
+                col.extend(batch[name])
+            if len(buffer[0]) >= memory_rows:
+                with new_run() as run:
+                    spill(run)
+                runs.extend(run.written)
+        if not runs:
+            spill(sink) # Everything fit in memory
+            return
+        if buffer[0]:
+            with new_run() as run:
+                spill(run)
+            runs.extend(run.written)
+
+        # 2. Merge passes until at most `fan_in` runs remain, then the final merge
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                with new_run() as run:
+                    _merge(group, run, columns, key_index)
+                merged.extend(run.written)
+                for path in group:
+                    os.remove(path)
+            runs = merged
+        _merge(runs, sink, columns, key_index)
@@ -0,0 +1,149 @@
+import bz2
+import lzma
+import time
+import zlib
+from typing import Any, Optional, Tuple
+from constants import CODEC_NONE, CODEC_ZLIB, CODEC_LZMA, CODEC_BZ2, CODEC_MAP, CODEC_POLICIES
+from exceptions import CCFError
+
+# Bytes of an uncompressed block used to trial-compress candidate codecs
+SAMPLE_SIZE = 64 * 1024
+
+# Codecs must save at least this fraction of a block to be worth decompressing
+MIN_SAVINGS = 0.1
+
+# "balanced" prefers a stronger codec over zlib only if it is this much smaller
+# and no more than this many times slower on the sample
+BALANCED_MIN_GAIN = 0.1
+BALANCED_MAX_SLOWDOWN = 5.0
+
+
+def _compress_none(data: bytes, level: Optional[int]) -> bytes:
+    return bytes(data)
+
+
+def _compress_zlib(data: bytes, level: Optional[int]) -> bytes:
+    return zlib.compress(data, -1 if level is None else level)
+
+
+def _compress_lzma(data: bytes, level: Optional[int]) -> bytes:
+    return lzma.compress(data, preset=level)
+
+
+def _compress_bz2(data: bytes, level: Optional[int]) -> bytes:
+    return bz2.compress(data, 9 if level is None else level)
+
+
+# codec id -> (compress(data, level), decompress(data))
+CODECS = {
+    CODEC_NONE: (_compress_none, bytes),
+    CODEC_ZLIB: (_compress_zlib, zlib.decompress),
+    CODEC_LZMA: (_compress_lzma, lzma.decompress),
+    CODEC_BZ2: (_compress_bz2, bz2.decompress),
+}
+
+# Errors raised by the decompressors on corrupt input
+_DECOMPRESS_ERRORS = (zlib.error, lzma.LZMAError, OSError, ValueError, EOFError)
+
+
+def codec_id(name: str) -> int:
+    """
+    Look up a codec ID by name ("none", "zlib", "lzma" or "bz2").
+
+    Raises:
+        CCFError: If the codec is unknown.
+    """
+    for cid, cname in CODEC_MAP.items():
+        if cname == name:
+            return cid
+    raise CCFError(f"Unknown codec '{name}'. Available: {list(CODEC_MAP.values())}")
+
+
+def compress(codec: int, data: bytes, level: Optional[int] = None) -> bytes:
+    """
+    Compress `data` with the given codec. `level` is the zlib/bz2 level or
+    the lzma preset; None uses the codec default.
+    """
+    try:
+        compress_fn, _ = CODECS[codec]
+    except KeyError:
+        raise CCFError(f"Unsupported codec: {codec}.")
+    try:
+        return compress_fn(data, level)
+    except (ValueError, lzma.LZMAError) as e:
+        raise CCFError(f"Invalid level {level} for codec '{CODEC_MAP[codec]}': {e}") from e
+
+
+def decompress(codec: int, data: Any) -> bytes:
+    """
+    Decompress a block written with the given codec.
+
+    Raises:
+        CCFError: If the codec is unknown or the data is corrupt.
+    """
+    try:
+        _, decompress_fn = CODECS[codec]
+    except KeyError:
+        raise CCFError(f"Unsupported codec: {codec}.")
+    try:
+        return decompress_fn(data)
+    except _DECOMPRESS_ERRORS as e:
+        raise CCFError(f"{CODEC_MAP[codec]} decompression failed: {e}") from e
+
+
+def _trial(codec: int, sample: bytes, level: Optional[int]) -> Tuple[int, float]:
+    """
+    Compress and decompress `sample`, returning (compressed size, seconds taken).
+    """
+    start = time.perf_counter()
+    compressed = compress(codec, sample, level)
+    decompress(codec, compressed)
+    return len(compressed), time.perf_counter() - start
+
+
+def choose_codec(raw_bytes: bytes, policy: str, level: Optional[int] = None) -> int:
+    """
+    Pick a codec for a column by trial-compressing a sample of its first block.
+
+    Policies:
+        fastest:  zlib level 1 if it saves at least MIN_SAVINGS, else no compression.
+        smallest: whichever of zlib (level 9), lzma and bz2 gives the smallest output.
+        balanced: zlib, unless lzma/bz2 is notably smaller and not much slower;
+                  no compression if nothing saves at least MIN_SAVINGS.
+
+    Args:
+        raw_bytes: Uncompressed block of the column.
+        policy: One of CODEC_POLICIES.
+        level: Level used for zlib under the "balanced" policy.
+
+    Returns:
+        The selected codec ID.
+    """
+    if policy not in CODEC_POLICIES:
+        raise CCFError(f"Unknown codec policy '{policy}'. Available: {list(CODEC_POLICIES)}")
+    sample = bytes(raw_bytes[:SAMPLE_SIZE])
+    if not sample:
+        return CODEC_NONE
+    limit = len(sample) * (1 - MIN_SAVINGS)
+
+    if policy == 'fastest':
+        size, _ = _trial(CODEC_ZLIB, sample, 1)
+        return CODEC_ZLIB if size <= limit else CODEC_NONE
+
+    if policy == 'smallest':
+        sizes = {
+            CODEC_ZLIB: _trial(CODEC_ZLIB, sample, 9)[0],
+            CODEC_LZMA: _trial(CODEC_LZMA, sample, None)[0],
+            CODEC_BZ2: _trial(CODEC_BZ2, sample, None)[0],
+        }
+        return min(sizes, key=lambda c: (sizes[c], c))
+
+    # balanced
+    zlib_size, zlib_time = _trial(CODEC_ZLIB, sample, level)
+    best, best_size = CODEC_ZLIB, zlib_size
+    for candidate in (CODEC_LZMA, CODEC_BZ2):
+        size, elapsed = _trial(candidate, sample, None)
+        if (size < best_size and size <= zlib_size * (1 - BALANCED_MIN_GAIN)
+                and elapsed <= max(zlib_time, 1e-6) * BALANCED_MAX_SLOWDOWN):
+            best, best_size = candidate, size
+    return best if best_size <= limit else CODEC_NONE
@@ -1,16 +1,78 @@
 # Custom Columnar Format (CCF) Constants
 
 MAGIC = b'CCF1'
-VERSION = 1
+VERSION = 4
+
+# Versions this implementation is able to read.
+# Version 1: single block per column, metadata table after the schema.
+# Version 2: row groups, metadata footer referenced from the header.
+# Version 3: column chunks split into pages, with a page index in the footer.
+# Version 4: optional Bloom filter per column chunk, referenced from the footer.
+SUPPORTED_VERSIONS = (1, 2, 3, 4)
+
+# Default number of rows buffered per row group by the streaming writer
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# Default number of rows per independently compressed page of a column chunk
+DEFAULT_PAGE_ROWS = 8192
+
+# Default false-positive rate of per-chunk Bloom filters
+DEFAULT_BLOOM_FPP = 0.01
+
+# Fraction of distinct values below which STRING chunks are dictionary encoded
+DEFAULT_DICTIONARY_RATIO = 0.5
+
+# Memory budget of the shared decoded-column cache, in bytes
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
 
 # Data Types
 TYPE_INT = 1
 TYPE_FLOAT = 2
 TYPE_STRING = 3
+TYPE_INT64 = 4
+TYPE_BOOL = 5
+TYPE_TIMESTAMP = 6
 
 # String representation for debugging/schema display
 TYPE_MAP = {
     TYPE_INT: "int",
     TYPE_FLOAT: "float",
-    TYPE_STRING: "string"
+    TYPE_STRING: "string",
+    TYPE_INT64: "int64",
+    TYPE_BOOL: "bool",
+    TYPE_TIMESTAMP: "timestamp"
+}
+
+# Integer types stored as fixed-width little-endian values, with their size in bytes
+INTEGER_TYPES = {TYPE_INT: 4, TYPE_INT64: 8, TYPE_TIMESTAMP: 8}
+
+# Chunk Encodings (layout of a block once decompressed)
+ENCODING_PLAIN = 0
+ENCODING_DICTIONARY = 1
+ENCODING_DELTA = 2
+ENCODING_FOR = 3
+ENCODING_RLE = 4
+
+ENCODING_MAP = {
+    ENCODING_PLAIN: "plain",
+    ENCODING_DICTIONARY: "dictionary",
+    ENCODING_DELTA: "delta",
+    ENCODING_FOR: "bitpacked",
+    ENCODING_RLE: "rle"
 }
+
+# Compression Codecs (per column chunk)
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_BZ2 = 3
+
+CODEC_MAP = {
+    CODEC_NONE: "none",
+    CODEC_ZLIB: "zlib",
+    CODEC_LZMA: "lzma",
+    CODEC_BZ2: "bz2"
+}
+
+# Automatic codec selection policies
+CODEC_POLICIES = ("fastest", "balanced", "smallest")
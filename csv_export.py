@@ -0,0 +1,110 @@
+import csv
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TextIO
+from constants import TYPE_BOOL, TYPE_TIMESTAMP, TYPE_STRING
+from reader import CCFReader
+from predicates import Predicate
+
+
+def format_values(values: List[Any], dtype: int) -> List[Any]:
+    """
+    Prepares one column for csv.writer. Numbers and strings are passed through
+    (csv.writer formats them in C); timestamps become ISO 8601 strings and
+    bools "true" / "false", the spellings the writer infers those types from.
+    """
+    if dtype == TYPE_TIMESTAMP:
+        return list(map(datetime.isoformat, values))
+    if dtype == TYPE_BOOL:
+        return ['true' if v else 'false' for v in values]
+    return values
+
+
+# Characters that make csv.writer quote a field (with the default dialect)
+_SPECIAL_CHARS = (',', '"', '\r', '\n')
+_LINE_TERMINATOR = '\r\n'
+
+
+def _join_lines(cols: List[List[Any]], types: List[Optional[int]]) -> Optional[str]:
+    """
+    Renders a batch exactly as csv.writer would, but with str.join in C, when
+    no field needs quoting. Numbers, timestamps and bools never do; string
+    columns are checked in bulk. Returns None if the batch needs csv.writer.
+    """
+    texts = []
+    for values, dtype in zip(cols, types):
+        if dtype == TYPE_STRING:
+            blob = '\x00'.join(values)
+            if any(c in blob for c in _SPECIAL_CHARS):
+                return None
+            if len(cols) == 1 and '' in values:
+                return None # csv.writer writes a row holding one empty field as ""
+            texts.append(values)
+        else:
+            texts.append(list(map(str, values)))
+    if not texts or not texts[0]:
+        return ''
+    return _LINE_TERMINATOR.join(map(','.join, zip(*texts))) + _LINE_TERMINATOR
+
+
+def format_columns(data: Dict[str, List[Any]], column_types: Dict[str, int]) -> List[List[Any]]:
+    """
+    Formats a column-oriented result (e.g. from `read_columns`) for csv.writer.
+    Columns missing from `column_types` are passed through unchanged.
+    """
+    return [format_values(values, column_types.get(name, 0)) for name, values in data.items()]
+
+
+def write_csv(reader: CCFReader, out: TextIO, columns: Optional[List[str]] = None,
+              batch_rows: Optional[int] = None, where: Optional[List[Predicate]] = None) -> int:
+    """
+    Streams columns of a CCF file to CSV, one row group at a time.
+
+    Each batch is transposed in bulk with zip() and written in one call, so
+    memory stays bounded by the row group size. Batches without fields that
+    need quoting are joined directly; others go through `csv.writer.writerows`.
+    The output is the same either way.
+
+    Args:
+        reader: Reader of the file to export.
+        out: Text file opened with newline=''.
+        columns: Columns to export, in order. If None, exports all columns.
+        batch_rows: Rows per batch; defaults to one batch per row group.
+        where: Optional filter predicates; only matching rows are written.
+
+    Returns:
+        Number of data rows written.
+
+    Raises:
+        CCFColumnError: If a requested column does not exist.
+        CCFQueryError: If a predicate is invalid.
+        CCFError: If data corruption or IO errors occur.
+    """
+    if columns is None:
+        columns = [name for name, _ in reader.schema]
+    csv_writer = csv.writer(out)
+    csv_writer.writerow(columns)
+    types = [reader.column_types.get(name) for name in columns]
+
+    nrows = 0
+    for batch in reader.iter_batches(columns, batch_rows, where=where):
+        cols = [format_values(batch[name], dtype) for name, dtype in zip(columns, types)]
+        text = _join_lines(cols, types)
+        if text is None:
+            csv_writer.writerows(zip(*cols))
+        else:
+            out.write(text)
+        nrows += len(cols[0]) if cols else 0
+    return nrows
+
+
+def export_csv(ccf_path: str, csv_path: str, columns: Optional[List[str]] = None,
+               **reader_options: Any) -> int:
+    """
+    Exports a CCF file to a CSV file. Extra keyword arguments are passed to CCFReader.
+
+    Returns:
+        Number of data rows written.
+    """
+    with CCFReader(ccf_path, **reader_options) as reader:
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            return write_csv(reader, f, columns)
@@ -0,0 +1,338 @@
+import csv
+import gc
+import io
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from constants import CODEC_POLICIES
+from exceptions import CCFSchemaError
+from writer import CCFWriter, build_chunk, infer_and_convert, widen_type
+import compression
+
+# Parallel CSV ingest. The input is split into byte ranges that start and end
+# on record boundaries, and a process pool parses them in two phases:
+#
+#   1. every worker infers the column types of its range; the results are
+#      widened into one type per column,
+#   2. every worker parses its range again and builds finished row groups
+#      (converted, encoded and compressed chunks) with those types.
+#
+# The main process only writes the row groups, in input order.
+#
+# Range boundaries are found by counting quote characters, which assumes that
+# quotes only delimit quoted fields. csv.reader also accepts bare quotes inside
+# unquoted fields (`5" screen`), which break that assumption, so phase 1 checks
+# each range against csv.reader and the input is split again by parsing it
+# sequentially if a check fails.
+
+# Approximate size of one byte range. Each range ends with a partial row group,
+# so ranges should hold many row groups' worth of rows.
+DEFAULT_RANGE_BYTES = 64 * 1024 * 1024
+
+# Block size used when scanning for record boundaries
+_SCAN_BLOCK = 1024 * 1024
+
+# A byte range of the input: (start offset, end offset)
+ByteRange = Tuple[int, int]
+
+
+def _record_end(f, pos: int, quotes: int) -> int:
+    """
+    Returns the position just after the first newline at or after `pos` that
+    is outside a quoted field, given the number of quote characters seen
+    between the start of the data and `pos`. Quotes inside fields are doubled
+    in CSV, so a newline is outside quotes when the count before it is even.
+    Returns the end of the file if there is no such newline.
+    """
+    f.seek(pos)
+    while True:
+        block = f.read(_SCAN_BLOCK)
+        if not block:
+            return pos
+        start = 0
+        while True:
+            nl = block.find(b'\n', start)
+            if nl < 0:
+                break
+            quotes += block.count(b'"', start, nl)
+            if quotes % 2 == 0:
+                return pos + nl + 1
+            start = nl + 1
+        quotes += block.count(b'"', start)
+        pos += len(block)
+
+
+class _SplitError(Exception):
+    """
+    Raised by a worker when quote counting and csv.reader disagree about where
+    the records of its byte range end.
+    """
+
+
+def split_ranges(path: str, parts: int, start: int = 0) -> List[ByteRange]:
+    """
+    Splits the bytes of a CSV file from `start` to the end into at most `parts`
+    ranges of similar size, each made of whole records.
+
+    The file is read once (counting quote characters in C) to keep track of
+    which newlines end a record and which are part of a quoted field.
+    """
+    size = os.path.getsize(path)
+    if size <= start:
+        return []
+    targets = [start + (size - start) * i // parts for i in range(1, parts)]
+    bounds = [start]
+    with open(path, 'rb') as f:
+        pos, quotes = start, 0
+        for target in targets:
+            if target <= bounds[-1]:
+                continue
+            # Count quotes up to the target, then find the next record boundary
+            f.seek(pos)
+            remaining = target - pos
+            while remaining > 0:
+                block = f.read(min(_SCAN_BLOCK, remaining))
+                if not block:
+                    break
+                quotes += block.count(b'"')
+                remaining -= len(block)
+            end = _record_end(f, target, quotes)
+            if end >= size:
+                break
+            f.seek(target)
+            quotes += f.read(end - target).count(b'"')
+            pos = end
+            bounds.append(end)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def split_records(path: str, parts: int, start: int = 0) -> List[ByteRange]:
+    """
+    Splits the bytes of a CSV file like `split_ranges`, but finds record
+    boundaries by parsing the file with csv.reader. Slower (the whole file is
+    parsed in this process), but correct for any input csv.reader accepts.
+    """
+    size = os.path.getsize(path)
+    if size <= start:
+        return []
+    targets = iter([start + (size - start) * i // parts for i in range(1, parts)])
+    target = next(targets, None)
+    bounds = [start]
+    pos = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+
+        def lines() -> Iterator[str]:
+            nonlocal pos
+            for line in f:
+                pos += len(line)
+                yield line.decode('utf-8')
+
+        # csv.reader pulls one line at a time, so `pos` is the end of each record it yields
+        for _ in csv.reader(lines()):
+            if target is None or pos < target:
+                continue
+            if pos < size:
+                bounds.append(pos)
+            while target is not None and target <= pos:
+                target = next(targets, None)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    """
+    Parses the header record of a CSV file.
+
+    Returns:
+        (column names, byte offset of the first data record)
+    """
+    with open(path, 'rb') as f:
+        end = _record_end(f, 0, 0)
+        f.seek(0)
+        raw = f.read(end)
+    headers = next(csv.reader(io.StringIO(raw.decode('utf-8'), newline='')), [])
+    return headers, end
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """
+    Pauses the cyclic garbage collector. Parsing a range allocates millions of
+    row lists, none of them part of a reference cycle, and repeated collections
+    over them otherwise take longer than the parsing itself.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _check_quotes(text: str, rows: List[List[str]], byte_range: ByteRange) -> None:
+    """
+    Checks that csv.reader ends records exactly at the line ends where the
+    number of quote characters since the start of the range is even, as
+    `split_ranges` assumed when it placed the range boundaries.
+
+    Raises:
+        _SplitError: If a bare quote in an unquoted field breaks the count.
+    """
+    # Quotes that only delimit fields never end up in the values
+    if '"' not in text or '"' not in '\x00'.join(itertools.chain.from_iterable(rows)):
+        return
+    lines = io.StringIO(text, newline='').readlines()
+    reader = csv.reader(lines)
+    ends = set()
+    for _ in reader:
+        ends.add(reader.line_num)
+    quotes = 0
+    for number, line in enumerate(lines, 1):
+        quotes += line.count('"')
+        if (number in ends) == (quotes % 2 == 1):
+            raise _SplitError(f"Quote counting misplaced a record boundary in bytes {byte_range[0]}-{byte_range[1]}.")
+
+
+def _parse_range(path: str, byte_range: ByteRange, ncols: int, check_quotes: bool = False) -> List[List[str]]:
+    """
+    Parses the records of one byte range, checking that every row has `ncols`
+    values and, with `check_quotes`, that the range boundaries are record
+    boundaries (see `_check_quotes`).
+    """
+    start, end = byte_range
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    rows = list(csv.reader(io.StringIO(text, newline='')))
+    if check_quotes:
+        _check_quotes(text, rows, byte_range)
+    for i, row in enumerate(rows):
+        if len(row) != ncols:
+            raise CCFSchemaError(
+                f"Row {i + 1} of bytes {start}-{end} has {len(row)} values, expected {ncols}.")
+    return rows
+
+
+def _infer_range(path: str, byte_range: ByteRange, ncols: int,
+                 check_quotes: bool) -> Tuple[int, List[Optional[int]]]:
+    """
+    Phase 1 worker: returns (row count, type of each column or None if the range is empty).
+    """
+    with _gc_paused():
+        rows = _parse_range(path, byte_range, ncols, check_quotes)
+        if not rows:
+            return 0, [None] * ncols
+        return len(rows), [infer_and_convert(col)[0] for col in zip(*rows)]
+
+
+def _encode_range(path: str, byte_range: ByteRange, ncols: int, types: List[Optional[int]],
+                  row_group_size: int, dictionary_ratio: float, int_encodings: bool,
+                  codec_specs: List[tuple], page_rows: Optional[int],
+                  bloom_fpps: List[Optional[float]]) -> List[tuple]:
+    """
+    Phase 2 worker: returns the range as a list of (nrows, chunks) row groups
+    ready for `CCFWriter.write_row_group`.
+    """
+    with _gc_paused():
+        rows = _parse_range(path, byte_range, ncols)
+        groups = []
+        for offset in range(0, len(rows), row_group_size):
+            group = rows[offset:offset + row_group_size]
+            chunks = [build_chunk(col, dtype, False, dictionary_ratio, int_encodings, *spec, page_rows, fpp)
+                      for col, dtype, spec, fpp in zip(zip(*group), types, codec_specs, bloom_fpps)]
+            groups.append((len(group), chunks))
+        return groups
+
+
+def _codec_specs(writer: CCFWriter, headers: List[str]) -> List[tuple]:
+    """
+    Resolves the (codec id or policy name, level) each column is built with.
+    Policies are evaluated per range, so chunks of a column may use different codecs.
+    """
+    specs = []
+    for name in headers:
+        spec = writer.column_codecs.get(name, writer.codec)
+        if spec not in CODEC_POLICIES:
+            spec = compression.codec_id(spec)
+        specs.append((spec, writer.compression_level))
+    return specs
+
+
+def ingest_csv(csv_path: str, writer: CCFWriter, workers: Optional[int] = None,
+               range_bytes: int = DEFAULT_RANGE_BYTES, append: bool = False) -> int:
+    """
+    Converts a CSV file to CCF, parsing and encoding byte ranges of the input
+    in a process pool. Types are inferred over the whole file, as `CCFWriter.write`
+    does for in-memory tables, so every chunk of a column has the same type.
+
+    Args:
+        csv_path: Input CSV file (UTF-8, first record is the header).
+        writer: A configured, unopened writer; its row group size, encoding and
+            codec settings are used by the workers. Its own `workers` are not used.
+        workers: Number of worker processes (default: number of CPUs).
+        range_bytes: Approximate size of the byte range handled per task.
+        append: Add the rows to the writer's existing output file (see
+            `CCFWriter.open_append`); column types are widened with the file's.
+
+    Returns:
+        Number of data rows written.
+
+    Raises:
+        CCFSchemaError: If a row does not have one value per column, or the
+            header does not match the file appended to.
+    """
+    workers = workers or os.cpu_count() or 1
+    headers, data_start = read_header(csv_path)
+    size = os.path.getsize(csv_path)
+    parts = max(workers, -(-(size - data_start) // range_bytes))
+    ranges = split_ranges(csv_path, parts, data_start)
+    ncols = len(headers)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Phase 1: infer types per range and reconcile them
+        try:
+            inferred = list(pool.map(_infer_range, *zip(*[(csv_path, r, ncols, True) for r in ranges])))
+        except _SplitError:
+            # Bare quotes in the input: split it again by parsing
+            ranges = split_records(csv_path, parts, data_start)
+            inferred = list(pool.map(_infer_range, *zip(*[(csv_path, r, ncols, False) for r in ranges])))
+        types: List[Optional[int]] = [None] * ncols
+        nrows = 0
+        for count, range_types in inferred:
+            nrows += count
+            for i, dtype in enumerate(range_types):
+                if dtype is not None:
+                    types[i] = dtype if types[i] is None else widen_type(types[i], dtype)
+
+        # Phase 2: build row groups in the workers, write them in order. At most
+        # two tasks per worker are in flight to bound memory.
+        if append:
+            writer.open_append(headers)
+        else:
+            writer.open(headers, types)
+        args = (ncols, types, writer.row_group_size, writer.dictionary_ratio,
+                writer.int_encodings, _codec_specs(writer, headers), writer.file_page_rows,
+                [writer.file_bloom_filters.get(name) for name in headers])
+        queue = iter(ranges)
+        pending = []
+        with writer: # Closes the file, or discards it if a worker fails
+            try:
+                for byte_range in queue:
+                    pending.append(pool.submit(_encode_range, csv_path, byte_range, *args))
+                    if len(pending) >= 2 * workers:
+                        break
+                while pending:
+                    for group_rows, chunks in pending.pop(0).result():
+                        writer.write_row_group(group_rows, chunks)
+                    byte_range = next(queue, None)
+                    if byte_range is not None:
+                        pending.append(pool.submit(_encode_range, csv_path, byte_range, *args))
+            finally:
+                for future in pending:
+                    future.cancel()
+    return nrows
@@ -17,10 +17,10 @@ def convert_csv_to_ccf(csv_path, ccf_path):
                 headers = next(reader)
             except StopIteration:
                 headers = []
-            rows = list(reader)
-            
-        writer = CCFWriter(ccf_path)
-        writer.write(headers, rows)
+
+            # Stream rows so only one row group is held in memory
+            writer = CCFWriter(ccf_path)
+            writer.write(headers, reader)
         print("Conversion successful.")
     except Exception as e:
         print(f"Error during conversion: {e}")
@@ -1,8 +1,7 @@
 import sys
 import os
-import csv
 import argparse
-from reader import CCFReader
+from csv_export import export_csv
 
 def convert_ccf_to_csv(ccf_path, csv_path, columns=None):
     if not os.path.exists(ccf_path):
@@ -12,30 +11,8 @@ def convert_ccf_to_csv(ccf_path, csv_path, columns=None):
     print(f"Converting '{ccf_path}' to '{csv_path}'...")
     
     try:
-        reader = CCFReader(ccf_path)
-        
-        # Determine columns to read
-        if columns:
-            cols_to_read = columns
-        else:
-            cols_to_read = [name for name, _ in reader.schema]
-            
-        vals = reader.read_columns(cols_to_read)
-        nrows = reader.nrows
-        
-        # Write CSV
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerow(cols_to_read)
-            
-            for i in range(nrows):
-                row = []
-                for h in cols_to_read:
-                    if h in vals and i < len(vals[h]):
-                        row.append(str(vals[h][i]))
-                    else:
-                        row.append("")
-                csv_writer.writerow(row)
+        # Streams one row group at a time, so memory does not grow with the file
+        export_csv(ccf_path, csv_path, columns)
         print("Conversion successful.")
         
     except Exception as e:
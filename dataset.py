@@ -0,0 +1,306 @@
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union
+from urllib.parse import unquote
+from constants import TYPE_TIMESTAMP
+from exceptions import CCFColumnError, CCFError, CCFSchemaError
+from predicates import Predicate, normalize_predicates, match_rows
+from reader import CCFReader, cast_values, take_values
+from writer import infer_and_convert, widen_type
+from cache import ColumnCache
+from catalog import Catalog, CATALOG_NAME, find_files
+import timestamps
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def parse_partition(relative_path: str) -> Dict[str, str]:
+    """
+    Extracts hive-style partition keys from the directories of a path relative
+    to the dataset root, e.g. "date=2026-10-01/region=eu/part-0.ccf" gives
+    {"date": "2026-10-01", "region": "eu"}. Values are URL-decoded.
+    """
+    partition = {}
+    for part in relative_path.replace(os.sep, '/').split('/')[:-1]:
+        key, sep, value = part.partition('=')
+        if sep and key:
+            partition[unquote(key)] = unquote(value)
+    return partition
+
+
+class CCFDataset:
+    """
+    A directory of CCF files read as one table.
+
+    Files are discovered recursively. Directories named `key=value`
+    (hive-style partitioning) add a column `key` whose value is constant within
+    each file; its type is inferred from all values of the key, like a CSV column.
+    The dataset schema is the union of the file schemas, with types widened
+    across files; columns missing from a file are read as None.
+
+    Filters on partition columns select files without opening their data, and
+    the remaining filters are pushed down to each file (pruning row groups by
+    statistics). Selected files are read in parallel with `workers` threads.
+
+    With `catalog`, file metadata is taken from a `Catalog` instead of being
+    read from every file. Pass a Catalog, or True to load the directory's
+    catalog file if there is one (see `ccf.py catalog`).
+    """
+    def __init__(self, root: str, workers: int = 1, use_mmap: bool = False,
+                 cache: Union[ColumnCache, bool, None] = None,
+                 catalog: Union[Catalog, bool, None] = None):
+        if workers < 1:
+            raise ValueError("workers must be a positive integer.")
+        if not os.path.isdir(root):
+            raise CCFError(f"Dataset directory '{root}' not found.")
+        self.root = root
+        self.workers = workers
+        self.use_mmap = use_mmap
+        self.cache = cache
+        if catalog is True:
+            catalog = Catalog.load(root) if os.path.exists(os.path.join(root, CATALOG_NAME)) else None
+        self.catalog: Optional[Catalog] = catalog or None
+        self.files: List[str] = [] # Paths of the data files, in sorted order
+        self.partitions: Dict[str, Dict[str, Any]] = {} # path -> {key: typed value}
+        self.partition_keys: List[str] = []
+        self.schema: List[Tuple[str, int]] = [] # List of (name, dtype), partition keys last
+        self.column_types: Dict[str, int] = {}
+        self._readers: Dict[str, CCFReader] = {}
+        self._discover()
+
+    def _discover(self) -> None:
+        """
+        Finds the data files, parses their partitions and builds the unified schema.
+        """
+        self.files = find_files(self.root)
+
+        raw_partitions = {path: parse_partition(os.path.relpath(path, self.root)) for path in self.files}
+        keys = list(dict.fromkeys(k for p in raw_partitions.values() for k in p))
+        key_types = {}
+        for key in keys:
+            values = [p[key] for p in raw_partitions.values() if key in p]
+            dtype, converted = infer_and_convert(values)
+            if dtype == TYPE_TIMESTAMP:
+                converted = timestamps.from_micros_list(converted)
+            key_types[key] = dtype
+            converted = iter(converted)
+            for path in self.files:
+                if key in raw_partitions[path]:
+                    self.partitions.setdefault(path, {})[key] = next(converted)
+        for path in self.files:
+            self.partitions.setdefault(path, {})
+
+        column_types: Dict[str, int] = {}
+        for path in self.files:
+            reader = self.file_reader(path)
+            for name, dtype in reader.schema:
+                if name in key_types:
+                    raise CCFSchemaError(f"Column '{name}' of '{path}' is also a partition key.")
+                column_types[name] = dtype if name not in column_types else widen_type(column_types[name], dtype)
+
+        self.partition_keys = keys
+        self.schema = list(column_types.items()) + [(key, key_types[key]) for key in keys]
+        self.column_types = dict(self.schema)
+
+    def file_reader(self, path: str) -> CCFReader:
+        """
+        Returns the reader of one of the dataset's files, opening it on first use.
+        Readers are owned by the dataset and closed by `close()`.
+        """
+        reader = self._readers.get(path)
+        if reader is None:
+            metadata = self.catalog.lookup(path) if self.catalog is not None else None
+            reader = CCFReader(path, use_mmap=self.use_mmap, cache=self.cache, metadata=metadata)
+            self._readers[path] = reader
+        return reader
+
+    def close(self) -> None:
+        """
+        Closes the readers of all files.
+        """
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+    def __enter__(self) -> "CCFDataset":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def nrows(self) -> int:
+        return sum(self.file_reader(path).nrows for path in self.files)
+
+    def select_files(self, where: Optional[List[Predicate]] = None) -> List[str]:
+        """
+        Returns the files that can hold rows matching `where`, judged by their
+        partition values and their row group statistics (no data is read).
+        """
+        predicates = normalize_predicates(where, self.column_types)
+        return [path for path, _, _ in self._plan(predicates)]
+
+    def _plan(self, predicates: List[Predicate]) -> List[Tuple[str, List[Predicate], List[Predicate]]]:
+        """
+        Returns (path, pushed, residual) for every file that may match.
+        Predicates are pushed down to the file reader when the file stores the
+        column with the dataset type; otherwise (a narrower type in this file)
+        they are residual and evaluated after the values are converted.
+        """
+        plan = []
+        for path in self.files:
+            partition = self.partitions[path]
+            if not all(column in partition and match_rows([partition[column]], op, value)[0]
+                       for column, op, value in predicates if column in self.partition_keys):
+                continue
+            reader = self.file_reader(path)
+            pushed, residual = [], []
+            for column, op, value in predicates:
+                if column in self.partition_keys:
+                    continue
+                if column not in reader.column_types:
+                    break # Missing values (None) never match a filter
+                if reader.column_types[column] == self.column_types[column]:
+                    pushed.append((column, op, value))
+                else:
+                    residual.append((column, op, value))
+            else:
+                if not pushed or reader.select_row_groups(pushed):
+                    plan.append((path, pushed, residual))
+        return plan
+
+    def _resolve_columns(self, columns: Optional[List[str]]) -> List[str]:
+        if columns is None:
+            return [name for name, _ in self.schema]
+        for name in columns:
+            if name not in self.column_types:
+                raise CCFColumnError(f"Column '{name}' not found in dataset. Available: {list(self.column_types.keys())}")
+        return list(columns)
+
+    def _complete(self, path: str, batch: Dict[str, Any], columns: List[str], nrows: int) -> Dict[str, Any]:
+        """
+        Adds partition and missing columns to a batch read from one file and
+        converts values to the dataset column types.
+        """
+        reader = self.file_reader(path)
+        partition = self.partitions[path]
+        out = {}
+        for name in columns:
+            if name in partition:
+                out[name] = [partition[name]] * nrows
+            elif name not in batch:
+                out[name] = [None] * nrows
+            else:
+                values = batch[name]
+                dtype = self.column_types[name]
+                if reader.column_types[name] != dtype:
+                    values = cast_values(values, reader.column_types[name], dtype)
+                out[name] = values
+        return out
+
+    def _scan_file(self, path: str, columns: List[str], pushed: List[Predicate], residual: List[Predicate],
+                   as_arrays: bool, batch_rows: Optional[int] = None,
+                   stream: bool = False) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yields (nrows, batch) for the matching rows of one file, either as one
+        batch (`read_columns`) or streamed (`iter_batches`).
+        """
+        reader = self.file_reader(path)
+        wanted = list(dict.fromkeys(columns + [column for column, _, _ in residual]))
+        # Read at least one column to learn the number of matching rows
+        scan = [name for name in wanted if name in reader.column_types] or [name for name, _ in reader.schema][:1]
+        if not scan:
+            return
+        if stream:
+            batches = reader.iter_batches(scan, batch_rows, as_arrays, pushed)
+        else:
+            batches = [reader.read_columns(scan, as_arrays, pushed)]
+        for batch in batches:
+            data = self._complete(path, batch, wanted, len(batch[scan[0]]))
+            if residual:
+                mask = [all(m) for m in zip(*[match_rows(data[column], op, value)
+                                              for column, op, value in residual])]
+                indices = [i for i, keep in enumerate(mask) if keep]
+                data = {name: take_values(data[name], indices) for name in columns}
+            else:
+                data = {name: data[name] for name in columns}
+            nrows = len(data[columns[0]]) if columns else len(batch[scan[0]])
+            if nrows:
+                yield nrows, data
+
+    def read_columns(self, columns: Optional[List[str]] = None,
+                     as_arrays: bool = False,
+                     where: Optional[List[Predicate]] = None) -> Dict[str, Any]:
+        """
+        Reads columns from all files that may match `where` and combines them.
+
+        Args:
+            columns: Column names to read, including partition keys. If None, reads all columns.
+            as_arrays: Return fixed-width columns as typed buffers where every
+                file has the column (see `CCFReader.read_columns`).
+            where: Filter predicates on data or partition columns, combined with AND.
+
+        Returns:
+            Dictionary mapping column names to values, in file order.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist in any file.
+            CCFQueryError: If a predicate is invalid.
+            CCFError: If data corruption or IO errors occur.
+        """
+        columns = self._resolve_columns(columns)
+        predicates = normalize_predicates(where, self.column_types)
+        plan = self._plan(predicates)
+
+        def read(task: tuple) -> List[Tuple[int, Dict[str, Any]]]:
+            path, pushed, residual = task
+            return list(self._scan_file(path, columns, pushed, residual, as_arrays))
+
+        if self.workers > 1 and len(plan) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(read, plan))
+        else:
+            results = [read(task) for task in plan]
+        parts = [data for result in results for _, data in result]
+        return {name: _combine([data[name] for data in parts]) for name in columns}
+
+    def iter_batches(self, columns: Optional[List[str]] = None,
+                     batch_rows: Optional[int] = None,
+                     as_arrays: bool = False,
+                     where: Optional[List[Predicate]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streams batches from the matching files, file by file. Batches do not
+        span files; within a file they follow `CCFReader.iter_batches`.
+        """
+        if batch_rows is not None and batch_rows < 1:
+            raise ValueError("batch_rows must be a positive integer.")
+        columns = self._resolve_columns(columns)
+        predicates = normalize_predicates(where, self.column_types)
+        for path, pushed, residual in self._plan(predicates):
+            for _, batch in self._scan_file(path, columns, pushed, residual, as_arrays, batch_rows, stream=True):
+                yield batch
+
+
+def _combine(parts: List[Any]) -> Any:
+    """
+    Concatenates per-file values. Typed buffers are joined as buffers when all
+    parts are buffers of the same kind; otherwise the result is a list.
+    """
+    if not parts:
+        return []
+    if len(parts) == 1:
+        return parts[0]
+    if all(isinstance(p, array) for p in parts) and len({p.typecode for p in parts}) == 1:
+        joined = array(parts[0].typecode)
+        for part in parts:
+            joined.extend(part)
+        return joined
+    if np is not None and all(isinstance(p, np.ndarray) for p in parts) and len({p.dtype for p in parts}) == 1:
+        return np.concatenate(parts)
+    joined = []
+    for part in parts:
+        joined.extend(part)
+    return joined
@@ -17,3 +17,7 @@ class CCFColumnError(CCFError):
 class CCFSchemaError(CCFError):
     """Raised when there is an issue with the schema."""
     pass
+
+class CCFQueryError(CCFError):
+    """Raised when a filter predicate or query is invalid."""
+    pass
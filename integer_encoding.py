@@ -0,0 +1,264 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain, groupby, repeat
+from operator import add
+from typing import List, Optional, Sequence, Tuple
+from constants import ENCODING_DELTA, ENCODING_FOR, ENCODING_RLE
+from exceptions import CCFError
+
+# Lightweight encodings for integer chunks (INT, INT64 and TIMESTAMP). All of them are built on one
+# primitive, a frame-of-reference block:
+#
+#   [reference (8, int64)] [bit width (1)] [packed (value - reference) ...]
+#
+# Bit widths are rounded up to 0, 1, 2, 4, 8, 16, 32 or 64 so that packed
+# values never straddle a byte and can be unpacked in bulk: sub-byte widths
+# through bytes.translate, whole-byte widths through array.array.
+
+_WIDTHS = (0, 1, 2, 4, 8, 16, 32, 64)
+_WORD_CODES = {8: 'B', 16: 'H', 32: 'I' if array('I').itemsize == 4 else 'L', 64: 'Q'}
+_FOR_HEADER = struct.Struct('<qB')
+_INT64_MIN = -(1 << 63)
+
+# bytes.translate tables extracting the i-th value packed into each byte, per sub-byte width
+_SLOT_TABLES = {
+    w: [bytes((b >> (i * w)) & ((1 << w) - 1) for b in range(256)) for i in range(8 // w)]
+    for w in (1, 2, 4)
+}
+
+# bytes.translate tables adding a constant to every byte (for strides below 256)
+_REBASE_TABLES = [bytes((b + r) & 0xFF for b in range(256)) for r in range(256)]
+
+
+def _bit_width(span: int) -> int:
+    """
+    Smallest supported bit width able to hold values in [0, span].
+    """
+    bits = span.bit_length()
+    for w in _WIDTHS:
+        if bits <= w:
+            return w
+    raise CCFError(f"Integer range too wide to bit-pack: {span}")
+
+
+def _for_size(count: int, lo: int, hi: int) -> int:
+    """
+    Encoded size in bytes of a frame-of-reference block.
+    """
+    return _FOR_HEADER.size + (count * _bit_width(hi - lo) + 7) // 8
+
+
+def encode_for(values: Sequence[int]) -> bytes:
+    """
+    Frame-of-reference + bit-packing: subtract the minimum and pack the
+    offsets with the smallest supported bit width.
+    """
+    if not values:
+        return _FOR_HEADER.pack(0, 0)
+    ref = min(values)
+    width = _bit_width(max(values) - ref)
+    header = _FOR_HEADER.pack(ref, width)
+    if width == 0:
+        return header
+    deltas = [v - ref for v in values] if ref else list(values)
+
+    if width >= 8:
+        words = array(_WORD_CODES[width], deltas)
+        if sys.byteorder == 'big':
+            words.byteswap()
+        return header + words.tobytes()
+    return header + _pack_sub_byte(deltas, width)
+
+
+def _pack_sub_byte(values: List[int], width: int) -> bytes:
+    """
+    Pack 8 // width values per byte, lowest bits first. Extends `values` with padding.
+    """
+    per_byte = 8 // width
+    values.extend([0] * (-len(values) % per_byte))
+    packed = values[0::per_byte]
+    for i in range(1, per_byte):
+        shift = i * width
+        packed = [acc | (v << shift) for acc, v in zip(packed, values[i::per_byte])]
+    return bytes(packed)
+
+
+def _unpack_sub_byte(data: bytes, width: int, count: int) -> bytearray:
+    """
+    Extract each slot of every byte with translate and interleave the results.
+    """
+    slots = _SLOT_TABLES[width]
+    values = bytearray(len(data) * len(slots))
+    for i, table in enumerate(slots):
+        values[i::len(slots)] = data.translate(table)
+    del values[count:]
+    return values
+
+
+def pack_bits(values: Sequence[int]) -> bytes:
+    """
+    Pack 0/1 values (or bools) eight per byte, the first value in the lowest bit.
+    Used as the plain layout of BOOL chunks.
+    """
+    return _pack_sub_byte(list(map(int, values)), 1)
+
+
+def unpack_bits(raw_bytes: bytes, count: int) -> bytearray:
+    """
+    Unpack `count` bits packed by `pack_bits` into one 0/1 byte per value.
+    """
+    size = (count + 7) // 8
+    if len(raw_bytes) < size:
+        raise CCFError(f"Insufficient data for packed bits. Expected {size}, got {len(raw_bytes)}")
+    return _unpack_sub_byte(bytes(raw_bytes[:size]), 1, count)
+
+
+def _unpack_for(raw_bytes: bytes, count: int, pos: int) -> Tuple[int, Optional[Sequence[int]], int]:
+    """
+    Unpacks a frame-of-reference block without adding the reference back.
+
+    Returns:
+        (reference, offsets or None when the bit width is 0, position after the block)
+    """
+    if len(raw_bytes) - pos < _FOR_HEADER.size:
+        raise CCFError("Insufficient data for bit-packed block header.")
+    ref, width = _FOR_HEADER.unpack_from(raw_bytes, pos)
+    pos += _FOR_HEADER.size
+    if width not in _WIDTHS:
+        raise CCFError(f"Invalid bit width: {width}.")
+    if width == 0:
+        return ref, None, pos
+
+    size = (count * width + 7) // 8
+    if len(raw_bytes) - pos < size:
+        raise CCFError(f"Insufficient data for bit-packed values. Expected {size}, got {len(raw_bytes) - pos}")
+    data = memoryview(raw_bytes)[pos:pos + size]
+
+    if width >= 8:
+        offsets = array(_WORD_CODES[width])
+        offsets.frombytes(data)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+    else:
+        offsets = _unpack_sub_byte(bytes(data), width, count)
+    return ref, offsets, pos + size
+
+
+def decode_for(raw_bytes: bytes, count: int, pos: int = 0) -> Tuple[List[int], int]:
+    """
+    Decodes a frame-of-reference block of `count` values starting at `pos`.
+
+    Returns:
+        (values, position after the block)
+    """
+    ref, offsets, pos = _unpack_for(raw_bytes, count, pos)
+    if offsets is None:
+        return [ref] * count, pos
+    return (list(map(ref.__add__, offsets)) if ref else list(offsets)), pos
+
+
+def encode_delta(values: Sequence[int]) -> bytes:
+    """
+    Delta encoding: the first value followed by a frame-of-reference block of
+    the differences between consecutive values. Suited to sorted ids and
+    timestamps, where the differences are small.
+    """
+    first = values[0] if values else 0
+    deltas = [b - a for a, b in zip(values, values[1:])]
+    return struct.pack('<q', first) + encode_for(deltas)
+
+
+def decode_delta(raw_bytes: bytes, count: int) -> List[int]:
+    if count == 0:
+        return []
+    if len(raw_bytes) < 8:
+        raise CCFError("Insufficient data for delta block header.")
+    first = struct.unpack_from('<q', raw_bytes, 0)[0]
+    ref, offsets, _ = _unpack_for(raw_bytes, count - 1, 8)
+    if offsets is None:
+        # Constant stride (e.g. evenly spaced ids or timestamps)
+        return list(range(first, first + ref * count, ref)) if ref else [first] * count
+    if ref and isinstance(offsets, bytearray) and 0 < ref <= 0xFF - max(offsets, default=0):
+        # Small positive strides: rebase the unpacked bytes in C
+        offsets = offsets.translate(_REBASE_TABLES[ref])
+        ref = 0
+    values = accumulate(offsets, initial=first)
+    if ref:
+        # value[k] = first + k * ref + sum(offsets[:k])
+        values = map(add, values, range(0, ref * count, ref))
+    return list(values)
+
+
+def _runs(values: Sequence[int]) -> Tuple[List[int], List[int]]:
+    """
+    Split values into runs of equal values: (run values, run lengths).
+    """
+    run_values, run_lengths = [], []
+    for value, group in groupby(values):
+        run_values.append(value)
+        run_lengths.append(sum(1 for _ in group))
+    return run_values, run_lengths
+
+
+def encode_rle(values: Sequence[int]) -> bytes:
+    """
+    Run-length encoding: [run count (4)] [FOR block of run values] [FOR block of run lengths].
+    """
+    run_values, run_lengths = _runs(values)
+    return struct.pack('<I', len(run_values)) + encode_for(run_values) + encode_for(run_lengths)
+
+
+def decode_rle(raw_bytes: bytes, count: int) -> List[int]:
+    if len(raw_bytes) < 4:
+        raise CCFError("Insufficient data for RLE block header.")
+    nruns = struct.unpack_from('<I', raw_bytes, 0)[0]
+    run_values, pos = decode_for(raw_bytes, nruns, 4)
+    run_lengths, _ = decode_for(raw_bytes, nruns, pos)
+    if sum(run_lengths) != count:
+        raise CCFError(f"RLE run lengths add up to {sum(run_lengths)}, expected {count}.")
+    return list(chain.from_iterable(map(repeat, run_values, run_lengths)))
+
+
+def choose_encoding(values: Sequence[int], plain_size: int) -> Optional[int]:
+    """
+    Pick the encoding with the smallest output for an integer chunk (INT,
+    INT64 or TIMESTAMP), estimated
+    without materializing the candidates.
+
+    Returns:
+        ENCODING_FOR, ENCODING_DELTA or ENCODING_RLE, or None if none of them
+        is smaller than `plain_size`.
+    """
+    n = len(values)
+    if n < 2:
+        return None
+    sizes = {ENCODING_FOR: _for_size(n, min(values), max(values))}
+
+    deltas = [b - a for a, b in zip(values, values[1:])]
+    lo, hi = min(deltas), max(deltas)
+    # Differences of int64 values can fall outside what a FOR block can hold
+    if lo >= _INT64_MIN and (hi - lo) >> 64 == 0:
+        sizes[ENCODING_DELTA] = 8 + _for_size(n - 1, lo, hi)
+
+    nruns = 1 + sum(1 for d in deltas if d)
+    if nruns * 4 <= n:
+        run_values, run_lengths = _runs(values)
+        sizes[ENCODING_RLE] = (4 + _for_size(nruns, min(run_values), max(run_values))
+                               + _for_size(nruns, min(run_lengths), max(run_lengths)))
+
+    best = min(sizes, key=lambda e: (sizes[e], e))
+    return best if sizes[best] < plain_size else None
+
+
+ENCODERS = {
+    ENCODING_FOR: encode_for,
+    ENCODING_DELTA: encode_delta,
+    ENCODING_RLE: encode_rle,
+}
+
+DECODERS = {
+    ENCODING_FOR: lambda raw_bytes, count: decode_for(raw_bytes, count)[0],
+    ENCODING_DELTA: decode_delta,
+    ENCODING_RLE: decode_rle,
+}
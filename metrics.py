@@ -0,0 +1,135 @@
+import threading
+from typing import Any, Dict, List
+from constants import TYPE_MAP, ENCODING_MAP, CODEC_MAP
+
+# Phases timed per column
+READ_PHASES = ('io', 'decompress', 'decode')
+WRITE_PHASES = ('convert', 'encode', 'compress', 'io')
+
+
+class Metrics:
+    """
+    Per-column counters and phase timings collected by CCFReader and CCFWriter.
+
+    Pass an instance as `metrics=` to a reader or writer; it can be shared by
+    several of them and is safe to update from worker threads. Every column
+    accumulates:
+
+    -   `chunks`, `rows`: number of chunks and values processed. Pages read on
+        their own by `CCFReader.take` / `read_rows` count as `pages` instead.
+    -   `compressed_bytes`, `uncompressed_bytes`: sizes of the blocks read or written.
+    -   `<phase>_seconds`: time spent per phase. Reads time `io` (reading the
+        block), `decompress` and `decode` (parsing and type conversion); writes
+        time `convert` (type inference and conversion), `encode`, `compress`
+        and `io`. Writer phases run concurrently when the writer is parallel,
+        so their sum can exceed the wall-clock time.
+    -   `cache_hits`: chunks served from a reader's column cache.
+    -   `bloom_skips`: row groups skipped by a chunk's Bloom filter.
+    -   `coalesced`: chunk requests of an `AsyncCCFReader` served by a read
+        another request had already started.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns: Dict[str, Dict[str, float]] = {}
+
+    def add(self, column: str, **counters: float) -> None:
+        """
+        Adds values to the counters of a column.
+        """
+        with self._lock:
+            stats = self._columns.setdefault(column, {})
+            for key, value in counters.items():
+                stats[key] = stats.get(key, 0) + value
+
+    @property
+    def columns(self) -> Dict[str, Dict[str, float]]:
+        """
+        Snapshot of the counters, keyed by column name.
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._columns.items()}
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Counters summed over all columns.
+        """
+        totals: Dict[str, float] = {}
+        for stats in self.columns.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def reset(self) -> None:
+        with self._lock:
+            self._columns.clear()
+
+    def report(self) -> str:
+        """
+        Formats the counters as a table, slowest column first.
+        """
+        columns = self.columns
+        phases = [p for p in READ_PHASES + WRITE_PHASES
+                  if any(f'{p}_seconds' in stats for stats in columns.values())]
+        phases = list(dict.fromkeys(phases))
+
+        def total_time(stats: Dict[str, float]) -> float:
+            return sum(stats.get(f'{p}_seconds', 0.0) for p in phases)
+
+        header = f"{'Column':<20} | {'Chunks':>6} | {'Compressed':>12} | {'Uncompressed':>12} | {'Ratio':>6}"
+        header += "".join(f" | {p + ' (s)':>14}" for p in phases)
+        lines = [header, "-" * len(header)]
+        rows = sorted(columns.items(), key=lambda item: total_time(item[1]), reverse=True)
+        for name, stats in rows + [("TOTAL", self.totals())]:
+            if name == "TOTAL":
+                lines.append("-" * len(header))
+            csize = stats.get('compressed_bytes', 0)
+            usize = stats.get('uncompressed_bytes', 0)
+            line = (f"{name:<20} | {int(stats.get('chunks', 0)):>6} | {int(csize):>12} | {int(usize):>12} | "
+                    f"{_ratio(usize, csize):>6}")
+            line += "".join(f" | {stats.get(f'{p}_seconds', 0.0):>14.4f}" for p in phases)
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _ratio(usize: float, csize: float) -> str:
+    return f"{usize / csize:.2f}" if csize else "-"
+
+
+def column_storage(reader: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Storage statistics per column from a reader's metadata, without reading data:
+    type, number of chunks, compressed and uncompressed bytes, compression
+    ratio, and the encodings and codecs used by its chunks.
+    """
+    storage = {}
+    for name, dtype in reader.schema:
+        chunks = [group['columns'][name] for group in reader.row_groups]
+        csize = sum(c[4] for c in chunks)
+        usize = sum(c[5] for c in chunks)
+        storage[name] = {
+            'type': TYPE_MAP.get(dtype, "unknown"),
+            'chunks': len(chunks),
+            'compressed_bytes': csize,
+            'uncompressed_bytes': usize,
+            'ratio': usize / csize if csize else None,
+            'encodings': sorted({ENCODING_MAP.get(c[1], str(c[1])) for c in chunks}),
+            'codecs': sorted({CODEC_MAP.get(c[2], str(c[2])) for c in chunks}),
+        }
+    return storage
+
+
+def storage_report(storage: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Formats `column_storage` as a table, largest column first.
+    """
+    header = (f"{'Column':<20} | {'Type':<10} | {'Chunks':>6} | {'Compressed':>12} | "
+              f"{'Uncompressed':>12} | {'Ratio':>6} | {'Share':>6} | Encodings / Codecs")
+    lines = [header, "-" * len(header)]
+    total = sum(s['compressed_bytes'] for s in storage.values())
+    rows: List[tuple] = sorted(storage.items(), key=lambda item: item[1]['compressed_bytes'], reverse=True)
+    for name, s in rows:
+        share = f"{100 * s['compressed_bytes'] / total:.1f}%" if total else "-"
+        lines.append(f"{name:<20} | {s['type']:<10} | {s['chunks']:>6} | {s['compressed_bytes']:>12} | "
+                     f"{s['uncompressed_bytes']:>12} | {_ratio(s['uncompressed_bytes'], s['compressed_bytes']):>6} | "
+                     f"{share:>6} | {','.join(s['encodings'])} / {','.join(s['codecs'])}")
+    return "\n".join(lines)
@@ -0,0 +1,167 @@
+import operator
+import re
+from typing import List, Any, Optional, Sequence, Tuple
+from constants import TYPE_INT, TYPE_FLOAT, TYPE_INT64, TYPE_BOOL, TYPE_TIMESTAMP
+from exceptions import CCFColumnError, CCFQueryError
+import timestamps
+
+# A predicate is a (column, operator, value) tuple, e.g. ("age", ">", 30).
+# A list of predicates is combined with AND.
+Predicate = Tuple[str, str, Any]
+
+OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# 'in' takes a collection of values and matches rows equal to any of them
+SET_OPERATORS = ('in',)
+
+
+_PREDICATE_RE = re.compile(r'^\s*(.+?)\s*(<=|>=|!=|==|=|<|>|\s+in\s+)\s*(.*?)\s*$', re.IGNORECASE)
+
+
+def parse_predicate(text: str) -> Predicate:
+    """
+    Parse a predicate written as text, e.g. "age > 30" or "country in (DE, FR)".
+    Values are kept as strings and converted to the column type by
+    `normalize_predicates`. Surrounding quotes around a value are removed.
+
+    Raises:
+        CCFQueryError: If the text is not a predicate.
+    """
+    match = _PREDICATE_RE.match(text)
+    if not match or not match.group(3):
+        raise CCFQueryError(f"Invalid predicate '{text}': expected e.g. age>30 or country in (DE,FR).")
+    column, op, value = match.group(1), match.group(2).strip().lower(), match.group(3)
+    if op == 'in':
+        if not (value.startswith('(') and value.endswith(')')):
+            raise CCFQueryError(f"Invalid predicate '{text}': 'in' expects a parenthesized list.")
+        return column, op, [_unquote(v) for v in value[1:-1].split(',')]
+    return column, op, _unquote(value)
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+        return value[1:-1]
+    return value
+
+
+def _cast_value(value: Any, dtype: int) -> Any:
+    """
+    Convert a predicate value to the Python type of the column.
+    TIMESTAMP values may be datetimes or ISO 8601 strings; BOOL values may be
+    bools or "true" / "false".
+    """
+    if dtype in (TYPE_INT, TYPE_INT64):
+        if isinstance(value, float) and not value.is_integer():
+            # Keep the fraction so that e.g. `x > 2.5` is still evaluated correctly
+            return value
+        return int(value)
+    if dtype == TYPE_FLOAT:
+        return float(value)
+    if dtype == TYPE_BOOL:
+        if isinstance(value, str):
+            if value.lower() not in ('true', 'false'):
+                raise ValueError("expected true or false")
+            return value.lower() == 'true'
+        return bool(value)
+    if dtype == TYPE_TIMESTAMP:
+        return timestamps.normalize(value)
+    return str(value)
+
+
+def normalize_predicates(where: Optional[Sequence[Predicate]], column_types: dict) -> List[Predicate]:
+    """
+    Validate predicates and convert their values to the column types.
+
+    Args:
+        where: Sequence of (column, operator, value) tuples.
+        column_types: Mapping of column name to type ID.
+
+    Returns:
+        List of normalized predicates, with '==' spelled as '='.
+
+    Raises:
+        CCFColumnError: If a predicate references an unknown column.
+        CCFQueryError: If the operator is unknown or the value does not fit the column type.
+    """
+    predicates = []
+    for pred in where or []:
+        try:
+            column, op, value = pred
+        except (TypeError, ValueError):
+            raise CCFQueryError(f"Invalid predicate {pred!r}: expected (column, operator, value).")
+        if column not in column_types:
+            raise CCFColumnError(f"Column '{column}' not found in file. Available: {list(column_types.keys())}")
+        if op not in OPERATORS and op not in SET_OPERATORS:
+            raise CCFQueryError(f"Unsupported operator '{op}'. Supported: {list(OPERATORS) + list(SET_OPERATORS)}")
+
+        dtype = column_types[column]
+        try:
+            if op in SET_OPERATORS:
+                if isinstance(value, (str, bytes)):
+                    raise TypeError("expected a collection of values")
+                value = frozenset(_cast_value(v, dtype) for v in value)
+            else:
+                value = _cast_value(value, dtype)
+        except (TypeError, ValueError) as e:
+            raise CCFQueryError(f"Invalid value {value!r} for column '{column}': {e}")
+        predicates.append((column, '=' if op == '==' else op, value))
+    return predicates
+
+
+def stats_may_match(stats: Optional[tuple], op: str, value: Any) -> bool:
+    """
+    Decide from chunk statistics whether any row of the chunk can satisfy `op value`.
+
+    Args:
+        stats: (count, min, max) of the chunk; min/max are None when unknown.
+        op: Normalized operator.
+        value: Normalized predicate value.
+
+    Returns:
+        False only if the statistics prove that no row matches.
+    """
+    if stats is None:
+        return True
+    count, lo, hi = stats
+    if count == 0:
+        return False
+    if lo is None or hi is None:
+        return True
+    try:
+        if op == '=':
+            return lo <= value <= hi
+        if op == '!=':
+            return not (lo == hi == value)
+        if op == '<':
+            return lo < value
+        if op == '<=':
+            return lo <= value
+        if op == '>':
+            return hi > value
+        if op == '>=':
+            return hi >= value
+        if op == 'in':
+            return any(lo <= v <= hi for v in value)
+    except TypeError:
+        # Statistics of a chunk written with a narrower type than the column
+        return True
+    return True
+
+
+def match_rows(values: Sequence[Any], op: str, value: Any) -> List[bool]:
+    """
+    Evaluate a normalized predicate against a sequence of column values.
+    """
+    if op == 'in':
+        return [v in value for v in values]
+    fn = OPERATORS[op]
+    return [fn(v, value) for v in values]
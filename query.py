@@ -0,0 +1,260 @@
+import re
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
+from constants import TYPE_INT, TYPE_FLOAT, TYPE_INT64, TYPE_BOOL, TYPE_TIMESTAMP, TYPE_MAP
+from exceptions import CCFColumnError, CCFQueryError
+from predicates import Predicate, normalize_predicates
+from reader import CCFReader
+import timestamps
+
+# Aggregate functions and the column types they accept (None: any type)
+AGGREGATES = {
+    'count': None,
+    'sum': (TYPE_INT, TYPE_INT64, TYPE_FLOAT, TYPE_BOOL),
+    'avg': (TYPE_INT, TYPE_INT64, TYPE_FLOAT, TYPE_BOOL),
+    'min': None,
+    'max': None,
+}
+
+# An aggregate is a (function, column) tuple; column is None for count(*)
+Aggregate = Tuple[str, Optional[str]]
+
+_AGGREGATE_RE = re.compile(r'^\s*(\w+)\s*\(\s*(\*|[^()]*?)\s*\)\s*$')
+
+
+def parse_aggregate(spec: Union[str, Sequence]) -> Aggregate:
+    """
+    Parse an aggregate written as "sum(price)" or "count(*)", or given as a
+    (function, column) tuple.
+
+    Raises:
+        CCFQueryError: If the aggregate is malformed or the function is unknown.
+    """
+    if isinstance(spec, str):
+        match = _AGGREGATE_RE.match(spec)
+        if not match:
+            raise CCFQueryError(f"Invalid aggregate '{spec}': expected e.g. sum(price) or count(*).")
+        func, column = match.group(1).lower(), match.group(2)
+    else:
+        try:
+            func, column = spec
+        except (TypeError, ValueError):
+            raise CCFQueryError(f"Invalid aggregate {spec!r}: expected (function, column).")
+    if func not in AGGREGATES:
+        raise CCFQueryError(f"Unsupported aggregate '{func}'. Supported: {list(AGGREGATES)}")
+    if column in (None, '*'):
+        if func != 'count':
+            raise CCFQueryError(f"{func}(*) is not supported; name a column.")
+        column = None
+    return func, column
+
+
+def aggregate_label(aggregate: Aggregate) -> str:
+    func, column = aggregate
+    return f"{func}({'*' if column is None else column})"
+
+
+def _buffer(values: Any) -> Any:
+    """
+    Returns a typed buffer in a form the aggregates can work on: NumPy
+    datetime64 arrays are viewed as their int64 microseconds.
+    """
+    if getattr(values, 'dtype', None) is not None and values.dtype.kind == 'M':
+        return values.view('<i8')
+    return values
+
+
+def _python_value(value: Any, dtype: int) -> Any:
+    """
+    Converts an aggregate result or group key taken from a typed buffer back to
+    the Python type the reader returns for the column.
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'item'): # NumPy scalar
+        value = value.item()
+    if dtype == TYPE_TIMESTAMP and isinstance(value, int):
+        return timestamps.from_micros(value)
+    if dtype == TYPE_BOOL:
+        return bool(value)
+    return value
+
+
+def _key_values(values: Any, dtype: int) -> List[Any]:
+    """
+    Converts one column of a batch to the list of Python values used as group keys.
+    """
+    if isinstance(values, list):
+        return values
+    values = _buffer(values).tolist()
+    if dtype == TYPE_TIMESTAMP:
+        return timestamps.from_micros_list(values)
+    if dtype == TYPE_BOOL:
+        return list(map(bool, values))
+    return values
+
+
+class _Accumulator:
+    """
+    Running state of one aggregate, for the whole table or for every group.
+    """
+    def __init__(self, func: str):
+        self.func = func
+        self.values: List[Any] = [] # One entry per group
+        self.counts: List[int] = [] # Rows seen per group (for avg)
+
+    def grow(self, ngroups: int) -> None:
+        missing = ngroups - len(self.values)
+        if missing > 0:
+            initial = 0 if self.func in ('count', 'sum', 'avg') else None
+            self.values.extend([initial] * missing)
+            self.counts.extend([0] * missing)
+
+    def add_batch(self, values: Any, nrows: int) -> None:
+        """
+        Folds a whole batch into group 0 using C-level reductions over the buffer.
+        """
+        self.grow(1)
+        if self.func == 'count':
+            self.values[0] += nrows
+            return
+        if not nrows:
+            return
+        if self.func in ('sum', 'avg'):
+            self.values[0] += values.sum() if hasattr(values, 'sum') else sum(values)
+            self.counts[0] += nrows
+            return
+        reduce = min if self.func == 'min' else max
+        part = (values.min() if self.func == 'min' else values.max()) if hasattr(values, 'min') else reduce(values)
+        current = self.values[0]
+        self.values[0] = part if current is None else reduce(current, part)
+
+    def add_grouped(self, codes: List[int], values: Any, ngroups: int) -> None:
+        """
+        Folds a batch into the groups given by `codes` (one group index per row).
+        """
+        self.grow(ngroups)
+        acc = self.values
+        if self.func == 'count':
+            for c in codes:
+                acc[c] += 1
+            return
+        if not isinstance(values, list):
+            values = _buffer(values).tolist()
+        if self.func in ('sum', 'avg'):
+            counts = self.counts
+            for c, v in zip(codes, values):
+                acc[c] += v
+                counts[c] += 1
+        elif self.func == 'min':
+            for c, v in zip(codes, values):
+                current = acc[c]
+                if current is None or v < current:
+                    acc[c] = v
+        else:
+            for c, v in zip(codes, values):
+                current = acc[c]
+                if current is None or v > current:
+                    acc[c] = v
+
+    def results(self, dtype: Optional[int]) -> List[Any]:
+        if self.func == 'avg':
+            return [_python_value(total, TYPE_FLOAT) / n if n else None
+                    for total, n in zip(self.values, self.counts)]
+        if self.func == 'count':
+            return list(self.values)
+        if self.func == 'sum' and dtype == TYPE_BOOL:
+            dtype = TYPE_INT # Number of true values
+        return [_python_value(v, dtype) for v in self.values]
+
+
+def run_query(reader: CCFReader,
+              columns: Optional[List[str]] = None,
+              where: Optional[List[Predicate]] = None,
+              group_by: Optional[List[str]] = None,
+              aggregates: Optional[List[Union[str, Aggregate]]] = None) -> Dict[str, List[Any]]:
+    """
+    Runs a projection or aggregation query over a CCF file.
+
+    The file is processed one row group at a time, and only the columns the
+    query references are decompressed. Projections are collected batch by
+    batch (use `write_csv` with `where` to stream them instead). Numeric
+    columns of aggregates are read as typed buffers, so ungrouped aggregates
+    reduce whole chunks in C.
+
+    Args:
+        reader: Reader of the file to query.
+        columns: Columns to return for a projection query (all if None).
+            Not allowed together with `group_by` or `aggregates`.
+        where: Filter predicates, as accepted by `CCFReader.read_columns`.
+        group_by: Columns to group by. Groups appear in order of first occurrence.
+        aggregates: Aggregates such as "sum(price)", "count(*)" or ("avg", "score").
+            Supported functions: count, sum, avg, min, max.
+
+    Returns:
+        Dictionary mapping output column names to lists of values. Aggregate
+        columns are named like "sum(price)".
+
+    Raises:
+        CCFColumnError: If the query references an unknown column.
+        CCFQueryError: If the query is invalid.
+    """
+    group_by = list(group_by or [])
+    parsed = [parse_aggregate(spec) for spec in aggregates or []]
+    if not group_by and not parsed:
+        result: Dict[str, List[Any]] = {name: [] for name in reader.resolve_columns(columns)}
+        for batch in reader.iter_batches(list(result), where=where):
+            for name, values in result.items():
+                values.extend(batch[name])
+        return result
+    if columns is not None:
+        raise CCFQueryError("Projection columns cannot be combined with group_by or aggregates.")
+
+    agg_columns = [column for _, column in parsed if column is not None]
+    needed = list(dict.fromkeys(group_by + agg_columns))
+    for name in needed:
+        if name not in reader.column_types:
+            raise CCFColumnError(f"Column '{name}' not found in file. Available: {list(reader.column_types.keys())}")
+    for func, column in parsed:
+        allowed = AGGREGATES[func]
+        if column is not None and allowed is not None and reader.column_types[column] not in allowed:
+            raise CCFQueryError(
+                f"Cannot compute {func}() of {TYPE_MAP[reader.column_types[column]]} column '{column}'.")
+
+    accumulators = [_Accumulator(func) for func, _ in parsed]
+    predicates = normalize_predicates(where, reader.column_types)
+    if not needed and not predicates:
+        # count(*) of the whole file comes from the metadata
+        for acc in accumulators:
+            acc.add_batch(None, reader.nrows)
+        return {aggregate_label(a): acc.results(None) for a, acc in zip(parsed, accumulators)}
+
+    # Batches must have at least one column to count rows with; the first
+    # filter column is decoded for filtering anyway.
+    scan = needed or [predicates[0][0]]
+    groups: Dict[Any, int] = {}
+    for batch in reader.iter_batches(scan, as_arrays=True, where=predicates):
+        nrows = len(batch[scan[0]])
+        if not group_by:
+            for (_, column), acc in zip(parsed, accumulators):
+                acc.add_batch(None if column is None else _buffer(batch[column]), nrows)
+            continue
+
+        keys = [_key_values(batch[name], reader.column_types[name]) for name in group_by]
+        keys = keys[0] if len(keys) == 1 else list(zip(*keys))
+        codes = [groups.setdefault(k, len(groups)) for k in keys]
+        for (_, column), acc in zip(parsed, accumulators):
+            acc.add_grouped(codes, None if column is None else batch[column], len(groups))
+
+    result = {}
+    if group_by:
+        keys = list(groups)
+        if len(group_by) == 1:
+            result[group_by[0]] = keys
+        else:
+            for i, name in enumerate(group_by):
+                result[name] = [k[i] for k in keys]
+    for aggregate, acc in zip(parsed, accumulators):
+        acc.grow(len(groups) if group_by else 1)
+        column = aggregate[1]
+        result[aggregate_label(aggregate)] = acc.results(None if column is None else reader.column_types[column])
+    return result
@@ -1,172 +1,1107 @@
+import mmap
+import os
 import struct
-import zlib
-from typing import List, Dict, Any, Optional
-from constants import MAGIC, VERSION, TYPE_INT, TYPE_FLOAT, TYPE_STRING, TYPE_MAP
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, BinaryIO, Iterable, Iterator, Tuple, Union
+from datetime import datetime
+from constants import (MAGIC, SUPPORTED_VERSIONS, TYPE_INT, TYPE_FLOAT, TYPE_STRING, TYPE_INT64,
+                       TYPE_BOOL, TYPE_TIMESTAMP, INTEGER_TYPES, TYPE_MAP,
+                       ENCODING_PLAIN, ENCODING_DICTIONARY, ENCODING_MAP, CODEC_ZLIB)
 from exceptions import CCFMagicError, CCFVersionError, CCFColumnError, CCFError
+import compression
+import integer_encoding
+import timestamps
+from cache import ColumnCache, shared_cache
+from metrics import Metrics
+from bloom import BloomFilter, probe_value
+from predicates import Predicate, normalize_predicates, stats_may_match, match_rows
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; array.array is used instead
+    np = None
+
+# array.array type codes with the on-disk item sizes (4-byte ints, 8-byte doubles)
+_INT32_CODE = 'i' if array('i').itemsize == 4 else 'l'
+_UINT32_CODE = 'I' if array('I').itemsize == 4 else 'L'
+# Typed buffers returned with `as_arrays`. TIMESTAMP buffers hold microseconds
+# since the epoch (datetime64[us] with NumPy); BOOL buffers hold one 0/1 byte per value.
+_NUMPY_DTYPES = {TYPE_INT: '<i4', TYPE_FLOAT: '<f8', TYPE_INT64: '<i8',
+                 TYPE_TIMESTAMP: '<M8[us]', TYPE_BOOL: '?'}
+_ARRAY_CODES = {TYPE_INT: _INT32_CODE, TYPE_FLOAT: 'd', TYPE_INT64: 'q',
+                TYPE_TIMESTAMP: 'q', TYPE_BOOL: 'B'}
+_FIXED_WIDTHS = {**INTEGER_TYPES, TYPE_FLOAT: 8}
+
+# Precompiled layouts of the metadata structures (see SPEC.md)
+_HEADER = struct.Struct('<4sBIQ') # magic, version, column count, row count
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_V1_COLUMN = struct.Struct('<QQQ') # offset, compressed size, uncompressed size
+_CHUNK = struct.Struct('<BBBQQQQB') # type, encoding, codec, offset, sizes, value count, has min/max
+_INT_BOUNDS = struct.Struct('<qq')
+_FLOAT_BOUNDS = struct.Struct('<dd')
+_PAGE = struct.Struct('<IBQQ')
+_BLOOM = struct.Struct('<QQ')
+
+# Bytes read from the start of a file when opening it. The header and schema,
+# and for small files the footer too, usually arrive in this single read.
+_METADATA_READ = 64 * 1024
+
+
+def _unpack_array(raw_bytes: bytes, typecode: str, count: int) -> array:
+    """
+    Decodes `count` little-endian fixed-width values from the start of
+    `raw_bytes` in a single call.
+    """
+    values = array(typecode)
+    values.frombytes(memoryview(raw_bytes)[:count * values.itemsize])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _empty_array(dtype: int) -> Any:
+    """
+    Returns an empty typed buffer for a fixed-width column type.
+    """
+    if np is not None:
+        return np.empty(0, dtype=_NUMPY_DTYPES[dtype])
+    return array(_ARRAY_CODES[dtype])
+
+
+def _parse_strings(raw_bytes: bytes, count: int, start: int = 0) -> tuple:
+    """
+    Parses `count` strings stored as [end offsets (4 each)] [UTF-8 blob] at `start`.
+
+    Returns:
+        (values, end position of the blob)
+    """
+    # [offset1 (4), offset2 (4)...] [blob]
+    offsets_size = count * 4
+    if len(raw_bytes) - start < offsets_size:
+         raise CCFError(f"Insufficient data for STRING column offsets. Expected at least {offsets_size}, got {len(raw_bytes) - start}")
+
+    offsets = _unpack_array(memoryview(raw_bytes)[start:], _UINT32_CODE, count).tolist()
+    blob_start = start + offsets_size
+    blob_size = offsets[-1] if offsets else 0
+
+    # Basic Bounds Check on offsets?
+    # Max offset should be <= len(blob)
+    if blob_start + blob_size > len(raw_bytes):
+         raise CCFError(f"String offset out of bounds. Max offset {blob_size}, blob size {len(raw_bytes) - blob_start}")
+    blob = raw_bytes[blob_start:blob_start + blob_size]
+    if not isinstance(blob, bytes):
+        blob = bytes(blob)
+
+    # Slice all values in C; offsets that go backwards (corrupt data) yield ''
+    slices = map(slice, [0] + offsets[:-1], offsets)
+    if blob.isascii():
+        # Byte offsets are character offsets: decode the blob once
+        return list(map(blob.decode('ascii').__getitem__, slices)), blob_start + blob_size
+    return list(map(bytes.decode, map(blob.__getitem__, slices))), blob_start + blob_size
+
+
+def _pick_strings(raw_bytes: bytes, count: int, positions: List[int]) -> List[str]:
+    """
+    Decodes only the strings at `positions` of a plain STRING block of `count`
+    values, reading two offsets per value instead of parsing the whole block.
+    """
+    blob_start = count * 4
+    if len(raw_bytes) < blob_start:
+        raise CCFError(f"Insufficient data for STRING column offsets. Expected at least {blob_start}, got {len(raw_bytes)}")
+    values = []
+    for i in positions:
+        begin = struct.unpack_from('<I', raw_bytes, (i - 1) * 4)[0] if i else 0
+        end = struct.unpack_from('<I', raw_bytes, i * 4)[0]
+        if blob_start + end > len(raw_bytes):
+            raise CCFError(f"String offset out of bounds. Offset {end}, blob size {len(raw_bytes) - blob_start}")
+        values.append(bytes(raw_bytes[blob_start + begin:blob_start + end]).decode('utf-8'))
+    return values
+
+
+def _parse_dictionary(raw_bytes: bytes, count: int) -> List[str]:
+    """
+    Decodes a dictionary-encoded STRING chunk:
+    [dict size (4)] [code width (1)] [dictionary as plain strings] [codes].
+    Each distinct string is decoded once and shared by all rows using it.
+    """
+    if len(raw_bytes) < 5:
+        raise CCFError("Insufficient data for dictionary header.")
+    ndict, width = struct.unpack_from('<IB', raw_bytes, 0)
+    dictionary, pos = _parse_strings(raw_bytes, ndict, 5)
+
+    typecodes = {1: 'B', 2: 'H', 4: _UINT32_CODE}
+    if width not in typecodes:
+        raise CCFError(f"Invalid dictionary code width: {width}.")
+    if len(raw_bytes) - pos < count * width:
+        raise CCFError(f"Insufficient data for dictionary codes. Expected {count * width}, got {len(raw_bytes) - pos}")
+    codes = _unpack_array(memoryview(raw_bytes)[pos:], typecodes[width], count)
+    if codes and max(codes) >= ndict:
+        raise CCFError(f"Dictionary code out of range. Max code {max(codes)}, dictionary size {ndict}")
+    return list(map(dictionary.__getitem__, codes))
+
+
+def take_values(values: Any, indices: List[int]) -> Any:
+    """
+    Selects the values at `indices` from a list or typed buffer.
+    """
+    if np is not None and isinstance(values, np.ndarray):
+        return values[np.asarray(indices, dtype=np.intp)]
+    if isinstance(values, array):
+        return array(values.typecode, [values[i] for i in indices])
+    return [values[i] for i in indices]
+
+
+def matching_rows(decoded: Dict[str, Any], predicates: List[Predicate]) -> List[int]:
+    """
+    Returns the positions of the rows of a row group that match all predicates,
+    given the decoded values of the predicate columns.
+    """
+    mask = None
+    for column, op, value in predicates:
+        matches = match_rows(decoded[column], op, value)
+        mask = matches if mask is None else [a and b for a, b in zip(mask, matches)]
+    return [i for i, keep in enumerate(mask) if keep]
+
+
+def cast_values(values: Any, source: int, dtype: int) -> Any:
+    """
+    Converts values of a narrower chunk type `source` to the (widened) column type.
+    BOOL and TIMESTAMP values become the text the writer infers them from.
+    """
+    if dtype == TYPE_INT64:
+        if isinstance(values, array):
+            return array('q', values)
+        if np is not None and isinstance(values, np.ndarray):
+            return values.astype('<i8')
+        return values
+    if dtype == TYPE_FLOAT:
+        if isinstance(values, array):
+            return array('d', values)
+        if np is not None and isinstance(values, np.ndarray):
+            return values.astype('<f8')
+        return [float(v) for v in values]
+    if dtype == TYPE_STRING:
+        if np is not None and isinstance(values, np.ndarray):
+            values = values.tolist()
+        if source == TYPE_BOOL:
+            return ['true' if v else 'false' for v in values]
+        if source == TYPE_TIMESTAMP:
+            return [(v if isinstance(v, datetime) else timestamps.from_micros(v)).isoformat() for v in values]
+        return list(map(str, values))
+    raise CCFError(f"Cannot convert chunk values to {TYPE_MAP.get(dtype, dtype)}.")
+
+
+def _unpack_bounds(footer: Any, pos: int, dtype: int) -> tuple:
+    """
+    Parses the min/max statistics of one column chunk from the metadata footer.
+
+    Returns:
+        (min, max, new_pos)
+    """
+    if dtype == TYPE_FLOAT:
+        low, high = _FLOAT_BOUNDS.unpack_from(footer, pos)
+        return low, high, pos + 16
+    if dtype in INTEGER_TYPES or dtype == TYPE_BOOL:
+        low, high = _INT_BOUNDS.unpack_from(footer, pos)
+        if dtype == TYPE_TIMESTAMP:
+            low, high = timestamps.from_micros(low), timestamps.from_micros(high)
+        elif dtype == TYPE_BOOL:
+            low, high = bool(low), bool(high)
+        return low, high, pos + 16
+    bounds = []
+    for _ in range(2):
+        length = _U32.unpack_from(footer, pos)[0]
+        pos += 4
+        bounds.append(footer[pos:pos + length].decode('utf-8'))
+        pos += length
+    return bounds[0], bounds[1], pos
+
+
+def _unpack_pages(footer: Any, pos: int, npages: int, offset: int) -> tuple:
+    """
+    Parses the page index of one column chunk. Pages are stored back to back
+    from the chunk offset.
+
+    Returns:
+        ([(first row, nrows, encoding, offset, csize, usize), ...], new_pos)
+    """
+    pages = []
+    row = 0
+    for nrows, encoding, csize, usize in _PAGE.iter_unpack(footer[pos:pos + npages * _PAGE.size]):
+        pages.append((row, nrows, encoding, offset, csize, usize))
+        row += nrows
+        offset += csize
+    return pages, pos + npages * _PAGE.size
+
+
+def concat_values(parts: List[Any], dtype: int, as_arrays: bool) -> Any:
+    """
+    Joins per-chunk values into one column.
+    """
+    if as_arrays and dtype in _ARRAY_CODES:
+        if not parts:
+            return _empty_array(dtype)
+        if len(parts) == 1:
+            return parts[0]
+        if np is not None:
+            return np.concatenate(parts)
+        joined = array(parts[0].typecode)
+        for part in parts:
+            joined.extend(part)
+        return joined
+    if len(parts) == 1:
+        return parts[0]
+    joined = []
+    for part in parts:
+        joined.extend(part)
+    return joined
+
 
 class CCFReader:
     """
     Reader class for the Custom Columnar Format (CCF).
     Supports full file reading and selective column access (pruning).
+
+    With `use_mmap=True` the file is mapped once for the lifetime of the reader
+    and compressed blocks are sliced from the mapping without copying. Call
+    `close()` (or use the reader as a context manager) to release the mapping.
+
+    With `workers` > 1, or an `executor` supplied by the caller, chunks are
+    decompressed and decoded concurrently while blocks are still read in file
+    order. Decompression releases the GIL, so a thread pool is used; a
+    caller-supplied executor must be thread based as well.
+
+    With `cache`, decoded chunks are kept in a `ColumnCache` and reused by later
+    reads, also by other readers of the same file sharing the cache. Pass a
+    ColumnCache instance, or True for the process-wide cache.
+
+    With `metrics`, bytes read and the time spent reading, decompressing and
+    decoding are recorded per column in the given `Metrics` object.
+
+    `metadata` takes the raw metadata of the file as (start of the file up to
+    `header['head_size']`, footer) bytes, e.g. from a `catalog.Catalog`, which
+    are parsed instead of reading the file when it is opened.
     """
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, use_mmap: bool = False,
+                 workers: int = 1, executor: Optional[Executor] = None,
+                 cache: Union[ColumnCache, bool, None] = None,
+                 metrics: Optional[Metrics] = None,
+                 metadata: Optional[Tuple[bytes, bytes]] = None):
+        if workers < 1:
+            raise ValueError("workers must be a positive integer.")
         self.file_path = file_path
+        self.use_mmap = use_mmap
+        self.workers = workers
+        if cache is True:
+            cache = shared_cache()
+        self.cache: Optional[ColumnCache] = cache if isinstance(cache, ColumnCache) else None
+        self._file_key: Optional[tuple] = None # (path, mtime, size) identifying the file in the cache
+        self.metrics = metrics
+        self._executor = executor
+        self._owns_executor = False
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
         self.header: Dict[str, Any] = {}
         self.schema: List[tuple] = [] # List of (name, dtype)
-        self.col_meta: Dict[str, tuple] = {} # name -> (offset, csize, usize, dtype)
+        self.column_types: Dict[str, int] = {} # name -> dtype
+        # One entry per row group:
+        #   {'nrows': int,
+        #    'columns': {name: (dtype, encoding, codec, offset, csize, usize)},
+        #    'stats': {name: (count, min, max)},
+        #    'pages': {name: [(first row, nrows, encoding, offset, csize, usize), ...]},
+        #    'blooms': {name: (offset, size)}}
+        # 'pages' only lists chunks split into several pages (version 3), 'blooms'
+        # only chunks with a Bloom filter (version 4).
+        # Version 1 files are exposed as a single row group without statistics.
+        self.row_groups: List[Dict[str, Any]] = []
         self.nrows: int = 0
+        self._units: Dict[str, tuple] = {} # name -> (first rows, units) for take() / read_rows()
+        self._blooms: Dict[int, BloomFilter] = {} # Bloom filters loaded so far, by block offset
 
         try:
-            self._load_metadata()
-        except (IOError, OSError) as e:
+            if self.cache is not None:
+                st = os.stat(file_path)
+                self._file_key = (os.path.realpath(file_path), st.st_mtime_ns, st.st_size)
+            if use_mmap:
+                self._file = open(file_path, 'rb')
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._load_metadata(metadata)
+        except (IOError, OSError, ValueError) as e:
+            self.close()
             raise CCFError(f"Failed to open or read file '{file_path}': {e}") from e
 
-    def _load_metadata(self) -> None:
+    def __enter__(self) -> "CCFReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
         """
-        Internal method to read and validate the file header, schema, and metadata table.
-        Optimized to read only the metadata section, not data blocks.
+        Releases the memory mapping and the reader's own worker pool, if any.
         """
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._owns_executor = False
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load_metadata(self, metadata: Optional[Tuple[bytes, bytes]] = None) -> None:
+        """
+        Internal method to read and validate the file header, schema, and metadata.
+        Only the metadata is read, not data blocks: small files in one read,
+        larger ones in one read of the start of the file and one of the footer.
+        With a memory mapping (or `metadata` from a catalog), nothing is read.
+        """
+        if metadata is not None:
+            head, footer = metadata
+            if self._parse_head(head) is None:
+                raise CCFError("Unexpected end of the cached file metadata.")
+            if self.header['version'] >= 2:
+                self._parse_footer(footer, 0)
+            return
+        if self._mmap is not None:
+            if self._parse_head(self._mmap) is None:
+                raise CCFError("Unexpected EOF while reading schema.")
+            if self.header['version'] >= 2:
+                self._parse_footer(self._mmap, self.header['footer_offset'])
+            return
+
         with open(self.file_path, 'rb') as f:
-            magic = f.read(4)
-            if magic != MAGIC:
-                raise CCFMagicError(f"Invalid file format: Magic bytes mismatch. Expected {MAGIC}, got {magic}")
-            
-            version = struct.unpack('<B', f.read(1))[0]
-            if version != VERSION:
-                raise CCFVersionError(f"Unsupported version: {version}. Expected {VERSION}.")
-            
-            self.header['version'] = version
-            ncols = struct.unpack('<I', f.read(4))[0]
-            self.nrows = struct.unpack('<Q', f.read(8))[0]
-            self.header['ncols'] = ncols
-            self.header['nrows'] = self.nrows
-
-            # Read Schema
-            for _ in range(ncols):
-                l_bytes = f.read(2)
-                if not l_bytes:
-                     raise CCFError("Unexpected EOF while reading schema.")
-                l = struct.unpack('<H', l_bytes)[0]
-                name_bytes = f.read(l)
-                if len(name_bytes) != l:
-                     raise CCFError("Unexpected EOF while reading column name.")
-                name = name_bytes.decode('utf-8')
-                dtype = struct.unpack('<B', f.read(1))[0]
-                self.schema.append((name, dtype))
-
-            # Read Metadata Table
-            # It follows strictly after schema
-            for name, dtype in self.schema:
-                meta_bytes = f.read(24)
-                if len(meta_bytes) != 24:
-                    raise CCFError("Unexpected EOF while reading column metadata.")
-                offset, csize, usize = struct.unpack('<QQQ', meta_bytes)
-                self.col_meta[name] = (offset, csize, usize, dtype)
-
-    def read_columns(self, columns: Optional[List[str]] = None) -> Dict[str, List[Any]]:
+            buf = f.read(_METADATA_READ)
+            at_eof = len(buf) < _METADATA_READ
+            # Schemas of very wide tables may need more than one read
+            while self._parse_head(buf) is None:
+                if at_eof:
+                    raise CCFError("Unexpected EOF while reading schema.")
+                more = f.read(len(buf))
+                at_eof = len(more) < len(buf)
+                buf += more
+            if self.header['version'] == 1:
+                return
+            footer_offset = self.header['footer_offset']
+            if footer_offset < len(buf) and at_eof:
+                self._parse_footer(buf, footer_offset)
+                return
+            if footer_offset < len(buf):
+                footer = buf[footer_offset:] + f.read()
+            else:
+                f.seek(footer_offset)
+                footer = f.read()
+            self._parse_footer(footer, 0)
+
+    def _parse_head(self, buf: Any) -> Optional[int]:
+        """
+        Parses the header and schema (and the version 1 metadata table) from
+        the bytes at the start of the file. Returns their size, recorded as
+        `header['head_size']`, or None if `buf` ends before they do.
+        """
+        size = len(buf)
+        if size >= 4 and buf[:4] != MAGIC:
+            raise CCFMagicError(f"Invalid file format: Magic bytes mismatch. Expected {MAGIC}, got {buf[:4]}")
+        if size < _HEADER.size:
+            return None
+        _, version, ncols, nrows = _HEADER.unpack_from(buf, 0)
+        if version not in SUPPORTED_VERSIONS:
+            raise CCFVersionError(f"Unsupported version: {version}. Expected one of {SUPPORTED_VERSIONS}.")
+        header = {'version': version, 'ncols': ncols, 'nrows': nrows}
+        pos = _HEADER.size
+        if version >= 2:
+            if size < pos + 8:
+                return None
+            header['footer_offset'] = _U64.unpack_from(buf, pos)[0]
+            pos += 8
+
+        # Schema
+        schema = []
+        unpack_length = _U16.unpack_from
+        for _ in range(ncols):
+            if pos + 2 > size:
+                return None
+            end = pos + 2 + unpack_length(buf, pos)[0]
+            if end >= size:
+                return None
+            schema.append((buf[pos + 2:end].decode('utf-8'), buf[end]))
+            pos = end + 1
+
+        if version == 1:
+            # The metadata table follows strictly after the schema
+            table_end = pos + _V1_COLUMN.size * ncols
+            if table_end > size:
+                return None
+            columns = {}
+            for (name, dtype), (offset, csize, usize) in zip(schema, _V1_COLUMN.iter_unpack(buf[pos:table_end])):
+                columns[name] = (dtype, ENCODING_PLAIN, CODEC_ZLIB, offset, csize, usize)
+            self.row_groups = [{'nrows': nrows, 'columns': columns, 'stats': {}, 'pages': {}, 'blooms': {}}]
+            pos = table_end
+
+        header['head_size'] = pos
+        self.header = header
+        self.nrows = nrows
+        self.schema = schema
+        self.column_types = dict(schema)
+        return pos
+
+    def _parse_footer(self, buf: Any, start: int) -> None:
+        """
+        Parses the metadata footer describing every row group (version 2 and
+        later), which starts at `start` in `buf`.
+        """
+        paged = self.header['version'] >= 3
+        with_blooms = self.header['version'] >= 4
+        names = [name for name, _ in self.schema]
+        unpack_chunk = _CHUNK.unpack_from
+        unpack_u32 = _U32.unpack_from
+        unpack_bloom = _BLOOM.unpack_from
+        row_groups = []
+        try:
+            ngroups = unpack_u32(buf, start)[0]
+            pos = start + 4
+            for _ in range(ngroups):
+                group_rows = _U64.unpack_from(buf, pos)[0]
+                pos += 8
+                columns = {}
+                stats = {}
+                pages = {}
+                blooms = {}
+                for name in names:
+                    dtype, encoding, codec, offset, csize, usize, count, has_stats = unpack_chunk(buf, pos)
+                    pos += _CHUNK.size
+                    columns[name] = (dtype, encoding, codec, offset, csize, usize)
+                    if has_stats:
+                        low, high, pos = _unpack_bounds(buf, pos, dtype)
+                        stats[name] = (count, low, high)
+                    else:
+                        stats[name] = (count, None, None)
+                    if paged:
+                        npages = unpack_u32(buf, pos)[0]
+                        pos += 4
+                        if npages > 1:
+                            pages[name], pos = _unpack_pages(buf, pos, npages, offset)
+                    if with_blooms:
+                        bloom_offset, bloom_size = unpack_bloom(buf, pos)
+                        pos += 16
+                        if bloom_size:
+                            blooms[name] = (bloom_offset, bloom_size)
+                row_groups.append({'nrows': group_rows, 'columns': columns, 'stats': stats,
+                                   'pages': pages, 'blooms': blooms})
+        except struct.error as e:
+            raise CCFError(f"Unexpected EOF while reading metadata footer: {e}") from e
+
+        self.row_groups = row_groups
+        self.header['footer_size'] = pos - start
+        if sum(g['nrows'] for g in self.row_groups) != self.nrows:
+            raise CCFError("Row group sizes do not add up to the row count in the header.")
+
+    def read_columns(self, columns: Optional[List[str]] = None,
+                     as_arrays: bool = False,
+                     where: Optional[List[Predicate]] = None) -> Dict[str, Any]:
         """
         Reads specified columns from the file.
         
         Args:
             columns: List of column names to read. If None, reads all columns.
+            as_arrays: If True, INT and FLOAT columns are returned as contiguous
+                typed buffers (NumPy arrays when NumPy is installed, otherwise
+                `array.array`) instead of lists. STRING columns are always lists.
+            where: Optional list of (column, operator, value) predicates combined
+                with AND, e.g. [("age", ">", 30)]. Row groups whose statistics
+                rule out a match are skipped without being decompressed, and
+                only matching rows are returned.
             
         Returns:
-            Dictionary mapping column names to lists of values.
+            Dictionary mapping column names to lists (or arrays) of values.
             
         Raises:
             CCFColumnError: If a requested column does not exist.
+            CCFQueryError: If a predicate is invalid.
             CCFError: If data corruption or IO errors occur.
         """
-        if columns is None:
-            columns = [name for name, _ in self.schema]
+        columns = self.resolve_columns(columns)
+        predicates = normalize_predicates(where, self.column_types)
+        parts = {name: [] for name in columns}
         
-        result = {}
-        
-        # Validate columns first
-        for name in columns:
-            if name not in self.col_meta:
-                raise CCFColumnError(f"Column '{name}' not found in file. Available: {list(self.col_meta.keys())}")
+        try:
+            with self._data_source() as f:
+                if predicates:
+                    for _, batch in self._iter_groups(f, columns, as_arrays, predicates):
+                        for name in columns:
+                            parts[name].append(batch[name])
+                else:
+                    # Without filters every chunk is needed: decode them all at once
+                    groups = [group for group in self.row_groups if group['nrows']]
+                    requests = [(name, group) for name in columns for group in groups]
+                    values = iter(self._read_chunks(f, requests, as_arrays))
+                    for name in columns:
+                        parts[name] = [next(values) for _ in groups]
+        except (IOError, OSError) as e:
+            raise CCFError(f"IO Error reading file: {e}") from e
         
+        return {name: concat_values(parts[name], self.column_types[name], as_arrays) for name in columns}
+
+    def iter_batches(self, columns: Optional[List[str]] = None,
+                     batch_rows: Optional[int] = None,
+                     as_arrays: bool = False,
+                     where: Optional[List[Predicate]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streams the specified columns batch by batch instead of materializing them.
+
+        Only one row group per requested column is decompressed at a time, so a
+        full scan runs in memory bounded by the row group size.
+
+        Args:
+            columns: List of column names to read. If None, reads all columns.
+            batch_rows: Number of rows per yielded batch. If None, one batch is
+                yielded per row group. The last batch may be smaller.
+            as_arrays: If True, numeric columns are yielded as typed buffers
+                (see `read_columns`).
+            where: Optional filter predicates (see `read_columns`).
+
+        Yields:
+            Dictionaries mapping column names to lists (or arrays) of values.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist.
+            CCFQueryError: If a predicate is invalid.
+            CCFError: If data corruption or IO errors occur.
+        """
+        if batch_rows is not None and batch_rows < 1:
+            raise ValueError("batch_rows must be a positive integer.")
+        columns = self.resolve_columns(columns)
+        predicates = normalize_predicates(where, self.column_types)
         try:
-            with open(self.file_path, 'rb') as f:
+            with self._data_source() as f:
+                groups = self._iter_groups(f, columns, as_arrays, predicates)
+                if batch_rows is None:
+                    for _, batch in groups:
+                        yield batch
+                    return
+
+                # Re-slice row groups into fixed-size batches
+                pending = {name: [] for name in columns}
+                pending_rows = 0
+                for nrows, batch in groups:
+                    for name in columns:
+                        pending[name] = concat_values([pending[name], batch[name]], self.column_types[name], as_arrays) \
+                            if pending_rows else batch[name]
+                    pending_rows += nrows
+                    start = 0
+                    while pending_rows - start >= batch_rows:
+                        yield {name: vals[start:start + batch_rows] for name, vals in pending.items()}
+                        start += batch_rows
+                    if start:
+                        pending = {name: vals[start:] for name, vals in pending.items()}
+                        pending_rows -= start
+                if pending_rows:
+                    yield pending
+        except (IOError, OSError) as e:
+            raise CCFError(f"IO Error reading file: {e}") from e
+
+    def select_row_groups(self, where: Optional[List[Predicate]] = None) -> List[int]:
+        """
+        Returns the indices of the row groups that may contain rows matching
+        `where`, judged from chunk statistics and Bloom filters (no column data
+        is read).
+
+        Raises:
+            CCFColumnError: If a predicate references an unknown column.
+            CCFQueryError: If a predicate is invalid.
+        """
+        predicates = normalize_predicates(where, self.column_types)
+        return [i for i, group in enumerate(self.row_groups) if self._group_may_match(group, predicates)]
+
+    def read_chunk(self, name: str, group_index: int, as_arrays: bool = False) -> Any:
+        """
+        Reads and decodes the chunk of one column in one row group, through the
+        cache if any. Safe to call from several threads, so callers can schedule
+        the chunks of a scan themselves: `resolve_columns` validates the
+        columns and `select_row_groups` picks the row groups a filter needs.
+
+        Raises:
+            CCFColumnError: If the column does not exist.
+            IndexError: If there is no such row group.
+            CCFError: If data corruption or IO errors occur.
+        """
+        self.resolve_columns([name])
+        group = self.row_groups[group_index]
+        try:
+            with self._data_source() as f:
+                return self._read_chunks(f, [(name, group)], as_arrays)[0]
+        except (IOError, OSError) as e:
+            raise CCFError(f"IO Error reading file: {e}") from e
+
+    def take(self, columns: Optional[List[str]], row_indices: Iterable[int],
+             as_arrays: bool = False) -> Dict[str, Any]:
+        """
+        Reads the values at the given row positions. Only the pages holding
+        those rows are read and decompressed (whole chunks for files written
+        without pages).
+
+        Args:
+            columns: List of column names to read. If None, reads all columns.
+            row_indices: Row positions in the file, in any order; repeats are allowed.
+            as_arrays: If True, numeric columns are returned as typed buffers
+                (see `read_columns`).
+
+        Returns:
+            Dictionary mapping column names to values, in the order of `row_indices`.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist.
+            IndexError: If a row position is out of range.
+            CCFError: If data corruption or IO errors occur.
+        """
+        columns = self.resolve_columns(columns)
+        rows = list(row_indices)
+        for row in rows:
+            if not 0 <= row < self.nrows:
+                raise IndexError(f"Row {row} out of range for a file with {self.nrows} rows.")
+        result = {}
+        try:
+            with self._data_source() as f:
                 for name in columns:
-                    offset, csize, usize, dtype = self.col_meta[name]
-                    
-                    # Seek and Read
-                    f.seek(offset)
-                    compressed_data = f.read(csize)
-                    if len(compressed_data) != csize:
-                        raise CCFError(f"Incomplete data read for column '{name}'.")
-                        
-                    try:
-                        raw_data = zlib.decompress(compressed_data)
-                    except zlib.error as e:
-                        raise CCFError(f"Decompression failed for column '{name}': {e}")
-                    
-                    if len(raw_data) != usize:
-                         if len(raw_data) != usize:
-                             raise CCFError(f"Size mismatch for column '{name}': expected {usize}, got {len(raw_data)}")
-
-                    # Parse
-                    result[name] = self._parse_column(raw_data, dtype, self.nrows)
+                    starts, units = self._column_units(name)
+                    requests: Dict[int, List[int]] = {} # unit -> indices into rows
+                    for i, row in enumerate(rows):
+                        requests.setdefault(bisect_right(starts, row) - 1, []).append(i)
+                    parts, order, total = [], [0] * len(rows), 0
+                    for unit in sorted(requests):
+                        indices = requests[unit]
+                        parts.append(self._read_unit(f, name, units[unit], as_arrays,
+                                                     [rows[i] - starts[unit] for i in indices]))
+                        for k, i in enumerate(indices):
+                            order[i] = total + k
+                        total += len(indices)
+                    joined = concat_values(parts, self.column_types[name], as_arrays)
+                    result[name] = joined if order == list(range(total)) else take_values(joined, order)
+        except (IOError, OSError) as e:
+            raise CCFError(f"IO Error reading file: {e}") from e
+        return result
+
+    def read_rows(self, start: int, stop: int, columns: Optional[List[str]] = None,
+                  as_arrays: bool = False) -> Dict[str, Any]:
+        """
+        Reads rows `start` to `stop` (exclusive), decompressing only the pages
+        that overlap the range. `stop` is clamped to the number of rows.
+
+        Raises:
+            CCFColumnError: If a requested column does not exist.
+            IndexError: If `start` is negative.
+            CCFError: If data corruption or IO errors occur.
+        """
+        if start < 0:
+            raise IndexError(f"Row {start} out of range for a file with {self.nrows} rows.")
+        columns = self.resolve_columns(columns)
+        stop = min(stop, self.nrows)
+        result = {}
+        try:
+            with self._data_source() as f:
+                for name in columns:
+                    dtype = self.column_types[name]
+                    if start >= stop:
+                        result[name] = concat_values([], dtype, as_arrays)
+                        continue
+                    starts, units = self._column_units(name)
+                    first = bisect_right(starts, start) - 1
+                    last = bisect_left(starts, stop)
+                    parts = [self._read_unit(f, name, unit, as_arrays) for unit in units[first:last]]
+                    offset = starts[first]
+                    result[name] = concat_values(parts, dtype, as_arrays)[start - offset:stop - offset]
         except (IOError, OSError) as e:
             raise CCFError(f"IO Error reading file: {e}") from e
-        
         return result
 
-    def _parse_column(self, raw_bytes: bytes, dtype: int, userid_nrows: int) -> List[Any]:
+    def _column_units(self, name: str) -> tuple:
+        """
+        Returns the units a column can be read in (pages, or whole chunks when
+        a chunk has no pages) as (first row of each unit, [(group, page or None), ...]).
+        """
+        index = self._units.get(name)
+        if index is None:
+            starts, units = [], []
+            row = 0
+            for group in self.row_groups:
+                pages = group['pages'].get(name)
+                if pages:
+                    for page in pages:
+                        starts.append(row + page[0])
+                        units.append((group, page))
+                elif group['nrows']:
+                    starts.append(row)
+                    units.append((group, None))
+                row += group['nrows']
+            index = self._units[name] = (starts, units)
+        return index
+
+    def _read_unit(self, f: Optional[BinaryIO], name: str, unit: tuple, as_arrays: bool,
+                   positions: Optional[List[int]] = None) -> Any:
+        """
+        Reads and decodes one page (or one chunk without pages), using the cache
+        if any. With `positions`, returns only the values at those positions;
+        without a cache, only they are decoded from plain STRING pages.
+        """
+        group, page = unit
+        if page is None:
+            values = self._read_chunks(f, [(name, group)], as_arrays)[0]
+            return values if positions is None else take_values(values, positions)
+        _, nrows, encoding, offset, csize, usize = page
+        key = None
+        if self.cache is not None:
+            key = self._file_key + (name, offset, as_arrays, 'page')
+            values = self.cache.get(key)
+            if values is not None:
+                if self.metrics is not None:
+                    self.metrics.add(name, cache_hits=1)
+                return values if positions is None else take_values(values, positions)
+        dtype, _, codec = group['columns'][name][:3]
+        column_type = self.column_types[name]
+        block = self._read_block(f, offset, csize, name)
+        values = self._decode_block(block, name, dtype, codec, encoding, usize, nrows,
+                                    as_arrays and column_type in _ARRAY_CODES,
+                                    positions if key is None else None)
+        if dtype != column_type:
+            values = cast_values(values, dtype, column_type)
+        if self.metrics is not None:
+            self.metrics.add(name, pages=1, rows=nrows, compressed_bytes=csize, uncompressed_bytes=usize)
+        if key is None:
+            return values
+        self.cache.put(key, values)
+        return values if positions is None else take_values(values, positions)
+
+    def _group_may_match(self, group: Dict[str, Any], predicates: List[Predicate]) -> bool:
+        """
+        Checks normalized predicates against the statistics of one row group.
+        """
+        if not group['nrows']:
+            return False
+        for column, op, value in predicates:
+            if not stats_may_match(group['stats'].get(column), op, value):
+                return False
+        # Bloom filters need a read, so they are only consulted once statistics pass
+        for column, op, value in predicates:
+            if op in ('=', 'in') and column in group['blooms'] and not self._bloom_may_match(group, column, op, value):
+                return False
+        return True
+
+    def _bloom_may_match(self, group: Dict[str, Any], column: str, op: str, value: Any) -> bool:
+        """
+        Checks an '=' or 'in' predicate against the Bloom filter of a chunk,
+        loading the filter on first use.
+        """
+        offset, size = group['blooms'][column]
+        bloom = self._blooms.get(offset)
+        if bloom is None:
+            with self._data_source() as f:
+                block = self._read_block(f, offset, size, column)
+                try:
+                    bloom = BloomFilter.from_bytes(bytes(block))
+                finally:
+                    if isinstance(block, memoryview):
+                        block.release()
+            self._blooms[offset] = bloom
+        dtype = group['columns'][column][0]
+        for v in (value if op == 'in' else (value,)):
+            key = probe_value(v, dtype)
+            if key is None or bloom.might_contain(key):
+                return True
+        if self.metrics is not None:
+            self.metrics.add(column, bloom_skips=1)
+        return False
+
+    def _iter_groups(self, f: Optional[BinaryIO], columns: List[str], as_arrays: bool,
+                     predicates: List[Predicate]) -> Iterator[tuple]:
+        """
+        Yields (nrows, {name: values}) for every non-empty row group that is not
+        pruned by statistics, keeping only the rows that match `predicates`.
+        """
+        for group in self.row_groups:
+            if not self._group_may_match(group, predicates):
+                continue
+            if not predicates:
+                chunks = self._read_chunks(f, [(name, group) for name in columns], as_arrays)
+                yield group['nrows'], dict(zip(columns, chunks))
+                continue
+
+            # Decode predicate columns first; they are reused if also requested
+            filter_columns = list(dict.fromkeys(column for column, _, _ in predicates))
+            decoded = dict(zip(filter_columns, self._read_chunks(
+                f, [(name, group) for name in filter_columns], as_arrays)))
+            indices = matching_rows(decoded, predicates)
+            if not indices:
+                continue
+
+            remaining = [name for name in columns if name not in decoded]
+            decoded.update(zip(remaining, self._read_chunks(
+                f, [(name, group) for name in remaining], as_arrays)))
+            batch = {}
+            for name in columns:
+                values = decoded[name]
+                batch[name] = values if len(indices) == group['nrows'] else take_values(values, indices)
+            yield len(indices), batch
+
+    def lazy_columns(self, as_arrays: bool = False) -> "LazyColumns":
+        """
+        Returns a read-only mapping of column name to values that decompresses
+        each column the first time it is accessed and keeps the result.
+
+        Best combined with `use_mmap=True`, so that accessing a column does not
+        reopen the file.
+        """
+        return LazyColumns(self, as_arrays)
+
+    @contextmanager
+    def _data_source(self) -> Iterator[Optional[BinaryIO]]:
+        """
+        Yields the file object to read blocks from, or None when reading from the mapping.
+        """
+        if self.use_mmap:
+            if self._mmap is None:
+                raise CCFError(f"Reader for '{self.file_path}' is closed.")
+            yield None
+        else:
+            with open(self.file_path, 'rb') as f:
+                yield f
+
+    def _read_block(self, f: Optional[BinaryIO], offset: int, size: int, name: str) -> Any:
+        """
+        Returns `size` bytes at `offset`, as a memoryview over the mapping in mmap mode.
+        """
+        start = time.perf_counter() if self.metrics is not None else 0.0
+        if f is None:
+            block = memoryview(self._mmap)[offset:offset + size]
+        else:
+            f.seek(offset)
+            block = f.read(size)
+        if self.metrics is not None:
+            # In mmap mode pages are only read when the block is decompressed
+            self.metrics.add(name, io_seconds=time.perf_counter() - start)
+        if len(block) != size:
+            raise CCFError(f"Incomplete data read for column '{name}'.")
+        return block
+
+    def resolve_columns(self, columns: Optional[List[str]]) -> List[str]:
+        """
+        Returns the requested column names (all columns if None), validating that they exist.
+        """
+        if columns is None:
+            return [name for name, _ in self.schema]
+        for name in columns:
+            if name not in self.column_types:
+                raise CCFColumnError(f"Column '{name}' not found in file. Available: {list(self.column_types.keys())}")
+        return list(columns)
+
+    def _read_chunks(self, f: Optional[BinaryIO], requests: List[tuple], as_arrays: bool = False) -> List[Any]:
+        """
+        Reads and decodes a list of (column name, row group) chunks, returning
+        their values in the same order. Chunks found in the cache are not read.
+        """
+        if self.cache is None:
+            return self._load_chunks(f, requests, as_arrays)
+        keys = [self._file_key + (name, group['columns'][name][3], as_arrays) for name, group in requests]
+        values = [self.cache.get(key) for key in keys]
+        missing = [i for i, v in enumerate(values) if v is None]
+        if self.metrics is not None:
+            for (name, _), v in zip(requests, values):
+                if v is not None:
+                    self.metrics.add(name, cache_hits=1)
+        if missing:
+            for i, v in zip(missing, self._load_chunks(f, [requests[i] for i in missing], as_arrays)):
+                self.cache.put(keys[i], v)
+                values[i] = v
+        return values
+
+    def _load_chunks(self, f: Optional[BinaryIO], requests: List[tuple], as_arrays: bool = False) -> List[Any]:
+        """
+        Reads and decodes chunks from the file. Blocks are read sequentially;
+        decoding runs on the executor when the reader is parallel.
+        """
+        executor = self._get_executor()
+        if executor is None or len(requests) < 2:
+            return [self._read_chunk(f, name, group, as_arrays) for name, group in requests]
+
+        submitted = []
+        try:
+            for name, group in requests:
+                _, _, _, offset, csize, _ = group['columns'][name]
+                block = self._read_block(f, offset, csize, name)
+                submitted.append((executor.submit(self._decode_chunk, block, name, group, as_arrays), block))
+            return [future.result() for future, _ in submitted]
+        finally:
+            for future, block in submitted:
+                if future.cancel() and isinstance(block, memoryview):
+                    block.release()
+
+    def _get_executor(self) -> Optional[Executor]:
+        """
+        Returns the executor used for decoding, creating the reader's own pool on first use.
+        """
+        if self._executor is None and self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._owns_executor = True
+        return self._executor
+
+    def _read_chunk(self, f: Optional[BinaryIO], name: str, group: Dict[str, Any],
+                    as_arrays: bool = False) -> Any:
+        """
+        Internal method to read, decompress and parse one column chunk of a row group.
+        """
+        _, _, _, offset, csize, _ = group['columns'][name]
+
+        # Seek and Read
+        return self._decode_chunk(self._read_block(f, offset, csize, name), name, group, as_arrays)
+
+    def _decode_chunk(self, compressed_data: Any, name: str, group: Dict[str, Any],
+                      as_arrays: bool = False) -> Any:
+        """
+        Decompresses and parses one compressed column chunk. Values are converted
+        to the column type if the chunk was written with a narrower type.
+        Safe to call from worker threads.
+        """
+        dtype, encoding, codec, _, csize, usize = group['columns'][name]
+        # Chunks of a column widened to STRING are decoded to lists
+        column_type = self.column_types[name]
+        as_arrays = as_arrays and column_type in _ARRAY_CODES
+        pages = group['pages'].get(name)
+        if pages is None:
+            values = self._decode_block(compressed_data, name, dtype, codec, encoding, usize,
+                                        group['nrows'], as_arrays)
+        else:
+            view = compressed_data if isinstance(compressed_data, memoryview) else memoryview(compressed_data)
+            base = pages[0][3]
+            try:
+                parts = [self._decode_block(view[offset - base:offset - base + page_csize], name, dtype, codec,
+                                            page_encoding, page_usize, page_rows, as_arrays)
+                         for _, page_rows, page_encoding, offset, page_csize, page_usize in pages]
+            finally:
+                view.release()
+            values = concat_values(parts, dtype, as_arrays)
+        if dtype != column_type:
+            values = cast_values(values, dtype, column_type)
+        if self.metrics is not None:
+            self.metrics.add(name, chunks=1, rows=group['nrows'], compressed_bytes=csize, uncompressed_bytes=usize)
+        return values
+
+    def _decode_block(self, compressed_data: Any, name: str, dtype: int, codec: int, encoding: int,
+                      usize: int, nrows: int, as_arrays: bool,
+                      positions: Optional[List[int]] = None) -> Any:
+        """
+        Decompresses and parses one chunk or page, recording its timings.
+        With `positions`, only the values at those positions are returned.
+        """
+        start = time.perf_counter() if self.metrics is not None else 0.0
+        try:
+            raw_data = compression.decompress(codec, compressed_data)
+        except CCFError as e:
+            raise CCFError(f"Decompression failed for column '{name}': {e}") from e
+        finally:
+            if isinstance(compressed_data, memoryview):
+                # Views must be released before the mapping can be closed
+                compressed_data.release()
+
+        if len(raw_data) != usize:
+            raise CCFError(f"Size mismatch for column '{name}': expected {usize}, got {len(raw_data)}")
+        decompressed = time.perf_counter() if self.metrics is not None else 0.0
+        if positions is not None and dtype == TYPE_STRING and encoding == ENCODING_PLAIN:
+            values = _pick_strings(raw_data, nrows, positions)
+        else:
+            values = self._parse_column(raw_data, dtype, nrows, as_arrays, encoding)
+            if positions is not None:
+                values = take_values(values, positions)
+        if self.metrics is not None:
+            self.metrics.add(name, decompress_seconds=decompressed - start,
+                             decode_seconds=time.perf_counter() - decompressed)
+        return values
+
+    def _parse_column(self, raw_bytes: bytes, dtype: int, userid_nrows: int,
+                      as_arrays: bool = False, encoding: int = ENCODING_PLAIN) -> Any:
         """
         Internal method to parse raw decompressed bytes into a list of values 
         according to the column type.
+
+        Fixed-width values and string offsets are decoded in bulk rather than
+        one `struct.unpack_from` call per row. With `as_arrays`, numeric columns
+        are returned as typed buffers; NumPy arrays are zero-copy views over
+        `raw_bytes`. Dictionary-encoded strings decode each distinct value once;
+        delta, bit-packed and run-length integer chunks are expanded in bulk.
+        TIMESTAMP values are returned as naive UTC datetimes, BOOL values as bools.
         """
-        values = []
-        if dtype == TYPE_INT:
-            expected_size = userid_nrows * 4
-            if len(raw_bytes) < expected_size:
-                 raise CCFError(f"Insufficient data for INT column. Expected {expected_size}, got {len(raw_bytes)}")
-            # 4 bytes per int
-            for i in range(userid_nrows):
-                val = struct.unpack_from('<i', raw_bytes, i * 4)[0]
-                values.append(val)
-        
-        elif dtype == TYPE_FLOAT:
-            expected_size = userid_nrows * 8
+        if encoding not in ENCODING_MAP:
+            raise CCFError(f"Unsupported chunk encoding: {encoding}.")
+        if dtype in INTEGER_TYPES and encoding in integer_encoding.DECODERS:
+            values = integer_encoding.DECODERS[encoding](raw_bytes, userid_nrows)
+            if not as_arrays:
+                return timestamps.from_micros_list(values) if dtype == TYPE_TIMESTAMP else values
+            if np is not None:
+                return np.array(values, dtype=_NUMPY_DTYPES[dtype])
+            return array(_ARRAY_CODES[dtype], values)
+
+        if dtype in _FIXED_WIDTHS:
+            width = _FIXED_WIDTHS[dtype]
+            expected_size = userid_nrows * width
             if len(raw_bytes) < expected_size:
-                 raise CCFError(f"Insufficient data for FLOAT column. Expected {expected_size}, got {len(raw_bytes)}")
-            # 8 bytes per double
-            for i in range(userid_nrows):
-                val = struct.unpack_from('<d', raw_bytes, i * 8)[0]
-                values.append(val)
-        
+                 raise CCFError(f"Insufficient data for {TYPE_MAP[dtype].upper()} column. Expected {expected_size}, got {len(raw_bytes)}")
+            if as_arrays and np is not None:
+                return np.frombuffer(raw_bytes, dtype=_NUMPY_DTYPES[dtype], count=userid_nrows)
+            values = _unpack_array(raw_bytes, _ARRAY_CODES[dtype], userid_nrows)
+            if as_arrays:
+                return values
+            return timestamps.from_micros_list(values) if dtype == TYPE_TIMESTAMP else values.tolist()
+
+        elif dtype == TYPE_BOOL:
+            bits = integer_encoding.unpack_bits(raw_bytes, userid_nrows)
+            if not as_arrays:
+                return list(map(bool, bits))
+            if np is not None:
+                return np.frombuffer(bits, dtype=_NUMPY_DTYPES[dtype])
+            return array(_ARRAY_CODES[dtype], bits)
+
         elif dtype == TYPE_STRING:
-            # [offset1 (4), offset2 (4)...] [blob]
-            # Offsets count = nrows
-            offsets_size = userid_nrows * 4
-            if len(raw_bytes) < offsets_size:
-                 raise CCFError(f"Insufficient data for STRING column offsets. Expected at least {offsets_size}, got {len(raw_bytes)}")
-                 
-            offsets = []
-            pos = 0
-            for _ in range(userid_nrows):
-                o = struct.unpack_from('<I', raw_bytes, pos)[0]
-                offsets.append(o)
-                pos += 4
-            
-            blob_start_in_raw = pos
-            blob = raw_bytes[blob_start_in_raw:]
-            
-            # Basic Bounds Check on offsets?
-            # Max offset should be <= len(blob)
-            if offsets and offsets[-1] > len(blob):
-                 raise CCFError(f"String offset out of bounds. Max offset {offsets[-1]}, blob size {len(blob)}")
-            
-            start = 0
-            for end in offsets:
-                if end < start:
-                     # safeguard
-                     end = start
-                s_bytes = blob[start:end]
-                values.append(s_bytes.decode('utf-8'))
-                start = end
-        
-        return values
+            if encoding == ENCODING_DICTIONARY:
+                return _parse_dictionary(raw_bytes, userid_nrows)
+            values, _ = _parse_strings(raw_bytes, userid_nrows)
+            return values
+
+        return []
+
+
+class LazyColumns(Mapping):
+    """
+    Read-only mapping of column name to values, returned by `CCFReader.lazy_columns()`.
+    A column is read and decompressed on first access only.
+    """
+    def __init__(self, reader: CCFReader, as_arrays: bool = False):
+        self._reader = reader
+        self._as_arrays = as_arrays
+        self._loaded: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._loaded:
+            if name not in self._reader.column_types:
+                raise KeyError(name)
+            self._loaded[name] = self._reader.read_columns([name], self._as_arrays)[name]
+        return self._loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name, _ in self._reader.schema)
+
+    def __len__(self) -> int:
+        return len(self._reader.schema)
+
+    def is_loaded(self, name: str) -> bool:
+        """
+        Returns True if the column has already been decompressed.
+        """
+        return name in self._loaded
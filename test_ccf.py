@@ -1,11 +1,34 @@
+import asyncio
+import contextlib
 import unittest
 import os
 import csv
+import io
 import struct
-from writer import CCFWriter
+import tempfile
+import zlib
+from datetime import datetime
+from unittest import mock
+from writer import CCFWriter, resolve_column_type, infer_and_convert
 from reader import CCFReader
-from exceptions import CCFError, CCFColumnError
-from constants import TYPE_INT, TYPE_FLOAT, TYPE_STRING
+from exceptions import CCFError, CCFColumnError, CCFSchemaError, CCFQueryError, CCFVersionError
+from constants import (TYPE_INT, TYPE_FLOAT, TYPE_STRING, TYPE_INT64, TYPE_BOOL, TYPE_TIMESTAMP, ENCODING_PLAIN, ENCODING_DICTIONARY,
+                       ENCODING_DELTA, ENCODING_FOR, ENCODING_RLE, CODEC_NONE, CODEC_ZLIB, CODEC_LZMA)
+import compression
+import integer_encoding
+from cache import ColumnCache
+from predicates import parse_predicate
+from query import run_query
+import benchmark
+import ccf
+from metrics import Metrics, column_storage
+from csv_export import export_csv, write_csv
+from csv_ingest import ingest_csv, split_ranges, split_records, read_header
+from dataset import CCFDataset
+from bloom import BloomFilter, probe_value
+from compact import compact
+from catalog import Catalog
+from async_reader import AsyncCCFReader
 
 class TestCCF(unittest.TestCase):
     def setUp(self):
@@ -98,5 +121,772 @@ class TestCCF(unittest.TestCase):
         data = reader.read_columns()
         self.assertEqual(data['c1'], [])
 
+    def test_streaming_row_groups(self):
+        headers = ['id', 'name']
+        writer = CCFWriter(self.test_ccf, row_group_size=3)
+        writer.open(headers)
+        writer.write_batch([[str(i), f'n{i}'] for i in range(5)])
+        writer.write_batch(iter([[str(i), f'n{i}'] for i in range(5, 8)]))
+        writer.close()
+
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.nrows, 8)
+        self.assertEqual([g['nrows'] for g in reader.row_groups], [3, 3, 2])
+        data = reader.read_columns()
+        self.assertEqual(data['id'], list(range(8)))
+        self.assertEqual(data['name'], [f'n{i}' for i in range(8)])
+
+    def test_streaming_type_widening(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=2)
+        writer.write(['a', 'b'], iter([['1', '1'], ['2', '2'], ['2.5', 'x']]))
+
+        reader = CCFReader(self.test_ccf)
+        schema_dict = dict(reader.schema)
+        self.assertEqual(schema_dict['a'], TYPE_FLOAT)
+        self.assertEqual(schema_dict['b'], TYPE_STRING)
+        data = reader.read_columns()
+        self.assertEqual(data['a'], [1.0, 2.0, 2.5])
+        self.assertEqual(data['b'], ['1', '2', 'x'])
+
+    def test_ragged_row(self):
+        writer = CCFWriter(self.test_ccf)
+        with self.assertRaises(CCFSchemaError):
+            writer.write(['c1', 'c2'], iter([['a', 'b'], ['c']]))
+
+    def test_iter_batches(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=4)
+        writer.write(['id', 'name'], [[str(i), f'n{i}'] for i in range(10)])
+        reader = CCFReader(self.test_ccf)
+
+        groups = list(reader.iter_batches(['id']))
+        self.assertEqual([len(b['id']) for b in groups], [4, 4, 2])
+        self.assertEqual(list(groups[0]), ['id'])
+
+        batches = list(reader.iter_batches(batch_rows=3))
+        self.assertEqual([len(b['name']) for b in batches], [3, 3, 3, 1])
+        self.assertEqual(sum((b['id'] for b in batches), []), list(range(10)))
+        self.assertEqual(batches[-1]['name'], ['n9'])
+
+        with self.assertRaises(CCFColumnError):
+            next(reader.iter_batches(['missing']))
+
+    def test_as_arrays(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=2)
+        writer.write(['i', 'f', 's'], [[str(i), f'{i}.5', f's{i}'] for i in range(5)])
+        reader = CCFReader(self.test_ccf)
+
+        data = reader.read_columns(as_arrays=True)
+        self.assertNotIsInstance(data['i'], list)
+        self.assertNotIsInstance(data['f'], list)
+        self.assertEqual(list(data['i']), [0, 1, 2, 3, 4])
+        self.assertEqual(list(data['f']), [0.5, 1.5, 2.5, 3.5, 4.5])
+        self.assertEqual(data['s'], ['s0', 's1', 's2', 's3', 's4'])
+
+        batches = list(reader.iter_batches(['i'], batch_rows=3, as_arrays=True))
+        self.assertEqual([list(b['i']) for b in batches], [[0, 1, 2], [3, 4]])
+
+    def test_mmap_lazy_columns(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=2)
+        writer.write(['i', 's'], [['1', 'a'], ['2', 'b'], ['3', 'c']])
+
+        with CCFReader(self.test_ccf, use_mmap=True) as reader:
+            self.assertEqual(reader.read_columns(['s']), {'s': ['a', 'b', 'c']})
+            cols = reader.lazy_columns()
+            self.assertEqual(list(cols), ['i', 's'])
+            self.assertFalse(cols.is_loaded('i'))
+            self.assertEqual(cols['i'], [1, 2, 3])
+            self.assertTrue(cols.is_loaded('i'))
+            self.assertFalse(cols.is_loaded('s'))
+            with self.assertRaises(KeyError):
+                cols['missing']
+
+        with self.assertRaises(CCFError):
+            reader.read_columns(['i'])
+
+    def test_chunk_statistics(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=3)
+        writer.write(['id', 'name'], [[str(i), f'n{i}'] for i in range(8)])
+        reader = CCFReader(self.test_ccf)
+
+        self.assertEqual(reader.row_groups[0]['stats']['id'], (3, 0, 2))
+        self.assertEqual(reader.row_groups[2]['stats']['name'], (2, 'n6', 'n7'))
+
+    def test_where_pruning(self):
+        writer = CCFWriter(self.test_ccf, row_group_size=3)
+        writer.write(['id', 'name'], [[str(i), f'n{i}'] for i in range(8)])
+        reader = CCFReader(self.test_ccf)
+
+        self.assertEqual(reader.select_row_groups([('id', '>', 4)]), [1, 2])
+        self.assertEqual(reader.select_row_groups([('id', '>=', 3), ('id', '<', 6)]), [1])
+        self.assertEqual(reader.select_row_groups([('name', '=', 'n7')]), [2])
+
+        data = reader.read_columns(['name'], where=[('id', '>', 4)])
+        self.assertEqual(data, {'name': ['n5', 'n6', 'n7']})
+        data = reader.read_columns(['id'], where=[('id', 'in', ['1', '7'])])
+        self.assertEqual(data, {'id': [1, 7]})
+        batches = list(reader.iter_batches(['id'], batch_rows=2, where=[('id', '!=', 0)]))
+        self.assertEqual([b['id'] for b in batches], [[1, 2], [3, 4], [5, 6], [7]])
+
+        with self.assertRaises(CCFQueryError):
+            reader.read_columns(where=[('id', '~', 1)])
+        with self.assertRaises(CCFColumnError):
+            reader.read_columns(where=[('missing', '=', 1)])
+
+    def test_dictionary_encoding(self):
+        countries = ['DE', 'FR', 'US', 'DE']
+        rows = [[countries[i % 4], f'user{i}'] for i in range(100)]
+        writer = CCFWriter(self.test_ccf)
+        writer.write(['country', 'user'], rows)
+
+        reader = CCFReader(self.test_ccf)
+        chunks = reader.row_groups[0]['columns']
+        self.assertEqual(chunks['country'][1], ENCODING_DICTIONARY)
+        self.assertEqual(chunks['user'][1], ENCODING_PLAIN)
+        data = reader.read_columns()
+        self.assertEqual(data['country'], [r[0] for r in rows])
+        self.assertEqual(data['user'], [r[1] for r in rows])
+        self.assertEqual(reader.read_columns(['country'], where=[('country', '=', 'FR')])['country'], ['FR'] * 25)
+
+        plain = CCFWriter(self.test_ccf, dictionary_ratio=0)
+        plain.write(['country', 'user'], rows)
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.row_groups[0]['columns']['country'][1], ENCODING_PLAIN)
+        self.assertEqual(reader.read_columns()['country'], [r[0] for r in rows])
+
+    def test_codecs(self):
+        rows = [[str(i), f'value-{i % 7}', os.urandom(8).hex()] for i in range(300)]
+        for codec in ('none', 'zlib', 'lzma', 'bz2', 'fastest', 'balanced', 'smallest'):
+            writer = CCFWriter(self.test_ccf, codec=codec)
+            writer.write(['i', 's', 'r'], rows)
+            data = CCFReader(self.test_ccf).read_columns()
+            self.assertEqual(data['i'], list(range(300)), codec)
+            self.assertEqual(data['r'], [r[2] for r in rows], codec)
+
+        writer = CCFWriter(self.test_ccf, codec='zlib', compression_level=9,
+                           column_codecs={'i': 'none', 's': 'lzma'}, dictionary_ratio=0)
+        writer.write(['i', 's', 'r'], rows)
+        chunks = CCFReader(self.test_ccf).row_groups[0]['columns']
+        self.assertEqual([chunks[c][2] for c in ('i', 's', 'r')], [CODEC_NONE, CODEC_LZMA, CODEC_ZLIB])
+
+        with self.assertRaises(CCFError):
+            CCFWriter(self.test_ccf, codec='snappy')
+
+    def test_codec_policies(self):
+        noise = os.urandom(16 * 1024)
+        self.assertEqual(compression.choose_codec(noise, 'fastest'), CODEC_NONE)
+        self.assertEqual(compression.choose_codec(noise, 'balanced'), CODEC_NONE)
+        text = b'abcabcabd' * 4000
+        self.assertEqual(compression.choose_codec(text, 'fastest'), CODEC_ZLIB)
+        self.assertNotEqual(compression.choose_codec(text, 'smallest'), CODEC_NONE)
+
+    def test_parallel_writer(self):
+        rows = [[str(i), f'{i}.25', f'name{i % 13}', f'id-{i}'] for i in range(1000)]
+        headers = ['i', 'f', 'cat', 'key']
+        CCFWriter(self.test_ccf, row_group_size=128).write(headers, rows)
+        with open(self.test_ccf, 'rb') as f:
+            expected = f.read()
+
+        for executor in ('thread', 'process'):
+            writer = CCFWriter(self.test_ccf, row_group_size=128, workers=3, executor=executor)
+            writer.write(headers, iter(rows))
+            with open(self.test_ccf, 'rb') as f:
+                self.assertEqual(f.read(), expected, executor)
+
+    def test_parallel_reader(self):
+        rows = [[str(i), f'{i}.5', f'k{i % 5}', f'id-{i}'] for i in range(500)]
+        CCFWriter(self.test_ccf, row_group_size=64).write(['i', 'f', 'k', 's'], rows)
+        expected = CCFReader(self.test_ccf).read_columns()
+
+        with CCFReader(self.test_ccf, workers=4) as reader:
+            self.assertEqual(reader.read_columns(), expected)
+            filtered = reader.read_columns(['s'], where=[('i', '>=', 490)])
+            self.assertEqual(filtered['s'], [f'id-{i}' for i in range(490, 500)])
+        with CCFReader(self.test_ccf, use_mmap=True, workers=4) as reader:
+            batches = list(reader.iter_batches(['i', 'k']))
+            self.assertEqual(sum((b['i'] for b in batches), []), expected['i'])
+
+    def test_bulk_type_inference(self):
+        self.assertEqual(resolve_column_type(['1', '2', '-3']), TYPE_INT)
+        self.assertEqual(resolve_column_type(['1', '2.5']), TYPE_FLOAT)
+        self.assertEqual(resolve_column_type(['1', '']), TYPE_STRING)
+        self.assertEqual(infer_and_convert(['1', '2.5']), (TYPE_FLOAT, [1.0, 2.5]))
+        self.assertEqual(infer_and_convert(['7', 'x']), (TYPE_STRING, ['7', 'x']))
+
+    def test_pack_is_bulk(self):
+        # Encoding must pack whole columns, not values one at a time (which
+        # copies the block per value); timings are in benchmark.py
+        def pack_calls(n):
+            rows = [[str(i), f'{i}.5', f'user-{i}-abcdefgh'] for i in range(n)]
+            with mock.patch('struct.pack', wraps=struct.pack) as pack:
+                CCFWriter(self.test_ccf, row_group_size=n, codec='none', page_rows=None).write(['i', 'f', 's'], rows)
+            return pack.call_count
+
+        self.assertEqual(pack_calls(50000), pack_calls(100))
+        data = CCFReader(self.test_ccf).read_columns()
+        self.assertEqual(data['i'], list(range(100)))
+        self.assertEqual(data['s'][-1], 'user-99-abcdefgh')
+
+    def test_integer_encodings(self):
+        samples = [
+            [5, 5, 5],
+            [0, 1, 0, 1, 1, 0, 1, 0, 1],
+            [-3, 2, -1, 0, 3],
+            [100, 300, 65000, 70000, -70000],
+            [-2**31, 2**31 - 1, 0],
+        ]
+        for values in samples:
+            for encoding, encode in integer_encoding.ENCODERS.items():
+                decoded = integer_encoding.DECODERS[encoding](encode(values), len(values))
+                self.assertEqual(decoded, values, (encoding, values))
+
+        ids = list(range(1000, 3000))
+        self.assertEqual(integer_encoding.choose_encoding(ids, len(ids) * 4), ENCODING_DELTA)
+        flags = [0] * 500 + [1] * 500
+        self.assertEqual(integer_encoding.choose_encoding(flags, len(flags) * 4), ENCODING_RLE)
+        small = [i % 7 for i in range(1000)]
+        self.assertEqual(integer_encoding.choose_encoding(small, len(small) * 4), ENCODING_FOR)
+        noise = [(i * 2654435761) % 2**31 for i in range(1000)]
+        self.assertIsNone(integer_encoding.choose_encoding(noise, len(noise) * 4))
+
+    def test_integer_encodings_round_trip(self):
+        rows = [[str(1000 + i), str(i // 50), str(i % 7 - 3)] for i in range(300)]
+        CCFWriter(self.test_ccf, row_group_size=128).write(['id', 'run', 'small'], rows)
+        reader = CCFReader(self.test_ccf)
+        chunks = reader.row_groups[0]['columns']
+        self.assertEqual([chunks[c][1] for c in ('id', 'run', 'small')], [ENCODING_DELTA, ENCODING_RLE, ENCODING_FOR])
+
+        data = reader.read_columns()
+        for i, name in enumerate(['id', 'run', 'small']):
+            self.assertEqual(data[name], [int(r[i]) for r in rows])
+        self.assertEqual(list(reader.read_columns(['id'], as_arrays=True)['id']), data['id'])
+
+    def test_wide_types(self):
+        headers = ['big', 'flag', 'ts']
+        rows = [
+            ['5000000000', 'true', '2024-03-01T12:00:00'],
+            ['-7', 'false', '2024-03-01T12:00:01.500000'],
+            ['12', 'true', '2024-03-01T12:00:00'],
+        ]
+        CCFWriter(self.test_ccf).write(headers, rows)
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual([reader.column_types[h] for h in headers], [TYPE_INT64, TYPE_BOOL, TYPE_TIMESTAMP])
+
+        data = reader.read_columns()
+        self.assertEqual(data['big'], [5000000000, -7, 12])
+        self.assertEqual(data['flag'], [True, False, True])
+        self.assertEqual(data['ts'], [datetime(2024, 3, 1, 12), datetime(2024, 3, 1, 12, 0, 1, 500000),
+                                      datetime(2024, 3, 1, 12)])
+        self.assertEqual(reader.row_groups[0]['stats']['big'], (3, -7, 5000000000))
+
+        arrays = reader.read_columns(as_arrays=True)
+        self.assertEqual(list(arrays['big']), data['big'])
+        self.assertEqual([bool(v) for v in arrays['flag']], data['flag'])
+
+        self.assertEqual(reader.read_columns(['big'], where=[('ts', '>', '2024-03-01T12:00:00')])['big'], [-7])
+        self.assertEqual(reader.read_columns(['big'], where=[('flag', '=', 'true')])['big'], [5000000000, 12])
+
+        # Other spellings are not inferred, so they are kept as written
+        for values in (['TRUE', 'false'], ['2024-03-01'], ['2024-03-01T12:00:00+02:00'], ['2026-W40'],
+                       ['20261001T1200'], ['2024-03-01 12:00:00'], ['2024-03-01T12:00:00.000000']):
+            self.assertEqual(infer_and_convert(values)[0], TYPE_STRING)
+
+    def test_pack_unpack_round_trip(self):
+        headers = ['flag', 'date', 'offset', 'week', 'basic', 'ts', 'ok']
+        rows = [['TRUE', '2026-10-01', '2026-10-01T12:00:00+02:00', '2026-W40', '20261001T1200',
+                 '2026-10-01T12:00:00', 'true'],
+                ['false', '2026-10-02', '2026-10-02T08:30:00-05:00', '2026-W41', '20261002T0830',
+                 '2026-10-02T08:30:00.250000', 'false']]
+        self.create_csv_data(headers, rows)
+        out_csv = self.test_csv + '.out'
+        self.addCleanup(lambda: os.path.exists(out_csv) and os.remove(out_csv))
+        for argv in (['pack', self.test_csv, self.test_ccf, '--row-group-size', '1'],
+                     ['unpack', self.test_ccf, out_csv]):
+            with mock.patch('sys.argv', ['ccf.py'] + argv), contextlib.redirect_stdout(io.StringIO()):
+                ccf.main()
+        types = CCFReader(self.test_ccf).column_types
+        self.assertEqual([types[h] for h in headers], [TYPE_STRING] * 5 + [TYPE_TIMESTAMP, TYPE_BOOL])
+        with open(self.test_csv, 'rb') as f, open(out_csv, 'rb') as g:
+            self.assertEqual(g.read(), f.read())
+
+    def test_wide_type_widening(self):
+        self.assertEqual(infer_and_convert(['1', str(2**40)])[0], TYPE_INT64)
+        self.assertEqual(infer_and_convert([str(2**70)])[0], TYPE_STRING)
+        self.assertEqual(infer_and_convert(['2024-01-01', 'x'])[0], TYPE_STRING)
+
+        # INT -> INT64 -> FLOAT across row groups; BOOL mixed with anything -> STRING
+        with CCFWriter(self.test_ccf, row_group_size=2) as writer:
+            writer.open(['n', 'b'])
+            writer.write_batch([['1', 'true'], ['2', 'false'], [str(2**40), 'true'], ['3', 'false'], ['0.5', 'yes'], ['4', 'no']])
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.column_types, {'n': TYPE_FLOAT, 'b': TYPE_STRING})
+        data = reader.read_columns()
+        self.assertEqual(data['n'], [1.0, 2.0, float(2**40), 3.0, 0.5, 4.0])
+        self.assertEqual(data['b'], ['true', 'false', 'true', 'false', 'yes', 'no'])
+
+        # Widened BOOL and TIMESTAMP chunks read back as the text they were inferred from
+        CCFWriter(self.test_ccf).write(['b', 't'], [['true', '2024-03-01T12:00:00'], ['false', '2024-03-01T12:00:00.500000']])
+        CCFWriter(self.test_ccf).append([['x', 'y']])
+        self.assertEqual(CCFReader(self.test_ccf).read_columns(),
+                         {'b': ['true', 'false', 'x'], 't': ['2024-03-01T12:00:00', '2024-03-01T12:00:00.500000', 'y']})
+
+    def test_streaming_widening_to_string(self):
+        # Numeric chunks written before the widening keep their values, not their text
+        with CCFWriter(self.test_ccf, row_group_size=2) as writer:
+            writer.open(['zip'])
+            writer.write_batch([['02134'], ['00501'], ['1.50'], ['2'], ['x']])
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.column_types, {'zip': TYPE_STRING})
+        self.assertEqual(reader.read_columns()['zip'], ['2134', '501', '1.5', '2.0', 'x'])
+
+        # Inferring over the whole input keeps the text
+        rows = [['02134'], ['00501'], ['1.50'], ['2'], ['x']]
+        CCFWriter(self.test_ccf, row_group_size=2).write(['zip'], rows)
+        self.assertEqual(CCFReader(self.test_ccf).read_columns()['zip'], ['02134', '00501', '1.50', '2', 'x'])
+
+    def test_column_cache(self):
+        rows = [[str(i), f'name{i % 5}'] for i in range(100)]
+        CCFWriter(self.test_ccf, row_group_size=40).write(['id', 'name'], rows)
+        cache = ColumnCache()
+
+        first = CCFReader(self.test_ccf, cache=cache).read_columns(['id'])
+        self.assertEqual(cache.stats()['misses'], 3)
+        first['id'].append(-1) # Callers get their own copy
+        second = CCFReader(self.test_ccf, cache=cache).read_columns(['id'])
+        self.assertEqual(second['id'], list(range(100)))
+        self.assertEqual(cache.stats()['hits'], 3)
+
+        # Rewriting the file changes its size/mtime, so stale chunks are not served
+        CCFWriter(self.test_ccf, row_group_size=40).write(['id', 'name'], rows[:50])
+        self.assertEqual(CCFReader(self.test_ccf, cache=cache).read_columns(['id'])['id'], list(range(50)))
+
+        # A small budget evicts the least recently used chunks
+        small = ColumnCache(max_bytes=2000)
+        CCFReader(self.test_ccf, cache=small).read_columns()
+        self.assertGreater(small.evictions, 0)
+        self.assertLessEqual(small.current_bytes, 2000)
+
+    def test_query(self):
+        rows = [['DE' if i % 3 else 'FR', str(i), f'{i / 4}', 'true' if i % 2 else 'false'] for i in range(100)]
+        CCFWriter(self.test_ccf, row_group_size=32).write(['country', 'n', 'price', 'ok'], rows)
+        reader = CCFReader(self.test_ccf)
+
+        totals = run_query(reader, aggregates=['count(*)', 'sum(n)', 'min(price)', 'max(country)', 'avg(n)', 'sum(ok)'])
+        self.assertEqual(totals, {'count(*)': [100], 'sum(n)': [4950], 'min(price)': [0.0],
+                                  'max(country)': ['FR'], 'avg(n)': [49.5], 'sum(ok)': [50]})
+
+        grouped = run_query(reader, where=[parse_predicate('n >= 50')], group_by=['country'],
+                            aggregates=[('count', None), ('max', 'n')])
+        self.assertEqual(grouped, {'country': ['DE', 'FR'], 'count(*)': [33, 17], 'max(n)': [98, 99]})
+
+        self.assertEqual(run_query(reader, aggregates=['count(*)'], where=[('country', '=', 'FR')]), {'count(*)': [34]})
+        # Projections are read row group by row group, not materialized at once
+        with mock.patch.object(reader, 'read_columns', side_effect=AssertionError):
+            self.assertEqual(run_query(reader, ['n'], where=[parse_predicate('country in (FR)'), ('n', '<', 4)]), {'n': [0, 3]})
+            self.assertEqual(run_query(reader, ['ok', 'n'], where=[('n', '>', 99)]), {'ok': [], 'n': []})
+        out = io.StringIO()
+        self.assertEqual(write_csv(reader, out, ['n', 'ok'], where=[('n', '>=', 97)]), 3)
+        self.assertEqual(out.getvalue(), 'n,ok\r\n97,true\r\n98,false\r\n99,true\r\n')
+        with self.assertRaises(CCFQueryError):
+            run_query(reader, aggregates=['sum(country)'])
+        with self.assertRaises(CCFQueryError):
+            run_query(reader, aggregates=['median(n)'])
+        with self.assertRaises(CCFColumnError):
+            run_query(reader, group_by=['missing'], aggregates=['count(*)'])
+
+    def test_benchmark_report(self):
+        report = benchmark.run_benchmarks(rows=200, columns=6, types=list(benchmark.GENERATORS),
+                                          repeats=1, row_group_size=50)
+        names = [r['name'] for r in report['results']]
+        self.assertIn('reader.read_columns.pruned', names)
+        self.assertIn('ccf.unpack', names)
+        for result in report['results']:
+            self.assertGreater(result['peak_memory_bytes'], 0)
+        self.assertEqual(report['meta']['rows'], 200)
+        self.assertEqual(report['write_scaling']['rows'], [50, 200])
+
+    def test_metrics(self):
+        rows = [[str(i), f'name{i % 3}'] for i in range(100)]
+        write_metrics = Metrics()
+        CCFWriter(self.test_ccf, row_group_size=40, metrics=write_metrics).write(['id', 'name'], rows)
+        stats = write_metrics.columns['id']
+        self.assertEqual((stats['chunks'], stats['rows']), (3, 100))
+        for phase in ('convert', 'encode', 'compress', 'io'):
+            self.assertIn(f'{phase}_seconds', stats)
+
+        read_metrics = Metrics()
+        reader = CCFReader(self.test_ccf, metrics=read_metrics)
+        reader.read_columns(['name'])
+        self.assertEqual(list(read_metrics.columns), ['name'])
+        stats = read_metrics.columns['name']
+        storage = column_storage(reader)['name']
+        self.assertEqual(stats['compressed_bytes'], storage['compressed_bytes'])
+        self.assertEqual(stats['uncompressed_bytes'], storage['uncompressed_bytes'])
+        self.assertGreaterEqual(stats['decode_seconds'], 0)
+        self.assertEqual(storage['encodings'], ['dictionary'])
+        self.assertIn('TOTAL', read_metrics.report())
+
+    def test_streaming_csv_export(self):
+        headers = ['id', 'name', 'price', 'ts', 'ok']
+        rows = [[str(i), f'n{i}', f'{i * 0.5}', f'2024-01-01T00:00:{i % 60:02d}', 'true' if i % 2 else 'false']
+                for i in range(100)]
+        rows[70][1] = 'has, comma and "quotes"\nand a newline' # Row group 4 needs csv quoting
+        rows[71][1] = 'ünïcode'
+        CCFWriter(self.test_ccf, row_group_size=30).write(headers, rows)
+
+        self.assertEqual(export_csv(self.test_ccf, self.test_csv), 100)
+        with open(self.test_csv, newline='', encoding='utf-8') as f:
+            exported = list(csv.reader(f))
+        self.assertEqual(exported[0], headers)
+        self.assertEqual(exported[1:], rows)
+
+        # The output matches csv.writer byte for byte
+        with open(self.test_csv, newline='', encoding='utf-8') as f:
+            text = f.read()
+        buffer = io.StringIO(newline='')
+        csv.writer(buffer).writerows([headers] + rows)
+        self.assertEqual(text, buffer.getvalue())
+
+        export_csv(self.test_ccf, self.test_csv, ['ok', 'id'])
+        with open(self.test_csv, newline='', encoding='utf-8') as f:
+            self.assertEqual(next(csv.reader(f)), ['ok', 'id'])
+
+    def test_parallel_ingest(self):
+        headers = ['id', 'text', 'x']
+        rows = [[str(i), f'say "hi"\nto {i}, twice' if i % 7 == 0 else f'v{i}', f'{i}.5'] for i in range(2000)]
+        self.create_csv_data(headers, rows)
+
+        names, start = read_header(self.test_csv)
+        self.assertEqual(names, headers)
+        ranges = split_ranges(self.test_csv, 13, start)
+        self.assertEqual(len(ranges), 13)
+        parsed = []
+        with open(self.test_csv, 'rb') as f:
+            for begin, end in ranges:
+                f.seek(begin)
+                parsed.extend(csv.reader(io.StringIO(f.read(end - begin).decode('utf-8'), newline='')))
+        self.assertEqual(parsed, rows)
+
+        nrows = ingest_csv(self.test_csv, CCFWriter(self.test_ccf, row_group_size=300), workers=2, range_bytes=8000)
+        self.assertEqual(nrows, 2000)
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.column_types, {'id': TYPE_INT, 'text': TYPE_STRING, 'x': TYPE_FLOAT})
+        data = reader.read_columns()
+        self.assertEqual(data['text'], [r[1] for r in rows])
+        self.assertEqual(data['x'], [float(r[2]) for r in rows])
+        self.assertGreater(len(reader.row_groups), 2000 // 300 + 1) # Every range ends with a partial group
+
+        rows[1500] = ['1', '2']
+        self.create_csv_data(headers, rows)
+        with self.assertRaises(CCFSchemaError):
+            ingest_csv(self.test_csv, CCFWriter(self.test_ccf), workers=2, range_bytes=8000)
+
+        # Bare quotes in unquoted fields break quote counting; the input is split by parsing instead
+        with open(self.test_csv, 'w', newline='', encoding='utf-8') as f:
+            f.write('id,text,x\n')
+            for i in range(2000):
+                if i % 50 == 0:
+                    f.write(f'{i},5" screen,{i}.5\n')
+                else:
+                    csv.writer(f).writerow(rows[i] if i != 1500 else [str(i), 'v', '0.5'])
+        with open(self.test_csv, newline='', encoding='utf-8') as f:
+            expected = list(csv.reader(f))[1:]
+        self.assertEqual(ingest_csv(self.test_csv, CCFWriter(self.test_ccf, row_group_size=300),
+                                    workers=2, range_bytes=8000), 2000)
+        self.assertEqual(CCFReader(self.test_ccf).read_columns(['text'])['text'], [r[1] for r in expected])
+        parsed = []
+        with open(self.test_csv, 'rb') as f:
+            for begin, end in split_records(self.test_csv, 13, read_header(self.test_csv)[1]):
+                f.seek(begin)
+                parsed.extend(csv.reader(io.StringIO(f.read(end - begin).decode('utf-8'), newline='')))
+        self.assertEqual(parsed, expected)
+
+    def test_dataset(self):
+        with tempfile.TemporaryDirectory() as root:
+            for day in (1, 2, 3):
+                for region in ('eu', 'us'):
+                    path = os.path.join(root, f'date=2026-10-0{day}', f'region={region}')
+                    os.makedirs(path)
+                    headers = ['id', 'x', 'name'] if region == 'eu' else ['id', 'x']
+                    # The x column is INT in most files and FLOAT on day 3
+                    rows = [[str(i), f'{i}.5' if day == 3 else str(i), f'n{i}'][:len(headers)] for i in range(5)]
+                    CCFWriter(os.path.join(path, 'part-0.ccf')).write(headers, rows)
+
+            with CCFDataset(root, workers=2) as dataset:
+                self.assertEqual(len(dataset.files), 6)
+                self.assertEqual(dataset.nrows, 30)
+                self.assertEqual(dataset.schema, [('id', TYPE_INT), ('x', TYPE_FLOAT), ('name', TYPE_STRING),
+                                                  ('date', TYPE_STRING), ('region', TYPE_STRING)])
+
+                # Partition filters select files from their paths
+                selected = dataset.select_files([('date', '=', '2026-10-02'), ('region', '=', 'eu')])
+                self.assertEqual([os.path.relpath(p, root) for p in selected],
+                                 [os.path.join('date=2026-10-02', 'region=eu', 'part-0.ccf')])
+
+                data = dataset.read_columns(['date', 'region', 'x', 'name'],
+                                            where=[('date', '>=', '2026-10-02'), ('x', '>', 3)])
+                self.assertEqual(data['x'], [4.0, 4.0, 3.5, 4.5, 3.5, 4.5])
+                self.assertEqual(data['region'], ['eu', 'us', 'eu', 'eu', 'us', 'us'])
+                self.assertEqual(data['date'][0], '2026-10-02')
+                self.assertEqual(data['name'], ['n4', None, 'n3', 'n4', None, None]) # Missing in the us files
+
+                batches = list(dataset.iter_batches(['id'], batch_rows=3, where=[('region', 'in', ['us'])]))
+                self.assertEqual([len(b['id']) for b in batches], [3, 2] * 3)
+                with self.assertRaises(CCFColumnError):
+                    dataset.read_columns(['missing'])
+
+    def test_append(self):
+        CCFWriter(self.test_ccf, row_group_size=3, codec='smallest').write(['id', 'x'], [[str(i), str(i)] for i in range(5)])
+        size = os.path.getsize(self.test_ccf)
+        CCFWriter(self.test_ccf, row_group_size=3, codec='smallest').append([['5', '5.5'], ['6', '6']], ['id', 'x'])
+
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.nrows, 7)
+        self.assertEqual(len(reader.row_groups), 3)
+        self.assertGreater(reader.row_groups[2]['columns']['id'][3], size - 1) # Existing data is not rewritten
+        self.assertEqual(reader.column_types['x'], TYPE_FLOAT) # Widened by the appended values
+        self.assertEqual(reader.read_columns(), {'id': list(range(7)), 'x': [0.0, 1.0, 2.0, 3.0, 4.0, 5.5, 6.0]})
+        self.assertEqual(reader.select_row_groups([('id', '>=', 5)]), [2])
+        codecs = {reader.row_groups[i]['columns']['id'][2] for i in range(3)}
+        self.assertEqual(len(codecs), 1) # The codec picked by the policy is kept
+
+        # An interrupted append leaves the file as it was
+        with open(self.test_ccf, 'rb') as f:
+            before = f.read()
+
+        def failing_rows():
+            yield ['7', '7']
+            yield ['8', '8']
+            raise RuntimeError("input failed")
+        with self.assertRaises(RuntimeError):
+            CCFWriter(self.test_ccf, row_group_size=1).append(failing_rows())
+        with open(self.test_ccf, 'rb') as f:
+            self.assertEqual(f.read(), before)
+
+        # A failed commit does not leave widened types with the previous footer
+        class FailingCommit:
+            def __init__(self, f):
+                self._f = f
+
+            def write(self, data):
+                if self._f.tell() == 9: # Row count, footer offset and schema
+                    raise OSError("disk full")
+                return self._f.write(data)
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+        writer = CCFWriter(self.test_ccf)
+        writer.open_append()
+        writer.write_batch([['x', 'y']])
+        writer._file = FailingCommit(writer._file)
+        with self.assertRaises(OSError):
+            writer.close()
+        with open(self.test_ccf, 'rb') as f:
+            self.assertEqual(f.read(), before)
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.column_types, {'id': TYPE_INT, 'x': TYPE_FLOAT})
+        self.assertEqual(reader.read_columns()['id'], list(range(7)))
+
+        with self.assertRaises(CCFSchemaError):
+            CCFWriter(self.test_ccf).append([['1', '2']], ['a', 'b'])
+        with open(self.test_ccf, 'wb') as f:
+            f.write(b'CCF1' + struct.pack('<BIQ', 1, 0, 0))
+        with self.assertRaises(CCFVersionError):
+            CCFWriter(self.test_ccf).append([])
+
+    def test_take_and_read_rows(self):
+        rows = [[str(i), f'user{i}', 'ab'[i % 2], f'2024-01-01T00:00:{i % 60:02d}'] for i in range(1000)]
+        CCFWriter(self.test_ccf, row_group_size=300, page_rows=64).write(['id', 'user', 'cat', 'ts'], rows)
+        reader = CCFReader(self.test_ccf)
+        self.assertGreaterEqual(reader.header['version'], 3)
+        self.assertEqual(len(reader.row_groups[0]['pages']['user']), 5)
+
+        metrics = Metrics()
+        reader = CCFReader(self.test_ccf, metrics=metrics)
+        data = reader.take(None, [999, 0, 613, 0])
+        self.assertEqual(data['id'], [999, 0, 613, 0])
+        self.assertEqual(data['user'], ['user999', 'user0', 'user613', 'user0'])
+        self.assertEqual(data['cat'], ['b', 'a', 'b', 'a'])
+        self.assertEqual(data['ts'][2], datetime(2024, 1, 1, 0, 0, 13))
+        self.assertEqual(metrics.columns['user']['pages'], 3) # Only the pages holding the rows
+        self.assertNotIn('chunks', metrics.columns['user'])
+        self.assertEqual(list(reader.take(['id'], [5, 6], as_arrays=True)['id']), [5, 6])
+
+        self.assertEqual(reader.read_rows(250, 380, ['id'])['id'], list(range(250, 380)))
+        self.assertEqual(reader.read_rows(990, 2000, ['user'])['user'], [f'user{i}' for i in range(990, 1000)])
+        self.assertEqual(reader.read_rows(5, 5, ['id'])['id'], [])
+        self.assertEqual(reader.read_columns(['user'])['user'], [r[1] for r in rows])
+        with self.assertRaises(IndexError):
+            reader.take(['id'], [1000])
+
+        # Unpaged chunks are read whole
+        CCFWriter(self.test_ccf, page_rows=None).write(['id', 'user', 'cat', 'ts'], rows)
+        reader = CCFReader(self.test_ccf, cache=ColumnCache())
+        self.assertEqual(reader.row_groups[0]['pages'], {})
+        self.assertEqual(reader.take(['user'], [7, 3])['user'], ['user7', 'user3'])
+        self.assertEqual(reader.read_rows(10, 12, ['cat']), {'cat': ['a', 'b']})
+
+    def test_bloom_filters(self):
+        bloom = BloomFilter.build([f'k{i}' for i in range(500)] + [-5, 2**40], 0.01)
+        self.assertTrue(all(bloom.might_contain(f'k{i}') for i in range(500)))
+        self.assertTrue(bloom.might_contain(2**40))
+        self.assertLess(sum(bloom.might_contain(f'x{i}') for i in range(2000)), 100)
+        self.assertEqual(BloomFilter.from_bytes(bloom.to_bytes()).bits, bloom.bits)
+        self.assertEqual(probe_value('12', TYPE_INT), 12) # Widened to STRING after the chunk was written
+        self.assertIsNone(probe_value('012', TYPE_INT))
+
+        # Unsorted unique keys: min/max statistics cannot prune, Bloom filters can
+        keys = [f'{(i * 7919) % 1000:04x}-key' for i in range(1000)]
+        rows = [[str(i), keys[i], str((i * 7919) % 1000 * 1000)] for i in range(1000)]
+        CCFWriter(self.test_ccf, row_group_size=100, bloom_filters={'key': 0.01, 'n': 0.01}).write(['id', 'key', 'n'], rows)
+        metrics = Metrics()
+        reader = CCFReader(self.test_ccf, metrics=metrics)
+        self.assertEqual(reader.header['version'], 4)
+        self.assertNotIn('id', reader.row_groups[0]['blooms'])
+        self.assertEqual(reader.select_row_groups([('key', '=', keys[512])]), [5])
+        self.assertEqual(reader.read_columns(['id'], where=[('key', '=', keys[512])]), {'id': [512]})
+        self.assertEqual(reader.read_columns(['id'], where=[('n', 'in', [rows[3][2], -1])]), {'id': [3]})
+        self.assertEqual(reader.read_columns(['id'], where=[('key', '=', 'missing')]), {'id': []})
+        self.assertGreater(metrics.columns['key']['bloom_skips'], 15)
+        self.assertEqual(metrics.columns['key']['chunks'], 1) # Only the group holding the key
+
+        # Appends to a version 4 file add filters for the new row groups
+        CCFWriter(self.test_ccf, bloom_filters={'key': 0.01}).append([['1000', 'new-key', '5']])
+        self.assertEqual(CCFReader(self.test_ccf).read_columns(['id'], where=[('key', '=', 'new-key')]), {'id': [1000]})
+
+        # Version 3 files cannot store filters, so parallel appends do not build them
+        with mock.patch('writer.VERSION', 3):
+            CCFWriter(self.test_ccf).write(['id', 'key'], [['1', 'a']])
+        self.create_csv_data(['id', 'key'], [['2', 'b'], ['3', 'c']])
+        writer = CCFWriter(self.test_ccf, bloom_filters={'key': 0.01})
+        ingest_csv(self.test_csv, writer, workers=2, append=True)
+        self.assertEqual(writer.file_bloom_filters, {})
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual((reader.header['version'], reader.nrows), (3, 3))
+        self.assertEqual(reader.read_columns(['id'], where=[('key', '=', 'c')]), {'id': [3]})
+
+    def test_compact(self):
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, 'in')
+            for day in (1, 2):
+                for part in range(3):
+                    path = os.path.join(source, f'day={day}')
+                    os.makedirs(path, exist_ok=True)
+                    # Few distinct keys, so the sort has many ties; x is FLOAT in one file
+                    rows = [[str((i * 7 + part) % 5), f'{i}.5' if part == 2 else str(i), f'{day}-{part}-{i}',
+                             f'2024-01-0{1 + i % 3}T00:00:00', 'true' if i % 2 else 'false'] for i in range(40)]
+                    CCFWriter(os.path.join(path, f'part-{part}.ccf'), row_group_size=15).write(['k', 'x', 's', 'ts', 'b'], rows)
+            with CCFDataset(source) as dataset:
+                columns = [name for name, _ in dataset.schema]
+                data = dataset.read_columns()
+                expected = list(zip(*[data[name] for name in columns]))
+
+            # Runs of 50 rows, merged three at a time in two passes
+            output = os.path.join(root, 'sorted.ccf')
+            self.assertEqual(compact(source, output, sort_by='k', memory_rows=50, fan_in=3, row_group_size=32), [output])
+            reader = CCFReader(output)
+            self.assertEqual(reader.schema, dataset.schema)
+            self.assertEqual(reader.nrows, 240)
+            data = reader.read_columns()
+            self.assertEqual(list(zip(*[data[name] for name in columns])), sorted(expected, key=lambda row: row[0]))
+            self.assertEqual(len(reader.select_row_groups([('k', '=', 3)])), 2)
+
+            # Unsorted, split into files of 100 rows
+            written = compact(source, os.path.join(root, 'out'), rows_per_file=100)
+            self.assertEqual([CCFReader(path).nrows for path in written], [100, 100, 40])
+            data = CCFDataset(os.path.join(root, 'out')).read_columns(columns)
+            self.assertEqual(list(zip(*[data[name] for name in columns])), expected)
+
+            with self.assertRaises(CCFColumnError):
+                compact(source, output, sort_by='missing')
+            os.makedirs(os.path.join(source, 'day=3'))
+            CCFWriter(os.path.join(source, 'day=3', 'part-0.ccf')).write(['k'], [['1']])
+            with self.assertRaises(CCFSchemaError):
+                compact(source, output)
+
+    def test_metadata_parsing(self):
+        # The schema is larger than the first read of the file
+        headers = [f'column_with_a_long_name_{i:05d}' for i in range(3000)]
+        CCFWriter(self.test_ccf).write(headers, [[str(i) for i in range(3000)]])
+        reader = CCFReader(self.test_ccf)
+        self.assertGreater(reader.header['head_size'], 64 * 1024)
+        self.assertEqual(reader.read_columns([headers[-1]]), {headers[-1]: [2999]})
+        with CCFReader(self.test_ccf, use_mmap=True) as mapped:
+            self.assertEqual(mapped.schema, reader.schema)
+            self.assertEqual(mapped.row_groups, reader.row_groups)
+
+        with open(self.test_ccf, 'r+b') as f:
+            f.truncate(reader.header['head_size'] - 1)
+        with self.assertRaises(CCFError):
+            CCFReader(self.test_ccf)
+
+    def test_catalog(self):
+        with tempfile.TemporaryDirectory() as root:
+            for day in (1, 2):
+                os.makedirs(os.path.join(root, f'day={day}'))
+                CCFWriter(os.path.join(root, f'day={day}', 'part-0.ccf'), row_group_size=2).write(
+                    ['id', 'name'], [[str(i + day * 10), f'n{i}'] for i in range(5)])
+            catalog = Catalog.build(root)
+            catalog.save()
+            self.assertEqual(sorted(os.listdir(root)), ['_ccf_catalog', 'day=1', 'day=2'])
+
+            catalog = Catalog.load(root)
+            path = os.path.join(root, 'day=2', 'part-0.ccf')
+            reader = CCFReader(path, metadata=catalog.lookup(path))
+            self.assertEqual(reader.row_groups, CCFReader(path).row_groups)
+            with CCFDataset(root, catalog=True) as dataset:
+                self.assertIsNotNone(dataset.catalog)
+                self.assertEqual(dataset.read_columns(['id'], where=[('id', '>=', 13)])['id'], [13, 14, 20, 21, 22, 23, 24])
+
+            # Changed files are read from disk again
+            CCFWriter(path).append([['99', 'x']])
+            self.assertIsNone(catalog.lookup(path))
+            with CCFDataset(root, catalog=catalog) as dataset:
+                self.assertEqual(dataset.nrows, 11)
+            rebuilt = Catalog.build(root, previous=catalog)
+            self.assertIs(rebuilt.entries['day=1/part-0.ccf'], catalog.entries['day=1/part-0.ccf'])
+            self.assertIsNotNone(rebuilt.lookup(path))
+
+    def test_async_reader(self):
+        rows = [[str(i), f'u{i % 7}'] for i in range(10)]
+        CCFWriter(self.test_ccf, row_group_size=4).write(['id', 'user'], rows)
+        expected = CCFReader(self.test_ccf).read_columns()
+        metrics = Metrics()
+
+        async def run():
+            async with AsyncCCFReader(self.test_ccf, max_workers=2, metrics=metrics) as reader:
+                self.assertEqual(reader.nrows, 10)
+                # Concurrent requests for the same chunks share one read each
+                results = await asyncio.gather(*[reader.read_columns() for _ in range(20)])
+                self.assertTrue(all(result == expected for result in results))
+                self.assertEqual(metrics.totals()['chunks'], 6)
+                self.assertGreater(metrics.totals()['coalesced'], 0)
+                results[0]['id'].append(-1)
+                self.assertEqual(results[1]['id'], expected['id'])
+
+                filtered = await reader.read_columns(['user'], where=[('id', '>=', 5), ('user', '!=', 'u6')])
+                self.assertEqual(filtered, {'user': ['u5', 'u0', 'u1', 'u2']})
+                batches = [batch async for batch in reader.iter_batches(['id'], batch_rows=3)]
+                self.assertEqual([batch['id'] for batch in batches], [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+                self.assertEqual(await reader.take(['user'], [9, 0]), {'user': ['u2', 'u0']})
+
+        asyncio.run(run())
+        with self.assertRaises(CCFError):
+            AsyncCCFReader(self.test_ccf).schema
+
+    def test_read_version1_file(self):
+        # Single-block layout with the metadata table after the schema
+        blocks = [zlib.compress(struct.pack('<2i', 7, 8))]
+        with open(self.test_ccf, 'wb') as f:
+            f.write(b'CCF1' + struct.pack('<BIQ', 1, 1, 2))
+            f.write(struct.pack('<H', 1) + b'x' + struct.pack('<B', TYPE_INT))
+            offset = f.tell() + 24
+            f.write(struct.pack('<QQQ', offset, len(blocks[0]), 8))
+            f.write(blocks[0])
+
+        reader = CCFReader(self.test_ccf)
+        self.assertEqual(reader.header['version'], 1)
+        self.assertEqual(reader.read_columns(), {'x': [7, 8]})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Sequence
+
+# TIMESTAMP columns store microseconds since the Unix epoch (UTC) as int64.
+# Naive datetimes are taken to be UTC; aware ones are converted to UTC.
+# Readers return naive datetimes in UTC.
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def normalize(value: Any) -> datetime:
+    """
+    Convert an ISO 8601 string or a datetime to a naive UTC datetime.
+
+    Raises:
+        ValueError: If a string is not a valid ISO 8601 date/time.
+        TypeError: If the value is neither a string nor a datetime.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        raise TypeError(f"expected an ISO 8601 string or datetime, got {type(value).__name__}")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_canonical(value: str) -> int:
+    """
+    Microseconds since the epoch for a string in the exact form readers write
+    timestamps back in (`datetime.isoformat()` of a naive datetime, e.g.
+    '2024-03-01T12:00:00' or '2024-03-01T12:00:00.500000'). Used for type
+    inference, so inferred columns round-trip to the same text.
+
+    Raises:
+        ValueError: For any other string, including other ISO 8601 forms such as
+            dates, week dates, the basic format and date-times with an offset.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        raise ValueError(f"not a canonical timestamp: {value!r}")
+    return (parsed - EPOCH) // _MICROSECOND
+
+
+def to_micros(value: Any) -> int:
+    """
+    Microseconds since the epoch for an ISO 8601 string or a datetime.
+    """
+    return (normalize(value) - EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def to_micros_list(values: Sequence[Any]) -> List[int]:
+    return list(map(to_micros, values))
+
+
+def parse_canonical_list(values: Sequence[str]) -> List[int]:
+    return list(map(parse_canonical, values))
+
+
+def from_micros_list(values: Sequence[int]) -> List[datetime]:
+    return list(map(from_micros, values))
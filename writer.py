@@ -1,159 +1,887 @@
+import os
 import struct
-import zlib
-from typing import List, Any
-from constants import MAGIC, VERSION, TYPE_INT, TYPE_FLOAT, TYPE_STRING
-from exceptions import CCFError
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import accumulate
+from typing import List, Any, Deque, Dict, Iterable, Optional, Sequence, Tuple
+from constants import (MAGIC, VERSION, TYPE_INT, TYPE_FLOAT, TYPE_STRING, TYPE_INT64, TYPE_BOOL,
+                       TYPE_TIMESTAMP, INTEGER_TYPES, DEFAULT_ROW_GROUP_SIZE, DEFAULT_PAGE_ROWS,
+                       DEFAULT_DICTIONARY_RATIO, ENCODING_PLAIN, ENCODING_DICTIONARY,
+                       CODEC_POLICIES, CODEC_ZLIB)
+from exceptions import CCFError, CCFSchemaError, CCFVersionError
+import compression
+import integer_encoding
+import timestamps
+from metrics import Metrics
+from reader import CCFReader
+from bloom import BloomFilter, BLOOM_TYPES
 
-def infer_type(value: str) -> int:
+# array.array type codes with the on-disk item sizes (4-byte ints)
+_INT32_CODE = 'i' if array('i').itemsize == 4 else 'l'
+_UINT32_CODE = 'I' if array('I').itemsize == 4 else 'L'
+_INTEGER_CODES = {TYPE_INT: _INT32_CODE, TYPE_INT64: 'q', TYPE_TIMESTAMP: 'q'}
+
+_INT32_RANGE = (-(1 << 31), (1 << 31) - 1)
+_INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+# Spellings converted to BOOL values when a column has that type
+_BOOLS = {'true': True, 'false': False, 'True': True, 'False': False, 'TRUE': True, 'FALSE': False}
+# Spellings a BOOL column is inferred from: those readers write back
+_CANONICAL_BOOLS = {'true': True, 'false': False}
+
+
+def resolve_column_type(values: Sequence[str]) -> int:
     """
-    Infer the data type of a single string value.
+    Resolve the type for a whole column based on its values.
+    
+    Logic:
+    - If all values are integers, the column is INT, or INT64 if a value does
+      not fit in 32 bits (integers beyond 64 bits make the column STRING).
+    - If all values are numbers and any is a float, the whole column is FLOAT.
+    - If all values are `true` / `false`, the column is BOOL.
+    - If all values are date-times in the form readers write them back in
+      (`2024-03-01T12:00:00`, optionally with microseconds), the column is TIMESTAMP.
+    - Otherwise the whole column is STRING, so other spellings (`TRUE`, dates,
+      UTC offsets) are kept as they are.
     
     Args:
-        value: The string value to inspect.
+        values: List of string values for the column.
         
     Returns:
-        One of TYPE_INT, TYPE_FLOAT, or TYPE_STRING.
+        The resolved type ID for the column.
+    """
+    dtype, _ = infer_and_convert(values)
+    return dtype
+
+
+def infer_and_convert(values: Sequence[str]) -> Tuple[int, List[Any]]:
+    """
+    Infer the type of a column and convert its values in the same pass.
+
+    Each candidate type converts the whole column with `map`, so exceptions are
+    raised at most once per type instead of once per cell. The resolution rules
+    are those of `resolve_column_type`.
+
+    Returns:
+        (type ID, converted values)
     """
     try:
-        int(value)
-        return TYPE_INT
+        ints = list(map(int, values))
     except ValueError:
         pass
-
+    else:
+        if not ints or (_INT32_RANGE[0] <= min(ints) and max(ints) <= _INT32_RANGE[1]):
+            return TYPE_INT, ints
+        if _INT64_RANGE[0] <= min(ints) and max(ints) <= _INT64_RANGE[1]:
+            return TYPE_INT64, ints
+        return TYPE_STRING, list(values)
     try:
-        float(value)
-        return TYPE_FLOAT
+        return TYPE_FLOAT, list(map(float, values))
     except ValueError:
         pass
+    try:
+        return TYPE_BOOL, list(map(_CANONICAL_BOOLS.__getitem__, values))
+    except KeyError:
+        pass
+    try:
+        return TYPE_TIMESTAMP, timestamps.parse_canonical_list(values)
+    except (ValueError, TypeError):
+        pass
+    return TYPE_STRING, list(values)
+
+
+def widen_type(current: int, other: int) -> int:
+    """
+    Return the narrowest type able to represent values of both types.
 
+    Numeric types widen INT -> INT64 -> FLOAT; any other mix widens to STRING.
+    """
+    if current == other:
+        return current
+    if current in _NUMERIC_RANKS and other in _NUMERIC_RANKS:
+        return max(current, other, key=_NUMERIC_RANKS.__getitem__)
     return TYPE_STRING
 
 
-def resolve_column_type(values: List[str]) -> int:
+_NUMERIC_RANKS = {TYPE_INT: 0, TYPE_INT64: 1, TYPE_FLOAT: 2}
+
+# Per type: (conversion of one string value, value used when conversion fails)
+_CONVERTERS = {
+    TYPE_INT: (int, 0),
+    TYPE_INT64: (int, 0),
+    TYPE_FLOAT: (float, 0.0),
+    TYPE_BOOL: (_BOOLS.__getitem__, False),
+    TYPE_TIMESTAMP: (timestamps.to_micros, 0),
+}
+
+
+def _convert_column(col_data: Sequence[str], dtype: int) -> List[Any]:
     """
-    Resolve the type for a whole column based on its values.
-    
-    Logic:
-    - If any value is a string that cannot be parsed as number, the whole column is STRING.
-    - If any value is a float (and no strings), the whole column is FLOAT.
-    - Otherwise, if all are integers, the column is INT.
-    
+    Convert the string values of one column chunk to Python values of `dtype`.
+    Values that cannot be converted become 0 / 0.0 / False / the epoch.
+    TIMESTAMP values are converted to microseconds since the epoch.
+    """
+    if dtype == TYPE_STRING:
+        return list(col_data)
+    fn, default = _CONVERTERS[dtype]
+    try:
+        return list(map(fn, col_data))
+    except (ValueError, TypeError, KeyError):
+        pass
+
+    # Slow path, only for columns that hold unconvertible values
+    values = []
+    for v in col_data:
+        try:
+            val = fn(v)
+        except (ValueError, TypeError, KeyError):
+            val = default
+        values.append(val)
+    return values
+
+
+def _pack_array(typecode: str, values: Sequence[Any]) -> bytes:
+    """
+    Pack a whole sequence of numbers as little-endian values in one call.
+    """
+    try:
+        arr = array(typecode, values)
+    except OverflowError as e:
+        raise CCFError(f"Value out of range for column storage: {e}") from e
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _encode_strings(values: Sequence[str]) -> bytes:
+    """
+    Serialize strings as a table of cumulative end offsets followed by the UTF-8 blob.
+    """
+    # Format: Use the offset approach
+    # [offset1, offset2, ... offsetN] [string_data_blob]
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = _pack_array(_UINT32_CODE, list(accumulate(map(len, encoded))))
+    return offsets + b''.join(encoded)
+
+
+def _encode_dictionary(values: Sequence[str], dictionary: Dict[str, int]) -> bytes:
+    """
+    Serialize strings as a dictionary of distinct values plus one integer code per row.
+
+    Layout: [dict size (4)] [code width (1)] [dictionary as plain strings] [codes]
+    """
+    ndict = len(dictionary)
+    if ndict <= 0xFF:
+        width, typecode = 1, 'B'
+    elif ndict <= 0xFFFF:
+        width, typecode = 2, 'H'
+    else:
+        width, typecode = 4, _UINT32_CODE
+
+    return b''.join((
+        struct.pack('<IB', ndict, width),
+        _encode_strings(list(dictionary)),
+        _pack_array(typecode, list(map(dictionary.__getitem__, values))),
+    ))
+
+
+def _encode_column(values: Sequence[Any], dtype: int,
+                   dictionary_ratio: float = DEFAULT_DICTIONARY_RATIO,
+                   int_encodings: bool = True) -> Tuple[int, bytes]:
+    """
+    Serialize the converted values of one column chunk into the uncompressed
+    block layout described in SPEC.md.
+
+    STRING chunks whose share of distinct values is at most `dictionary_ratio`
+    are dictionary encoded. With `int_encodings`, INT, INT64 and TIMESTAMP
+    chunks use delta, bit-packed or run-length encoding when that is smaller
+    than their plain fixed-width layout.
+
+    Returns:
+        (encoding, raw_bytes)
+    """
+    if dtype in INTEGER_TYPES:
+        if int_encodings:
+            encoding = integer_encoding.choose_encoding(values, len(values) * INTEGER_TYPES[dtype])
+            if encoding is not None:
+                return encoding, integer_encoding.ENCODERS[encoding](values)
+        raw_bytes = _pack_array(_INTEGER_CODES[dtype], values)
+    elif dtype == TYPE_FLOAT:
+        raw_bytes = _pack_array('d', values)
+    elif dtype == TYPE_BOOL:
+        raw_bytes = integer_encoding.pack_bits(values)
+    else: # TYPE_STRING
+        if values and dictionary_ratio > 0:
+            # Codes are assigned in order of first appearance
+            dictionary = dict.fromkeys(values)
+            if len(dictionary) <= len(values) * dictionary_ratio:
+                for code, v in enumerate(dictionary):
+                    dictionary[v] = code
+                return ENCODING_DICTIONARY, _encode_dictionary(values, dictionary)
+        raw_bytes = _encode_strings(values)
+    return ENCODING_PLAIN, raw_bytes
+
+
+def _column_stats(values: Sequence[Any], dtype: int) -> Optional[tuple]:
+    """
+    Compute (min, max) of a converted column chunk, or None if the chunk is
+    empty or contains NaN (which has no ordering and cannot be pruned safely).
+    """
+    if not values:
+        return None
+    if dtype == TYPE_FLOAT and any(v != v for v in values):
+        return None
+    return (min(values), max(values))
+
+
+def _pack_stats(dtype: int, count: int, stats: Optional[tuple]) -> bytes:
+    """
+    Serialize chunk statistics as stored in the metadata footer.
+    """
+    if stats is None:
+        return struct.pack('<QB', count, 0)
+    out = struct.pack('<QB', count, 1)
+    for val in stats:
+        if dtype in INTEGER_TYPES or dtype == TYPE_BOOL:
+            out += struct.pack('<q', val)
+        elif dtype == TYPE_FLOAT:
+            out += struct.pack('<d', val)
+        else:
+            b = val.encode('utf-8')
+            out += struct.pack('<I', len(b)) + b
+    return out
+
+
+def _pack_schema(headers: Sequence[str], types: Sequence[Optional[int]]) -> bytes:
+    """
+    Schema entries for the given columns; unknown types are written as STRING placeholders.
+    """
+    parts = []
+    for name, dtype in zip(headers, types):
+        name_bytes = name.encode('utf-8')
+        parts.append(struct.pack('<H', len(name_bytes)) + name_bytes)
+        parts.append(struct.pack('<B', TYPE_STRING if dtype is None else dtype))
+    return b''.join(parts)
+
+
+def _pack_pages(pages: Optional[List[tuple]]) -> bytes:
+    """
+    Serialize the page index of a chunk as stored in the metadata footer.
+    A chunk stored as a single page only records the page count.
+    """
+    if not pages:
+        return struct.pack('<I', 1)
+    out = [struct.pack('<I', len(pages))]
+    out.extend(struct.pack('<IBQQ', *page) for page in pages)
+    return b''.join(out)
+
+
+# Levels the codec selection policies trial zlib with
+_POLICY_ZLIB_LEVELS = {'fastest': 1, 'smallest': 9}
+
+
+def build_chunk(col_data: Sequence[str], dtype: Optional[int], widen: bool,
+                 dictionary_ratio: float, int_encodings: bool,
+                 codec_spec: Any, level: Optional[int],
+                 page_rows: Optional[int] = None, bloom_fpp: Optional[float] = None,
+                 typed: bool = False) -> tuple:
+    """
+    Convert, encode and compress one column chunk. Runs in worker threads or
+    processes when the writer is parallel, so it only touches its arguments.
+    The result can be passed to `CCFWriter.write_row_group`.
+
     Args:
-        values: List of string values for the column.
-        
+        dtype: Current column type, or None if it is not known yet.
+        widen: If True the chunk type is inferred from the values and widened
+            with `dtype`; otherwise values are converted to `dtype`. Only the
+            chunk's typed values are kept, so if a later chunk widens the column
+            to STRING, readers render this chunk's numbers from their values
+            ('02134' reads back as '2134', '1.50' as '1.5').
+        codec_spec: A codec ID, or a policy name to select the codec with.
+        page_rows: Split the chunk into pages of this many rows, each encoded
+            and compressed on its own. None writes a single page.
+        bloom_fpp: Build a Bloom filter with this false-positive rate over
+            the chunk's values (STRING and integer types only).
+        typed: `col_data` already holds values of `dtype` as returned by
+            `CCFReader.read_columns` (TIMESTAMP as datetimes) instead of strings.
+
     Returns:
-        The resolved type ID for the column.
+        (type, encoding, codec, level, compressed, uncompressed size, stats,
+        pages, bloom, (convert, encode, compress) seconds), where `pages` lists
+        (nrows, encoding, compressed size, uncompressed size) per page, or is
+        None for a single page, and `bloom` is the serialized filter or None.
+        `encoding` is the encoding of the first page.
     """
-    current_type = TYPE_INT
-    for v in values:
-        t = infer_type(v)
-        if t == TYPE_STRING:
-            return TYPE_STRING
-        if t == TYPE_FLOAT and current_type == TYPE_INT:
-            current_type = TYPE_FLOAT
-    return current_type
+    start = time.perf_counter()
+    if typed:
+        values = timestamps.to_micros_list(col_data) if dtype == TYPE_TIMESTAMP else list(col_data)
+    elif dtype == TYPE_STRING or not (dtype is None or widen):
+        values = _convert_column(col_data, dtype)
+    else:
+        inferred, values = infer_and_convert(col_data)
+        if dtype is None or dtype == inferred:
+            dtype = inferred
+        else:
+            dtype = widen_type(dtype, inferred)
+            if dtype == TYPE_STRING:
+                values = list(col_data)
+            elif dtype == TYPE_FLOAT and inferred != TYPE_FLOAT:
+                values = list(map(float, values))
+
+    converted = time.perf_counter()
+    if page_rows and len(values) > page_rows:
+        spans = [values[i:i + page_rows] for i in range(0, len(values), page_rows)]
+    else:
+        spans = [values]
+    encoded_pages = [_encode_column(span, dtype, dictionary_ratio, int_encodings) for span in spans]
+    encoded = time.perf_counter()
+    if codec_spec in CODEC_POLICIES:
+        sample = encoded_pages[0][1] if len(spans) == 1 else b''.join(raw for _, raw in encoded_pages)
+        codec = compression.choose_codec(sample, codec_spec, level)
+        # Policies trial zlib at fixed levels; keep the level that won
+        level = _POLICY_ZLIB_LEVELS.get(codec_spec, level) if codec == CODEC_ZLIB else None
+    else:
+        codec = codec_spec
+    blocks = [compression.compress(codec, raw, level) for _, raw in encoded_pages]
+    pages = None
+    if len(spans) > 1:
+        pages = [(len(span), encoding, len(block), len(raw))
+                 for span, (encoding, raw), block in zip(spans, encoded_pages, blocks)]
+    usize = sum(len(raw) for _, raw in encoded_pages)
+    compressed = blocks[0] if len(blocks) == 1 else b''.join(blocks)
+    bloom = None
+    if bloom_fpp is not None and dtype in BLOOM_TYPES and values:
+        bloom = BloomFilter.build(values, bloom_fpp).to_bytes()
+    timings = (converted - start, encoded - converted, time.perf_counter() - encoded)
+    return (dtype, encoded_pages[0][0], codec, level, compressed, usize, _column_stats(values, dtype),
+            pages, bloom, timings)
 
 
 class CCFWriter:
     """
     Writer class for the Custom Columnar Format (CCF).
     Handles serialization of tabular data into a compressed, columnar binary format.
+
+    Data can be written in one call with `write()`, or streamed with
+    `open()` / `write_batch()` / `close()`. Rows are buffered until a full
+    row group is available, so memory is bounded by `row_group_size` rather
+    than by the size of the input. `append()` (or `open_append()`) adds row
+    groups to an existing file without rewriting its data.
+
+    Each column is compressed with its own codec. `codec` names a fixed codec
+    ("none", "zlib", "lzma", "bz2") or a selection policy ("fastest",
+    "balanced", "smallest") that trial-compresses the column's first chunk and
+    keeps the winner for the rest of the file. `column_codecs` overrides the
+    choice for individual columns, e.g. {"event_time": "none", "payload": "smallest"}.
+
+    With `workers` > 1, columns are encoded and compressed concurrently in a
+    thread pool (`executor="thread"`, effective because compression releases the
+    GIL) or a process pool (`executor="process"`, which also parallelizes value
+    conversion). While one row group is written the next one is already being
+    encoded; blocks and metadata are still written in schema and row order.
+
+    Each column chunk is split into pages of `page_rows` rows that are encoded
+    and compressed independently, so readers can fetch single rows (`take`,
+    `read_rows`) without decompressing whole chunks. `page_rows=None` writes
+    one page per chunk.
+
+    `bloom_filters` maps column names to a false-positive rate, e.g.
+    {"user_id": 0.01}: every chunk of those columns (STRING or integer types)
+    gets a Bloom filter that lets readers skip chunks for `=` / `in` lookups.
+
+    With `metrics`, block sizes and the time spent converting, encoding,
+    compressing and writing are recorded per column in the given `Metrics` object.
     """
-    def __init__(self, output_file: str):
+    def __init__(self, output_file: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 dictionary_ratio: float = DEFAULT_DICTIONARY_RATIO,
+                 codec: str = "zlib", compression_level: Optional[int] = None,
+                 column_codecs: Optional[Dict[str, str]] = None,
+                 workers: int = 1, executor: str = "thread",
+                 int_encodings: bool = True, metrics: Optional[Metrics] = None,
+                 page_rows: Optional[int] = DEFAULT_PAGE_ROWS,
+                 bloom_filters: Optional[Dict[str, float]] = None):
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be a positive integer.")
+        if page_rows is not None and page_rows < 1:
+            raise ValueError("page_rows must be a positive integer or None.")
+        for name, fpp in (bloom_filters or {}).items():
+            if not 0 < fpp < 1:
+                raise ValueError(f"Bloom filter false-positive rate for '{name}' must be between 0 and 1.")
+        if workers < 1:
+            raise ValueError("workers must be a positive integer.")
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}'. Expected 'thread' or 'process'.")
+        for spec in [codec] + list((column_codecs or {}).values()):
+            if spec not in CODEC_POLICIES:
+                compression.codec_id(spec)
         self.output_file = output_file
+        self.row_group_size = row_group_size
+        # STRING chunks with at most this share of distinct values are
+        # dictionary encoded; 0 disables dictionary encoding.
+        self.dictionary_ratio = dictionary_ratio
+        # INT chunks pick delta / bit-packed / run-length encoding when smaller
+        self.int_encodings = int_encodings
+        self.page_rows = page_rows
+        self.bloom_filters = dict(bloom_filters or {})
+        self._version = VERSION # Format version of the file being written
+        self.codec = codec
+        self.compression_level = compression_level
+        self.column_codecs = dict(column_codecs or {})
+        self._codecs: List[Optional[tuple]] = [] # Per column (codec id, level) once resolved
+        self.workers = workers
+        self.executor = executor
+        self.metrics = metrics
+        self._pool: Optional[Executor] = None
+        self._pending: Deque[tuple] = deque() # Row groups being encoded: (nrows, tasks)
+        self._file = None
+        self._headers: List[str] = []
+        self._col_types: List[Optional[int]] = [] # None until the first chunk is encoded
+        self._widen_types = True
+        self._buffer: List[Sequence[str]] = []
+        # List of (nrows, [(dtype, encoding, codec, offset, csize, usize, stats, pages, bloom), ...]),
+        # where bloom is the (offset, size) of the chunk's Bloom filter block or None
+        self._row_groups: List[tuple] = []
+        self._nrows = 0
+        # When appending: footer entries of the existing row groups, and the
+        # offset the new data starts at (the end of the existing footer)
+        self._footer_groups = 0
+        self._footer_entries = b''
+        self._append_start: Optional[int] = None
+
+    def __enter__(self) -> "CCFWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._file is None:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def open(self, headers: List[str], types: Optional[List[int]] = None) -> None:
+        """
+        Starts a new CCF file and writes the header and schema.
+
+        Args:
+            headers: List of column names.
+            types: Optional list of type IDs, one per column. When omitted, types
+                are inferred from the first row group and widened if later row
+                groups need it (e.g. INT -> FLOAT when a decimal value appears).
+                A numeric column widened to STRING does not keep the text of
+                its earlier row groups: those values read back as formatted
+                numbers ('02134' as '2134'). Pass `types`, or use `write()` with
+                a list of rows, to infer types over the whole input instead.
+
+        Raises:
+            CCFError: If the writer is already open.
+            CCFSchemaError: If `types` does not match `headers`.
+        """
+        if self._file is not None:
+            raise CCFError("Writer is already open.")
+        if types is not None and len(types) != len(headers):
+            raise CCFSchemaError(f"Got {len(types)} types for {len(headers)} columns.")
+
+        self._headers = list(headers)
+        self._col_types = list(types) if types is not None else [None for _ in headers]
+        self._widen_types = types is None
+        self._buffer = []
+        self._row_groups = []
+        self._nrows = 0
+        self._codecs = [None for _ in self._headers]
+        self._pending = deque()
+        self._footer_groups = 0
+        self._footer_entries = b''
+        self._append_start = None
+        self._version = VERSION
+
+        f = open(self.output_file, 'wb')
+        self._file = f
+        self._start_pool()
+
+        # 1. Header (row count and footer offset are patched in close())
+        f.write(MAGIC)
+        f.write(struct.pack('<B', VERSION))
+        f.write(struct.pack('<I', len(headers)))
+        f.write(struct.pack('<Q', 0))
+        f.write(struct.pack('<Q', 0))
+
+        # 2. Schema (type bytes are rewritten in close() once they are known)
+        f.write(_pack_schema(self._headers, self._col_types))
+
+    def open_append(self, headers: Optional[List[str]] = None) -> None:
+        """
+        Opens an existing file to add row groups to it, without rewriting its data.
+
+        New blocks and a new metadata footer are written after the current
+        footer, which stays valid until `close()` points the header at the new
+        one, so an interrupted append leaves the file as it was. Column types
+        widen as in a streaming write; existing chunks keep their own types and
+        are converted by the reader. Codecs picked by a policy are taken over
+        from the existing chunks. The file keeps its format version, so chunks
+        appended to a version 2 file are not split into pages.
+
+        Args:
+            headers: Optional column names, checked against the file's schema.
+
+        Raises:
+            CCFError: If the writer is already open or the file cannot be read.
+            CCFVersionError: If the file has no metadata footer (version 1).
+            CCFSchemaError: If `headers` does not match the schema.
+        """
+        if self._file is not None:
+            raise CCFError("Writer is already open.")
+        existing = CCFReader(self.output_file)
+        version = existing.header['version']
+        if version < 2:
+            raise CCFVersionError(f"Cannot append to a version {version} file. Rewrite it with CCFWriter first.")
+        names = [name for name, _ in existing.schema]
+        if headers is not None and list(headers) != names:
+            raise CCFSchemaError(f"Columns {list(headers)} do not match the file's columns {names}.")
+
+        self._headers = names
+        # The schema types of a file without rows are placeholders
+        self._col_types = [dtype for _, dtype in existing.schema] if existing.nrows else [None for _ in names]
+        self._widen_types = True
+        self._buffer = []
+        self._row_groups = []
+        self._nrows = existing.nrows
+        self._codecs = [None for _ in names]
+        self._pending = deque()
+        if existing.row_groups:
+            last = existing.row_groups[-1]['columns']
+            for i, name in enumerate(names):
+                spec = self.column_codecs.get(name, self.codec)
+                if spec in CODEC_POLICIES:
+                    codec = last[name][2]
+                    level = _POLICY_ZLIB_LEVELS.get(spec, self.compression_level) if codec == CODEC_ZLIB else None
+                    self._codecs[i] = (codec, level)
+
+        footer_offset = existing.header['footer_offset']
+        footer_end = footer_offset + existing.header['footer_size']
+        f = open(self.output_file, 'r+b')
+        try:
+            f.seek(footer_offset + 4)
+            self._footer_entries = f.read(footer_end - footer_offset - 4)
+            # Anything after the footer is left over from an interrupted append
+            f.truncate(footer_end)
+            f.seek(footer_end)
+        except BaseException:
+            f.close()
+            raise
+        self._footer_groups = len(existing.row_groups)
+        self._append_start = footer_end
+        self._version = version
+        self._file = f
+        self._start_pool()
+
+    def write_batch(self, rows: Iterable[Sequence[str]]) -> None:
+        """
+        Appends rows to the file, flushing a row group every `row_group_size` rows.
+
+        Args:
+            rows: Iterable of rows, where each row is a sequence of string values.
+
+        Raises:
+            CCFError: If the writer has not been opened.
+            CCFSchemaError: If a row does not have one value per column.
+        """
+        if self._file is None:
+            raise CCFError("Writer is not open. Call open() first.")
+
+        ncols = len(self._headers)
+        for row in rows:
+            if len(row) != ncols:
+                raise CCFSchemaError(
+                    f"Row {self._nrows + self._pending_rows() + len(self._buffer) + 1} has {len(row)} values, expected {ncols}."
+                )
+            self._buffer.append(row)
+            if len(self._buffer) >= self.row_group_size:
+                self._flush_row_group()
 
-    def write(self, headers: List[str], rows: List[List[str]]) -> None:
+    def close(self) -> None:
+        """
+        Flushes buffered rows, writes the metadata footer and finalizes the header.
+        """
+        if self._file is None:
+            return
+        f = self._file
+        try:
+            if self._buffer:
+                self._flush_row_group()
+            self._drain(0)
+            # Columns without any rows default to STRING
+            self._col_types = [TYPE_STRING if t is None else t for t in self._col_types]
+
+            # 4. Metadata Footer (entries of existing row groups first when appending)
+            footer_offset = f.tell()
+            f.write(struct.pack('<I', self._footer_groups + len(self._row_groups)))
+            f.write(self._footer_entries)
+            for group_rows, chunks in self._row_groups:
+                f.write(struct.pack('<Q', group_rows))
+                for dtype, encoding, codec, offset, csize, usize, stats, pages, bloom in chunks:
+                    f.write(struct.pack('<BBBQQQ', dtype, encoding, codec, offset, csize, usize))
+                    f.write(_pack_stats(dtype, group_rows, stats))
+                    if self._version >= 3:
+                        f.write(_pack_pages(pages))
+                    if self._version >= 4:
+                        f.write(struct.pack('<QQ', *(bloom or (0, 0))))
+
+            appending = self._append_start is not None
+            if appending:
+                # The new footer must be on disk before the header refers to it
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 5. Patch the header and schema types. Row count, footer offset and
+            # the schema directly after them change in a single write, which
+            # commits an append: the types never change without the footer.
+            f.seek(len(MAGIC) + 1 + 4)
+            f.write(struct.pack('<QQ', self._nrows, footer_offset) + _pack_schema(self._headers, self._col_types))
+            self._append_start = None # Committed: nothing to truncate from here on
+            if appending:
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            self._abort()
+            raise
+        finally:
+            f.close()
+            self._file = None
+            self._append_start = None
+            self._footer_entries = b''
+            self._shutdown_pool()
+
+    def write(self, headers: List[str], rows: Iterable[Sequence[str]]) -> None:
         """
         Writes data to the CCF file.
         
         Args:
             headers: List of column names.
-            rows: List of rows, where each row is a list of string values (as read from CSV).
+            rows: Rows, where each row is a list of string values (as read from CSV).
+                Any iterable is accepted; only one row group is held in memory.
             
         Raises:
             IOError: If file writing fails.
         """
-        if not rows:
-             # Handle empty case: create a dummy file with no rows
-             ncols = len(headers)
-             nrows = 0
-             cols = [[] for _ in headers]
-             col_types = [TYPE_STRING for _ in headers] # default
-        else:
-            ncols = len(headers)
-            nrows = len(rows)
+        types = None
+        if isinstance(rows, list) and rows:
+            # The whole table is already in memory: resolve types over all of
+            # it so no column needs widening between row groups.
+            types = [resolve_column_type(col) for col in zip(*rows)]
 
-            # Transpose to columns
-            cols = list(zip(*rows))
-            
-            # Infer types
-            col_types = []
-            for col in cols:
-                col_types.append(resolve_column_type(col))
-
-        with open(self.output_file, 'wb') as f:
-            # 1. Header
-            f.write(MAGIC)
-            f.write(struct.pack('<B', VERSION))
-            f.write(struct.pack('<I', ncols))
-            f.write(struct.pack('<Q', nrows))
-
-            # 2. Schema
-            for name, dtype in zip(headers, col_types):
-                name_bytes = name.encode('utf-8')
-                f.write(struct.pack('<H', len(name_bytes)))
-                f.write(name_bytes)
-                f.write(struct.pack('<B', dtype))
-
-            # 3. Reserve space for Column Metadata Table
-            # Each entry: Offset (8), CompressedSize (8), UncompressedSize (8) = 24 bytes
-            meta_start_pos = f.tell()
-            for _ in range(ncols):
-                f.write(struct.pack('<QQQ', 0, 0, 0))
-
-            # 4. Data Blocks
-            col_meta_info = []
-
-            for i, (col_data, dtype) in enumerate(zip(cols, col_types)):
+        self.open(headers, types)
+        try:
+            self.write_batch(rows)
+        except BaseException:
+            self._abort()
+            raise
+        self.close()
+
+    def append(self, rows: Iterable[Sequence[str]], headers: Optional[List[str]] = None) -> None:
+        """
+        Appends rows to an existing CCF file (see `open_append`).
+
+        Args:
+            rows: Rows, where each row is a list of string values.
+            headers: Optional column names, checked against the file's schema.
+
+        Raises:
+            CCFVersionError: If the file is a version 1 file.
+            CCFSchemaError: If the columns or a row do not match the schema.
+        """
+        self.open_append(headers)
+        try:
+            self.write_batch(rows)
+        except BaseException:
+            self._abort()
+            raise
+        self.close()
+
+    def write_values(self, columns: Sequence[Sequence[Any]]) -> None:
+        """
+        Appends one row group from column values that already have the column
+        types, as returned by `CCFReader.read_columns` (TIMESTAMP as datetimes),
+        so nothing is parsed from text. Buffered rows are flushed first.
+
+        Args:
+            columns: One sequence of values per column, in schema order, all of the same length.
+
+        Raises:
+            CCFError: If the writer has not been opened.
+            CCFSchemaError: If the columns do not match the schema or their types are not known
+                (open the file with `types`, or append to a file with rows).
+        """
+        if self._file is None:
+            raise CCFError("Writer is not open. Call open() first.")
+        if len(columns) != len(self._headers):
+            raise CCFSchemaError(f"Got {len(columns)} columns for {len(self._headers)} columns.")
+        if None in self._col_types:
+            raise CCFSchemaError("Column types must be known to write typed values.")
+        nrows = len(columns[0]) if columns else 0
+        if any(len(col) != nrows for col in columns):
+            raise CCFSchemaError("Columns have different lengths.")
+        if self._buffer:
+            self._flush_row_group()
+        self._submit_row_group(nrows, columns, typed=True)
+
+    def write_row_group(self, nrows: int, chunks: Sequence[tuple]) -> None:
+        """
+        Appends a row group whose column chunks were already built with
+        `build_chunk`, e.g. by worker processes parsing the input in parallel.
+        Buffered rows are flushed first so row order is preserved.
+
+        Args:
+            nrows: Number of rows in the row group.
+            chunks: One `build_chunk` result per column, in schema order.
+
+        Raises:
+            CCFError: If the writer has not been opened.
+            CCFSchemaError: If there is not one chunk per column.
+        """
+        if self._file is None:
+            raise CCFError("Writer is not open. Call open() first.")
+        if len(chunks) != len(self._headers):
+            raise CCFSchemaError(f"Got {len(chunks)} chunks for {len(self._headers)} columns.")
+        if self._buffer:
+            self._flush_row_group()
+        self._pending.append((nrows, list(chunks)))
+        self._drain(1 if self._pool is not None else 0)
+
+    def _flush_row_group(self) -> None:
+        """
+        Encodes and compresses the buffered rows as one row group.
+        """
+        rows = self._buffer
+        self._buffer = []
+
+        # Transpose to columns
+        cols = list(zip(*rows)) if rows else [[] for _ in self._headers]
+        self._submit_row_group(len(rows), cols)
+
+    def _submit_row_group(self, nrows: int, cols: Sequence[Sequence[Any]], typed: bool = False) -> None:
+        """
+        Queues the chunks of one row group for encoding and writes finished ones.
+        """
+        # 3. Data Blocks (encoded here or by the pool, written in order by _drain).
+        # Chunk types are inferred by the tasks in the same pass that converts
+        # the values; _drain widens the column types with the results.
+        tasks = []
+        for i, col_data in enumerate(cols):
+            args = (col_data, self._col_types[i], self._widen_types, self.dictionary_ratio,
+                    self.int_encodings) + self._codec_spec(i) + (self.file_page_rows, self._bloom_fpp(i), typed)
+            if self._pool is None:
+                tasks.append(build_chunk(*args))
+            else:
+                tasks.append(self._pool.submit(build_chunk, *args))
+        self._pending.append((nrows, tasks))
+
+        # Keep at most one row group encoding while the previous one is written
+        self._drain(1 if self._pool is not None else 0)
+
+    def _drain(self, keep: int) -> None:
+        """
+        Writes finished row groups, oldest first, until at most `keep` remain in flight.
+        """
+        f = self._file
+        while len(self._pending) > keep:
+            nrows, tasks = self._pending.popleft()
+            chunks = []
+            for i, task in enumerate(tasks):
+                result = task.result() if isinstance(task, Future) else task
+                dtype, encoding, codec, level, compressed, usize, stats, pages, bloom, timings = result
+                current = self._col_types[i]
+                self._col_types[i] = dtype if current is None else widen_type(current, dtype)
+                if self._codecs[i] is None:
+                    # The first chunk of a column fixes the codec chosen by its policy
+                    self._codecs[i] = (codec, level)
                 start_offset = f.tell()
-                
-                raw_bytes = b''
-                if dtype == TYPE_INT:
-                    for v in col_data:
-                        try:
-                            val = int(v)
-                        except ValueError:
-                            val = 0
-                        raw_bytes += struct.pack('<i', val)
-                elif dtype == TYPE_FLOAT:
-                    for v in col_data:
-                        try:
-                            val = float(v)
-                        except ValueError:
-                            val = 0.0
-                        raw_bytes += struct.pack('<d', val)
-                else: # TYPE_STRING
-                    # Format: Use the offset approach
-                    # [offset1, offset2, ... offsetN] [string_data_blob]
-                    offsets = []
-                    blob = b''
-                    curr_blob_offset = 0
-                    for v in col_data:
-                        b = v.encode('utf-8')
-                        curr_blob_offset += len(b)
-                        offsets.append(curr_blob_offset)
-                        blob += b
-                    
-                    for o in offsets:
-                        raw_bytes += struct.pack('<I', o)
-                    raw_bytes += blob
-
-                compressed = zlib.compress(raw_bytes)
+                start = time.perf_counter()
                 f.write(compressed)
+                if self.metrics is not None:
+                    self.metrics.add(self._headers[i], chunks=1, rows=nrows, compressed_bytes=len(compressed),
+                                     uncompressed_bytes=usize, convert_seconds=timings[0],
+                                     encode_seconds=timings[1], compress_seconds=timings[2],
+                                     io_seconds=time.perf_counter() - start)
+                if pages and self._version < 3:
+                    raise CCFError(f"Version {self._version} files cannot store paged chunks.")
+                chunks.append((dtype, encoding, codec, start_offset, len(compressed), usize, stats, pages, bloom))
+
+            # Bloom filters follow the data blocks of their row group
+            for i, chunk in enumerate(chunks):
+                bloom = chunk[8]
+                if bloom is not None and self._version >= 4:
+                    chunks[i] = chunk[:8] + ((f.tell(), len(bloom)),)
+                    f.write(bloom)
+                else:
+                    chunks[i] = chunk[:8] + (None,)
+
+            self._row_groups.append((nrows, chunks))
+            self._nrows += nrows
+
+    @property
+    def file_page_rows(self) -> Optional[int]:
+        """
+        Rows per page for chunks of the file being written: `page_rows`, or
+        None when appending to a version 2 file, which cannot store pages.
+        """
+        return self.page_rows if self._version >= 3 else None
+
+    @property
+    def file_bloom_filters(self) -> Dict[str, float]:
+        """
+        Bloom filter false-positive rates for chunks of the file being written:
+        `bloom_filters`, or none when appending to a file older than version 4,
+        which cannot store them.
+        """
+        return self.bloom_filters if self._version >= 4 else {}
+
+    def _bloom_fpp(self, index: int) -> Optional[float]:
+        """
+        False-positive rate of the Bloom filters to build for a column, or None.
+        """
+        return self.file_bloom_filters.get(self._headers[index])
+
+    def _pending_rows(self) -> int:
+        return sum(nrows for nrows, _ in self._pending)
+
+    def _codec_spec(self, index: int) -> tuple:
+        """
+        Returns (codec id or policy name, level) to encode the next chunk of a column with.
+        """
+        if self._codecs[index] is not None:
+            return self._codecs[index]
+        spec = self.column_codecs.get(self._headers[index], self.codec)
+        if spec in CODEC_POLICIES:
+            return (spec, self.compression_level)
+        self._codecs[index] = (compression.codec_id(spec), self.compression_level)
+        return self._codecs[index]
+
+    def _abort(self) -> None:
+        """
+        Closes the output file without finalizing it and stops any workers.
+        An interrupted append is truncated away, leaving the file as it was.
+        """
+        self._pending.clear()
+        if self._file is not None:
+            try:
+                if self._append_start is not None:
+                    self._file.truncate(self._append_start)
+            finally:
+                self._file.close()
+                self._file = None
+                self._append_start = None
+        self._shutdown_pool(cancel=True)
 
-                col_meta_info.append((start_offset, len(compressed), len(raw_bytes)))
+    def _start_pool(self) -> None:
+        if self.workers > 1:
+            pool_cls = ThreadPoolExecutor if self.executor == "thread" else ProcessPoolExecutor
+            self._pool = pool_cls(max_workers=self.workers)
 
-            # 5. Fill Metadata Table
-            f.seek(meta_start_pos)
-            for offset, csize, usize in col_meta_info:
-                f.write(struct.pack('<QQQ', offset, csize, usize))
+    def _shutdown_pool(self, cancel: bool = False) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+            self._pool = None